@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import StudentBarcode, LiveClass, Attendance, AttendanceLog
+from .exports import attendance_export, attendance_log_export
+from .models import (
+    StudentBarcode, LiveClass, Attendance, AttendanceLog, CourseDailyAttendance, StudentMonthlyAttendance,
+    AttendanceAnomaly,
+)
 
 
 @admin.register(StudentBarcode)
@@ -7,6 +11,7 @@ class StudentBarcodeAdmin(admin.ModelAdmin):
     list_display = ('student', 'status', 'issued_at')
     list_filter = ('status', 'issued_at')
     search_fields = ('student__user__first_name', 'student__user__last_name', 'barcode_data')
+    list_select_related = ('student__user',)
 
 
 @admin.register(LiveClass)
@@ -14,6 +19,7 @@ class LiveClassAdmin(admin.ModelAdmin):
     list_display = ('title', 'course', 'scheduled_at', 'duration_minutes', 'status')
     list_filter = ('status', 'scheduled_at')
     search_fields = ('title', 'course__title')
+    list_select_related = ('course',)
 
 
 @admin.register(Attendance)
@@ -21,6 +27,8 @@ class AttendanceAdmin(admin.ModelAdmin):
     list_display = ('student', 'live_class', 'status', 'attendance_method', 'check_in_time')
     list_filter = ('status', 'attendance_method', 'check_in_time')
     search_fields = ('student__user__first_name', 'student__user__last_name', 'live_class__title')
+    list_select_related = ('student__user', 'live_class__course')
+    actions = attendance_export.admin_actions()
 
 
 @admin.register(AttendanceLog)
@@ -28,3 +36,47 @@ class AttendanceLogAdmin(admin.ModelAdmin):
     list_display = ('student', 'action', 'success', 'timestamp')
     list_filter = ('action', 'success', 'timestamp')
     search_fields = ('student__user__first_name', 'student__user__last_name')
+    list_select_related = ('student__user',)
+    actions = attendance_log_export.admin_actions()
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """Read-only: rows are maintained by apps.attendance.rollups"""
+
+    readonly_fields = ('present', 'late', 'absent', 'total')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CourseDailyAttendance)
+class CourseDailyAttendanceAdmin(RollupAdmin):
+    list_display = ('course', 'date', 'present', 'late', 'absent', 'total')
+    list_filter = ('date',)
+    search_fields = ('course__title',)
+    date_hierarchy = 'date'
+    list_select_related = ('course',)
+
+
+@admin.register(StudentMonthlyAttendance)
+class StudentMonthlyAttendanceAdmin(RollupAdmin):
+    list_display = ('student', 'month', 'present', 'late', 'absent', 'total')
+    list_filter = ('month',)
+    search_fields = ('student__user__first_name', 'student__user__last_name', 'student__student_id_number')
+    date_hierarchy = 'month'
+    list_select_related = ('student__user',)
+
+
+@admin.register(AttendanceAnomaly)
+class AttendanceAnomalyAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'occurred_at', 'student', 'device_id', 'score', 'reviewed')
+    list_filter = ('kind', 'reviewed')
+    list_editable = ('reviewed',)
+    search_fields = ('device_id', 'student__user__first_name', 'student__user__last_name', 'student__student_id_number')
+    date_hierarchy = 'occurred_at'
+    list_select_related = ('student__user',)
+    readonly_fields = ('kind', 'student', 'attendance', 'device_id', 'occurred_at', 'score', 'details',
+                       'fingerprint', 'detected_at')
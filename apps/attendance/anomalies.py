@@ -0,0 +1,287 @@
+"""
+Batch detection of suspicious attendance, vectorized with NumPy.
+
+Columns for a time range are streamed out of the database in chunks into
+NumPy arrays, and each signal is computed over whole arrays at once:
+
+* buddy punching - one device checking in ``ATTENDANCE_ANOMALY_BUDDY_STUDENTS``
+  or more different students within ``ATTENDANCE_ANOMALY_BUDDY_WINDOW_SECONDS``
+  through a self check-in method (a student's own phone, not a door scanner).
+  Phones are told apart by a signed cookie the server issues on their first
+  check-in (``views.self_checkin_device``), not by an id the client sends;
+  a phone whose cookies are cleared between students still looks new;
+* impossible travel - consecutive check-ins of one student whose locations
+  are further apart than ``ATTENDANCE_ANOMALY_MAX_SPEED_KMH`` allows;
+* outside window - attendance recorded before the check-in window opens or
+  after the class has ended (manual edits, skewed offline devices).
+
+Findings are written to ``AttendanceAnomaly`` with a fingerprint, so
+running the job again over an overlapping range does not repeat them.
+"""
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+
+from .models import Attendance, AttendanceAnomaly, AttendanceLog
+
+LOAD_CHUNK_SIZE = 50_000
+EARTH_RADIUS_KM = 6371.0
+MAX_LISTED_STUDENTS = 50
+
+
+def _setting(name, default):
+    return getattr(settings, f'ATTENDANCE_ANOMALY_{name}', default)
+
+
+def load_columns(queryset, columns, chunk_size=LOAD_CHUNK_SIZE):
+    """Read ``{name: (lookup, dtype, convert)}`` columns into arrays, ``chunk_size`` rows at a time"""
+    names = list(columns)
+    lookups = [columns[name][0] for name in names]
+    parts = {name: [] for name in names}
+    rows = queryset.values_list(*lookups).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), rows)]
+        if not chunk:
+            break
+        for position, name in enumerate(names):
+            _, dtype, convert = columns[name]
+            values = (row[position] for row in chunk)
+            if convert is not None:
+                values = map(convert, values)
+            parts[name].append(np.fromiter(values, dtype=dtype, count=len(chunk)))
+        if len(chunk) < chunk_size:
+            break
+    return {
+        name: np.concatenate(arrays) if arrays else np.empty(0, dtype=columns[name][1])
+        for name, arrays in parts.items()
+    }
+
+
+def _epoch(value):
+    return value.timestamp() if value is not None else np.nan
+
+
+def _float(value):
+    return float(value) if value is not None else np.nan
+
+
+def _text(value):
+    return value or ''
+
+
+def detect_buddy_punching(devices, students, times, window, min_students):
+    """Flag check-ins where a device has reached ``min_students`` different students
+
+    Returns ``(order, flagged, counts, window_start)``: ``order`` sorts the
+    input by device then time; the other arrays are in that sorted order and
+    give, per check-in, whether it is flagged, how many different students
+    the device checked in during the trailing ``window`` seconds, and the
+    index where that window begins.
+    """
+    order = np.lexsort((times, devices))
+    devices, students, times = devices[order], students[order], times[order]
+
+    # A row brings a "new" student when the device did not check that student in within the window
+    pair_order = np.lexsort((times, students, devices))
+    pair_times = times[pair_order]
+    same_pair = np.zeros(len(order), dtype=bool)
+    same_pair[1:] = (devices[pair_order][1:] == devices[pair_order][:-1]) & (
+        students[pair_order][1:] == students[pair_order][:-1]
+    )
+    previous_gap = np.full(len(order), np.inf)
+    previous_gap[1:] = np.where(same_pair[1:], pair_times[1:] - pair_times[:-1], np.inf)
+    is_new = np.empty(len(order), dtype=bool)
+    is_new[pair_order] = previous_gap > window
+
+    # Window start per row: one sorted key of (device, time) keeps the search inside the device
+    relative = times - times.min(initial=0)
+    key = devices.astype(np.float64) * (relative.max(initial=0) + window + 1) + relative
+    window_start = np.searchsorted(key, key - window, side='left')
+
+    new_so_far = np.concatenate(([0], np.cumsum(is_new)))
+    counts = new_so_far[np.arange(len(order)) + 1] - new_so_far[window_start]
+    return order, counts >= min_students, counts, window_start
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def detect_impossible_travel(students, times, lat, lng, max_kmh, min_km):
+    """Pairs of consecutive located check-ins per student that need more than ``max_kmh``
+
+    Returns ``(previous, current, km, kmh)`` index arrays into the input.
+    """
+    located = np.flatnonzero(~(np.isnan(lat) | np.isnan(lng) | np.isnan(times)))
+    order = located[np.lexsort((times[located], students[located]))]
+    previous, current = order[:-1], order[1:]
+    same_student = students[previous] == students[current]
+    previous, current = previous[same_student], current[same_student]
+
+    km = haversine_km(lat[previous], lng[previous], lat[current], lng[current])
+    hours = np.maximum(times[current] - times[previous], 1.0) / 3600
+    kmh = km / hours
+    flagged = (km >= min_km) & (kmh > max_kmh)
+    return previous[flagged], current[flagged], km[flagged], kmh[flagged]
+
+
+def detect_outside_window(check_in, scheduled, duration_minutes, opens_before_minutes):
+    """Minutes each check-in falls outside its class window (0 inside, NaN without a time)"""
+    opens = scheduled - opens_before_minutes * 60
+    ends = scheduled + duration_minutes * 60
+    early = np.maximum(opens - check_in, 0)
+    late = np.maximum(check_in - ends, 0)
+    return (early + late) / 60
+
+
+@dataclass
+class DetectionReport:
+    rows_loaded: dict = field(default_factory=dict)
+    found: dict = field(default_factory=dict)
+    created: int = 0
+
+
+def _fingerprint(*parts):
+    return hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def _when(epoch):
+    return datetime.fromtimestamp(float(epoch), tz=dt_timezone.utc)
+
+
+def find_buddy_punching(start, end, chunk_size=LOAD_CHUNK_SIZE):
+    methods = _setting('SELF_CHECKIN_METHODS', ('qr_scan',))
+    window = _setting('BUDDY_WINDOW_SECONDS', 600)
+    min_students = _setting('BUDDY_STUDENTS', 3)
+    logs = AttendanceLog.objects.filter(
+        action='check_in', success=True, timestamp__gte=start, timestamp__lt=end,
+        attendance__attendance_method__in=methods,
+    ).exclude(device_id='')
+    columns = load_columns(logs, {
+        'device': ('device_id', object, _text),
+        'student': ('student_id', np.int64, None),
+        'time': ('timestamp', np.float64, _epoch),
+    }, chunk_size)
+    if not len(columns['time']):
+        return [], 0
+
+    device_names, devices = np.unique(columns['device'], return_inverse=True)
+    order, flagged, counts, window_start = detect_buddy_punching(
+        devices, columns['student'], columns['time'], window, min_students
+    )
+    sorted_devices, sorted_students, sorted_times = devices[order], columns['student'][order], columns['time'][order]
+
+    # One finding per burst: a run of flagged rows on one device with gaps no longer than the window
+    anomalies = []
+    flagged_at = np.flatnonzero(flagged)
+    if len(flagged_at):
+        breaks = np.flatnonzero(
+            (np.diff(sorted_devices[flagged_at]) != 0) | (np.diff(sorted_times[flagged_at]) > window)
+        ) + 1
+        for run in np.split(flagged_at, breaks):
+            device = device_names[sorted_devices[run[0]]]
+            first = window_start[run[0]]
+            students = np.unique(sorted_students[first:run[-1] + 1])
+            anomalies.append(AttendanceAnomaly(
+                kind='buddy_punching',
+                device_id=device,
+                occurred_at=_when(sorted_times[run[0]]),
+                score=float(counts[run].max()),
+                details={
+                    'students': students[:MAX_LISTED_STUDENTS].tolist(),
+                    'student_count': int(len(students)),
+                    'from': _when(sorted_times[first]).isoformat(),
+                    'to': _when(sorted_times[run[-1]]).isoformat(),
+                },
+                fingerprint=_fingerprint('buddy', device, int(sorted_times[run[0]])),
+            ))
+    return anomalies, len(columns['time'])
+
+
+def _attendance_columns(start, end, chunk_size):
+    attendance = Attendance.objects.filter(check_in_time__gte=start, check_in_time__lt=end)
+    return load_columns(attendance, {
+        'id': ('pk', np.int64, None),
+        'student': ('student_id', np.int64, None),
+        'time': ('check_in_time', np.float64, _epoch),
+        'lat': ('location_lat', np.float64, _float),
+        'lng': ('location_lng', np.float64, _float),
+        'scheduled': ('live_class__scheduled_at', np.float64, _epoch),
+        'duration': ('live_class__duration_minutes', np.float64, None),
+        'device': ('device_info', object, _text),
+    }, chunk_size)
+
+
+def find_impossible_travel(columns):
+    previous, current, km, kmh = detect_impossible_travel(
+        columns['student'], columns['time'], columns['lat'], columns['lng'],
+        max_kmh=_setting('MAX_SPEED_KMH', 200), min_km=_setting('MIN_DISTANCE_KM', 2),
+    )
+    return [
+        AttendanceAnomaly(
+            kind='impossible_travel',
+            student_id=int(columns['student'][after]),
+            attendance_id=int(columns['id'][after]),
+            device_id=columns['device'][after][:100],
+            occurred_at=_when(columns['time'][after]),
+            score=round(float(speed), 1),
+            details={
+                'previous_attendance': int(columns['id'][before]),
+                'km': round(float(distance), 2),
+                'minutes': round(float(columns['time'][after] - columns['time'][before]) / 60, 1),
+            },
+            fingerprint=_fingerprint('travel', int(columns['id'][before]), int(columns['id'][after])),
+        )
+        for before, after, distance, speed in zip(previous, current, km, kmh)
+    ]
+
+
+def find_outside_window(columns):
+    opens_before = getattr(settings, 'ATTENDANCE_CHECKIN_OPENS_MINUTES_BEFORE', 30)
+    tolerance = _setting('WINDOW_TOLERANCE_MINUTES', 5)
+    minutes = detect_outside_window(columns['time'], columns['scheduled'], columns['duration'], opens_before)
+    flagged = np.flatnonzero(minutes > tolerance)
+    return [
+        AttendanceAnomaly(
+            kind='outside_window',
+            student_id=int(columns['student'][index]),
+            attendance_id=int(columns['id'][index]),
+            device_id=columns['device'][index][:100],
+            occurred_at=_when(columns['time'][index]),
+            score=round(float(minutes[index]), 1),
+            details={'scheduled_at': _when(columns['scheduled'][index]).isoformat()},
+            fingerprint=_fingerprint('window', int(columns['id'][index])),
+        )
+        for index in flagged
+    ]
+
+
+def detect_anomalies(start, end, chunk_size=LOAD_CHUNK_SIZE, save=True):
+    """Run every detector over ``[start, end)`` and store new findings"""
+    report = DetectionReport()
+    buddy, report.rows_loaded['logs'] = find_buddy_punching(start, end, chunk_size)
+    columns = _attendance_columns(start, end, chunk_size)
+    report.rows_loaded['attendance'] = len(columns['id'])
+    findings = {
+        'buddy_punching': buddy,
+        'impossible_travel': find_impossible_travel(columns),
+        'outside_window': find_outside_window(columns),
+    }
+    report.found = {kind: len(items) for kind, items in findings.items()}
+    new = [anomaly for items in findings.values() for anomaly in items]
+    if save and new:
+        known = set()
+        fingerprints = [anomaly.fingerprint for anomaly in new]
+        for offset in range(0, len(fingerprints), 500):
+            known.update(AttendanceAnomaly.objects.filter(
+                fingerprint__in=fingerprints[offset:offset + 500]
+            ).values_list('fingerprint', flat=True))
+        new = [anomaly for anomaly in new if anomaly.fingerprint not in known]
+        AttendanceAnomaly.objects.bulk_create(new, batch_size=1000, ignore_conflicts=True)
+        report.created = len(new)
+    return report
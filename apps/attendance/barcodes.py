@@ -0,0 +1,159 @@
+"""
+Bulk generation of student barcodes and QR codes.
+
+Rendering Code128/QR PNGs is CPU-bound, so it runs in a process pool while
+the parent process keeps the database work to one ``bulk_create`` and one
+``bulk_update`` per chunk. Each chunk is committed on its own; an
+interrupted run is resumed by simply running it again, since only students
+without a complete barcode are picked up.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils.crypto import salted_hmac
+
+from apps.users.models import Student
+from .lookup import bump_generation
+from .models import StudentBarcode
+from .rendering import render_barcode_images
+
+BARCODE_SALT = 'apps.attendance.barcodes'
+
+
+@dataclass
+class GenerationStats:
+    students: int = 0
+    images: int = 0
+    seconds: float = 0.0
+
+    @property
+    def images_per_second(self):
+        return self.images / self.seconds if self.seconds else 0.0
+
+
+def make_barcode_data(student_id_number):
+    """Student ID plus a short HMAC so scanned codes cannot be forged by hand"""
+    signature = salted_hmac(BARCODE_SALT, student_id_number).hexdigest()[:10].upper()
+    return f'{student_id_number}-{signature}'
+
+
+def barcode_data_is_valid(barcode_data):
+    """Check the HMAC suffix of scanned barcode data"""
+    student_id_number, _, _ = barcode_data.rpartition('-')
+    return bool(student_id_number) and make_barcode_data(student_id_number) == barcode_data
+
+
+def students_needing_barcodes(queryset=None):
+    """Students without a barcode row, or whose barcode is missing an image"""
+    queryset = Student.objects.all() if queryset is None else queryset
+    return queryset.filter(
+        Q(barcode__isnull=True) | Q(barcode__barcode_image='') | Q(barcode__qr_code_image='')
+    )
+
+
+def issue_missing_barcodes(queryset):
+    """Create barcode rows (data only) for students in ``queryset`` that have none; returns how many
+
+    What a card prints must be on file for the check-in lookup. Images are
+    left for ``generate_student_barcodes``, which picks such rows up.
+    """
+    missing = [
+        StudentBarcode(student_id=pk, barcode_data=make_barcode_data(number))
+        for pk, number in queryset.filter(barcode__isnull=True).values_list('pk', 'student_id_number')
+    ]
+    created = StudentBarcode.objects.bulk_create(missing, ignore_conflicts=True)
+    if created:
+        bump_generation()
+    return len(created)
+
+
+def _existing_barcode(student):
+    # Reverse one-to-one access raises an AttributeError subclass when missing
+    return getattr(student, 'barcode', None)
+
+
+def _barcode_data_for(student):
+    barcode = _existing_barcode(student)
+    return barcode.barcode_data if barcode else make_barcode_data(student.student_id_number)
+
+
+def _store(field, barcode_data, content):
+    """Save an image under a deterministic name, replacing leftovers from an interrupted run"""
+    name = field.generate_filename(None, f'{barcode_data}.png')
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content))
+
+
+def _write_chunk(students, rendered):
+    """Store rendered images and persist the chunk's barcode rows"""
+    barcode_field = StudentBarcode._meta.get_field('barcode_image')
+    qr_field = StudentBarcode._meta.get_field('qr_code_image')
+
+    to_create, to_update = [], []
+    for student, (barcode_data, (code128_png, qr_png)) in zip(students, rendered):
+        barcode = _existing_barcode(student)
+        if barcode is None:
+            barcode = StudentBarcode(student=student, barcode_data=barcode_data)
+            to_create.append(barcode)
+        else:
+            to_update.append(barcode)
+        barcode.barcode_image = _store(barcode_field, barcode.barcode_data, code128_png)
+        barcode.qr_code_image = _store(qr_field, barcode.barcode_data, qr_png)
+
+    with transaction.atomic():
+        StudentBarcode.objects.bulk_create(to_create)
+        StudentBarcode.objects.bulk_update(to_update, ['barcode_image', 'qr_code_image'])
+    if to_create:
+        # bulk_create sends no signals; lookups may remember these as unknown
+        bump_generation()
+
+
+def generate_student_barcodes(queryset=None, workers=None, chunk_size=500, progress=None):
+    """
+    Generate missing barcodes/QR codes for students in ``queryset``.
+
+    ``workers`` defaults to the CPU count; 0 or 1 renders in-process, which
+    is cheaper for a handful of students. ``progress`` is called with the
+    running ``GenerationStats`` after each chunk.
+    """
+    workers = os.cpu_count() if workers is None else workers
+    stats = GenerationStats()
+    started = time.perf_counter()
+    pending = students_needing_barcodes(queryset).select_related('barcode').order_by('pk')
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        last_pk = 0
+        while True:
+            # Keyset pagination: completed rows drop out of the filter as we go
+            students = list(pending.filter(pk__gt=last_pk)[:chunk_size])
+            if not students:
+                break
+            last_pk = students[-1].pk
+
+            datas = [_barcode_data_for(student) for student in students]
+            if executor:
+                batch = max(1, len(datas) // (workers * 4))
+                images = list(executor.map(render_barcode_images, datas, chunksize=batch))
+            else:
+                images = [render_barcode_images(data) for data in datas]
+            _write_chunk(students, zip(datas, images))
+
+            stats.students += len(students)
+            stats.images += 2 * len(students)
+            stats.seconds = time.perf_counter() - started
+            if progress:
+                progress(stats)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    stats.seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,139 @@
+"""Shared fixtures for the attendance benchmark commands (always run inside a rolled-back transaction)"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import Client
+from django.utils import timezone
+
+from apps.courses.models import Course
+from apps.courses.slugs import assign_course_slugs
+from apps.users.models import Student, Teacher, User
+from apps.users.student_ids import assign_student_ids
+from .barcodes import make_barcode_data
+from .models import Attendance, AttendanceLog, LiveClass, StudentBarcode
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def seed_scan_fixture(students, live_classes=1, prefix='bench'):
+    """Create a teacher, ongoing live classes and ``students`` students with barcodes"""
+    teacher_user = User.objects.create_user(f'{prefix}-teacher@example.com', 'x', role='teacher')
+    teacher = Teacher.objects.create(user=teacher_user, qualifications='-')
+    course = Course.objects.bulk_create(assign_course_slugs([
+        Course(title=f'{prefix} course', description='-', grade_level='grade_10', subject='-', teacher=teacher)
+    ]))[0]
+    classes = LiveClass.objects.bulk_create([
+        LiveClass(course=course, title=f'{prefix} {n}', scheduled_at=timezone.now() - timedelta(minutes=5),
+                  status='ongoing')
+        for n in range(live_classes)
+    ])
+    users = User.objects.bulk_create([
+        User(username=f'{prefix}{n}@example.com', email=f'{prefix}{n}@example.com') for n in range(students)
+    ], batch_size=2_000)
+    student_rows = Student.objects.bulk_create(
+        assign_student_ids([Student(user=user, grade_level='grade_10') for user in users]), batch_size=2_000
+    )
+    barcodes = StudentBarcode.objects.bulk_create([
+        StudentBarcode(student=student, barcode_data=make_barcode_data(student.student_id_number))
+        for student in student_rows
+    ], batch_size=2_000)
+    return teacher_user, classes, [barcode.barcode_data for barcode in barcodes]
+
+
+def logged_in_client(user):
+    """Test client that passes ALLOWED_HOSTS and is logged in as ``user``"""
+    host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h.strip() not in ('', '*')), 'localhost')
+    client = Client(SERVER_NAME=host)
+    client.force_login(user)
+    return client
+
+
+CAMPUS = (6.9271, 79.8612)  # Colombo
+FAR_AWAY = (9.6615, 80.0255)  # Jaffna, ~300 km
+
+
+def seed_anomaly_dataset(students, days=30, classes_per_day=20, attendance_rate=0.5,
+                         injected=20, prefix='anomaly', seed=0):
+    """Attendance and logs for ``students`` over ``days``, with ``injected`` anomalies of each kind
+
+    Three quarters of check-ins come from door scanners, the rest from each
+    student's own phone (QR). Returns the ids of the injected anomalies per
+    kind so a benchmark can check the detector finds them.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    teacher_user, _, _ = seed_scan_fixture(students, 0, prefix)
+    teacher = Teacher.objects.get(user=teacher_user)
+    course = Course.objects.filter(teacher=teacher).first()
+    student_ids = np.fromiter(
+        Student.objects.filter(user__username__startswith=prefix).values_list('pk', flat=True), dtype=np.int64
+    )
+    start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    classes = LiveClass.objects.bulk_create([
+        LiveClass(course=course, title=f'{prefix} {day}/{slot}', status='completed', duration_minutes=60,
+                  scheduled_at=start + timedelta(days=day, hours=7 + slot * 12 / classes_per_day))
+        for day in range(days) for slot in range(classes_per_day)
+    ], batch_size=2_000)
+
+    per_class = max(1, int(len(student_ids) * attendance_rate * days / len(classes)))
+    class_rows = []
+    for live_class in classes:
+        attendees = rng.choice(student_ids, size=min(per_class, len(student_ids)), replace=False)
+        offsets = rng.uniform(-10, 15, size=len(attendees))
+        self_service = rng.random(len(attendees)) < 0.25
+        lat = CAMPUS[0] + rng.normal(0, 0.002, len(attendees))
+        lng = CAMPUS[1] + rng.normal(0, 0.002, len(attendees))
+        class_rows.append([
+            Attendance(
+                live_class=live_class, student_id=student_id, status='present',
+                attendance_method='qr_scan' if self_service[n] else 'barcode_scan',
+                check_in_time=live_class.scheduled_at + timedelta(minutes=float(offsets[n])),
+                location_lat=round(float(lat[n]), 6), location_lng=round(float(lng[n]), 6),
+                device_info=f'phone-{student_id}' if self_service[n] else f'door-{live_class.pk % 4}',
+            )
+            for n, student_id in enumerate(attendees.tolist())
+        ])
+
+    injected_ids = {'buddy_punching': [], 'impossible_travel': [], 'outside_window': []}
+    # Same-day classes that have a next slot, so travel can be injected between them
+    candidates = [index for index in range(len(classes)) if (index + 1) % classes_per_day]
+    picks = rng.choice(candidates, size=min(injected * 3, len(candidates)), replace=False)
+    for n, index in enumerate(picks.tolist()):
+        rows = class_rows[index]
+        kind = ('buddy_punching', 'impossible_travel', 'outside_window')[n % 3]
+        if kind == 'buddy_punching' and len(rows) >= 4:
+            # One phone checks in four students a minute apart
+            phone = f'buddy-phone-{n}'
+            for k, row in enumerate(rows[:4]):
+                row.attendance_method, row.device_info = 'qr_scan', phone
+                row.check_in_time = rows[0].check_in_time + timedelta(minutes=k)
+            injected_ids[kind].append(phone)
+        elif kind == 'impossible_travel':
+            # Checked in on campus, then ~300 km away at the next class the same day
+            next_class = classes[index + 1]
+            taken = {row.student_id for row in class_rows[index + 1]}
+            row = next((row for row in rows if row.student_id not in taken), None)
+            if row is not None:
+                class_rows[index + 1].append(Attendance(
+                    live_class=next_class, student_id=row.student_id, status='present',
+                    attendance_method='qr_scan', check_in_time=next_class.scheduled_at,
+                    location_lat=FAR_AWAY[0], location_lng=FAR_AWAY[1], device_info=f'phone-{row.student_id}',
+                ))
+                injected_ids[kind].append(row.student_id)
+        elif kind == 'outside_window':
+            row = rows[-1]
+            row.check_in_time = row.live_class.scheduled_at + timedelta(hours=4)
+            injected_ids[kind].append(row.student_id)
+
+    attendance = [row for rows in class_rows for row in rows]
+    attendance = Attendance.objects.bulk_create(attendance, batch_size=2_000)
+    AttendanceLog.objects.bulk_create([
+        AttendanceLog(student_id=row.student_id, attendance=row, action='check_in', success=True,
+                      timestamp=row.check_in_time, device_id=row.device_info)
+        for row in attendance
+    ], batch_size=2_000)
+    return len(attendance), injected_ids
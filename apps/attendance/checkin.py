@@ -0,0 +1,212 @@
+"""
+Barcode check-in for live classes.
+
+Built for a queue of students scanning at a classroom door: the barcode is
+resolved from the in-process lookup table, the class schedule comes from a
+short-lived in-process cache, and a re-scan returns the existing record.
+Two scans racing past that check meet at the
+``unique_together(live_class, student)`` constraint; the loser reports
+the winner's row as ``already_checked_in`` and leaves it untouched.
+"""
+import time
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.courses.models import Enrollment
+
+from .live import notify_checkin
+from .log_buffer import record_attendance_log
+from .lookup import barcode_lookup
+from .models import Attendance, AttendanceLog, LiveClass
+from .ratelimit import earlier_scan, remember_scan, scan_limit_reason
+from .rollups import apply_attendance_changes
+
+LIVE_CLASS_CACHE_SECONDS = 30
+_live_classes = {}
+
+
+@dataclass
+class CheckInResult:
+    success: bool
+    status: str  # checked_in, already_checked_in, duplicate_scan, or a failure reason
+    student_id: int = None
+    attendance_id: int = None
+    attendance_status: str = ''
+    check_in_time: object = None
+
+    def as_dict(self):
+        return {
+            'success': self.success,
+            'status': self.status,
+            'student_id': self.student_id,
+            'attendance_id': self.attendance_id,
+            'attendance_status': self.attendance_status,
+            'check_in_time': self.check_in_time.isoformat() if self.check_in_time else None,
+        }
+
+
+def _live_class(live_class_id):
+    """Return ``(scheduled_at, duration_minutes, status, course_id)``, cached briefly per process"""
+    now = time.monotonic()
+    cached = _live_classes.get(live_class_id)
+    if cached and now - cached[0] < LIVE_CLASS_CACHE_SECONDS:
+        return cached[1]
+    row = LiveClass.objects.filter(pk=live_class_id).values_list(
+        'scheduled_at', 'duration_minutes', 'status', 'course_id'
+    ).first()
+    _live_classes[live_class_id] = (now, row)
+    return row
+
+
+def forget_live_class(live_class_id):
+    _live_classes.pop(live_class_id, None)
+
+
+def check_in_window_error(live_class, now):
+    """Return a failure reason if ``now`` is outside the class check-in window"""
+    scheduled_at, duration_minutes, status = live_class[:3]
+    if status not in ('scheduled', 'ongoing'):
+        return f'class_{status}'
+    opens_before = getattr(settings, 'ATTENDANCE_CHECKIN_OPENS_MINUTES_BEFORE', 30)
+    if now < scheduled_at - timedelta(minutes=opens_before):
+        return 'class_not_open'
+    if now > scheduled_at + timedelta(minutes=duration_minutes):
+        return 'class_ended'
+    return ''
+
+
+def attendance_status_for(live_class, now):
+    """present, or late once the grace period after the start has passed"""
+    late_after = getattr(settings, 'ATTENDANCE_LATE_AFTER_MINUTES', 10)
+    return 'late' if now > live_class[0] + timedelta(minutes=late_after) else 'present'
+
+
+def parse_coordinate(value, limit=180):
+    """Parse a latitude (``limit=90``) or longitude to the model's 6 decimal places"""
+    if value in (None, ''):
+        return None
+    try:
+        coordinate = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'Invalid coordinate: {value}')
+    # Out of range values would also overflow the DecimalField(9, 6)
+    if not coordinate.is_finite() or abs(coordinate) > limit:
+        raise ValueError(f'Invalid coordinate: {value}')
+    return coordinate.quantize(Decimal('0.000001'))
+
+
+def log_scan(student_id, attendance_id, success, failure_reason='', ip_address=None, device_id=''):
+    return record_attendance_log(AttendanceLog(
+        student_id=student_id,
+        attendance_id=attendance_id,
+        action='check_in' if success else 'scan_attempt',
+        success=success,
+        failure_reason=failure_reason[:100],
+        ip_address=ip_address,
+        device_id=device_id[:100],
+    ))
+
+
+def check_in(barcode_data, live_class_id, device_id='', ip_address=None,
+             location_lat=None, location_lng=None, method='barcode_scan'):
+    """Record a barcode scan; idempotent for repeat scans of the same student and class"""
+    match = barcode_lookup.resolve(barcode_data)
+    if match.student_id is None:
+        # Unknown barcodes cannot be logged: AttendanceLog requires a student
+        return CheckInResult(False, 'unknown_barcode')
+    if not match.is_valid:
+        log_scan(match.student_id, None, False, f'barcode_{match.status}', ip_address, device_id)
+        return CheckInResult(False, f'barcode_{match.status}', match.student_id)
+
+    limited = scan_limit_reason(barcode_data, device_id)
+    if limited:
+        log_scan(match.student_id, None, False, limited, ip_address, device_id)
+        return CheckInResult(False, limited, match.student_id)
+    earlier = earlier_scan(barcode_data, live_class_id)
+    if earlier is not None:
+        # Coalesced: answer with the first scan's result instead of going to the database
+        log_scan(match.student_id, earlier['attendance_id'], False, 'duplicate_scan', ip_address, device_id)
+        return CheckInResult(**{**earlier, 'status': 'duplicate_scan'})
+
+    result = check_in_student(
+        match.student_id, live_class_id, device_id, ip_address, location_lat, location_lng, method
+    )
+    if result.success:
+        remember_scan(barcode_data, live_class_id, asdict(result))
+    return result
+
+
+def is_enrolled(student_id, course_id):
+    return Enrollment.objects.filter(student_id=student_id, course_id=course_id, status='active').exists()
+
+
+def check_in_student(student_id, live_class_id, device_id='', ip_address=None,
+                     location_lat=None, location_lng=None, method='manual', require_enrollment=False):
+    """Record a check-in for an already identified student
+
+    ``require_enrollment`` turns away students without an active enrollment
+    in the class's course: the QR path, where anyone can hold up their phone
+    to the projected code. Scanned barcodes are checked by the person at the door.
+    """
+    now = timezone.now()
+
+    def fail(reason):
+        log_scan(student_id, None, False, reason, ip_address, device_id)
+        return CheckInResult(False, reason, student_id)
+
+    live_class = _live_class(live_class_id)
+    if live_class is None:
+        return fail('unknown_class')
+    window_error = check_in_window_error(live_class, now)
+    if window_error:
+        return fail(window_error)
+    if require_enrollment and not is_enrolled(student_id, live_class[3]):
+        return fail('not_enrolled')
+
+    existing = _existing_attendance(live_class_id, student_id)
+    if existing:
+        return _already_checked_in(existing, student_id, ip_address, device_id)
+
+    attendance_status = attendance_status_for(live_class, now)
+    attendance = Attendance(
+        live_class_id=live_class_id,
+        student_id=student_id,
+        status=attendance_status,
+        attendance_method=method,
+        check_in_time=now,
+        location_lat=location_lat,
+        location_lng=location_lng,
+        device_info=device_id[:100],
+    )
+    try:
+        with transaction.atomic():
+            Attendance.objects.bulk_create([attendance])
+            apply_attendance_changes([(live_class[3], live_class[0], student_id, attendance_status, 1)])
+    except IntegrityError:
+        # A concurrent scan of the same card inserted the row first: report that one, unchanged
+        existing = _existing_attendance(live_class_id, student_id)
+        if existing is None:
+            raise
+        return _already_checked_in(existing, student_id, ip_address, device_id)
+
+    log_scan(student_id, attendance.pk, True, '', ip_address, device_id)
+    notify_checkin(live_class_id)
+    return CheckInResult(True, 'checked_in', student_id, attendance.pk, attendance_status, now)
+
+
+def _existing_attendance(live_class_id, student_id):
+    return Attendance.objects.filter(
+        live_class_id=live_class_id, student_id=student_id
+    ).values_list('pk', 'status', 'check_in_time').first()
+
+
+def _already_checked_in(existing, student_id, ip_address, device_id):
+    attendance_id, attendance_status, check_in_time = existing
+    # Re-scans are audited as attempts but still report the student as checked in
+    log_scan(student_id, attendance_id, False, 'already_checked_in', ip_address, device_id)
+    return CheckInResult(True, 'already_checked_in', student_id, attendance_id, attendance_status, check_in_time)
@@ -0,0 +1,57 @@
+"""
+Attendance and scan-log exports (see ``apps.core.exports``).
+"""
+from apps.core.exports import Export, date_range_filter
+
+from .models import Attendance, AttendanceLog
+
+attendance_export = Export('attendance', (
+    ('Student ID', 'student__student_id_number'),
+    ('First name', 'student__user__first_name'),
+    ('Last name', 'student__user__last_name'),
+    ('Course', 'live_class__course__title'),
+    ('Class', 'live_class__title'),
+    ('Scheduled at', 'live_class__scheduled_at'),
+    ('Status', 'status'),
+    ('Method', 'attendance_method'),
+    ('Check-in time', 'check_in_time'),
+    ('Check-out time', 'check_out_time'),
+    ('Device', 'device_info'),
+))
+
+attendance_log_export = Export('attendance-log', (
+    ('Timestamp', 'timestamp'),
+    ('Student ID', 'student__student_id_number'),
+    ('First name', 'student__user__first_name'),
+    ('Last name', 'student__user__last_name'),
+    ('Action', 'action'),
+    ('Success', 'success'),
+    ('Failure reason', 'failure_reason'),
+    ('IP address', 'ip_address'),
+    ('Device', 'device_id'),
+    ('Scanned at', 'scanned_at'),
+))
+
+
+def filter_attendance(params):
+    """Attendance filtered in SQL by date range (class schedule), course, class and status"""
+    queryset = Attendance.objects.filter(**date_range_filter('live_class__scheduled_at', params))
+    if params.get('course'):
+        queryset = queryset.filter(live_class__course_id=int(params['course']))
+    if params.get('live_class'):
+        queryset = queryset.filter(live_class_id=int(params['live_class']))
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    return queryset
+
+
+def filter_attendance_logs(params):
+    """Scan logs filtered in SQL by date range, action, outcome and device"""
+    queryset = AttendanceLog.objects.filter(**date_range_filter('timestamp', params))
+    if params.get('action'):
+        queryset = queryset.filter(action=params['action'])
+    if params.get('success') in ('0', '1', 'true', 'false'):
+        queryset = queryset.filter(success=params['success'] in ('1', 'true'))
+    if params.get('device_id'):
+        queryset = queryset.filter(device_id=params['device_id'])
+    return queryset
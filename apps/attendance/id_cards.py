@@ -0,0 +1,171 @@
+"""
+Print-ready student ID card sheets.
+
+Cards are laid out on A4 pages (``SheetLayout``), each page is composed into
+a JPEG by a process pool worker, and pages are written straight into a PDF
+as they arrive. Only a small window of pages is ever in flight, so memory
+stays flat whether the batch is 50 cards or 5,000. Students without a
+barcode row get one (``issue_missing_barcodes``) before anything is drawn,
+so every printed code scans.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .barcodes import issue_missing_barcodes, make_barcode_data
+from .rendering import CardSpec, SheetLayout, compose_page
+
+
+class StreamingPdfWriter:
+    """
+    Minimal PDF writer that emits one full-page JPEG per page as it goes.
+
+    The page tree and catalog are written last; the cross-reference table
+    makes their position irrelevant, so nothing has to be buffered.
+    """
+
+    CATALOG, PAGES, FIRST_FREE = 1, 2, 3
+
+    def __init__(self):
+        self.position = 0
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = self.FIRST_FREE
+
+    def _emit(self, data):
+        self.position += len(data)
+        return data
+
+    def _object(self, object_id, body, stream=None):
+        self.offsets[object_id] = self.position
+        data = b'%d 0 obj\n' % object_id + body
+        if stream is not None:
+            data += b'\nstream\n' + stream + b'\nendstream'
+        return self._emit(data + b'\nendobj\n')
+
+    def _allocate(self, count):
+        first = self.next_id
+        self.next_id += count
+        return range(first, first + count)
+
+    def header(self):
+        return self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def page(self, jpeg, size_px, size_pt):
+        """Return the bytes for one page showing ``jpeg`` edge to edge"""
+        image_id, content_id, page_id = self._allocate(3)
+        self.page_ids.append(page_id)
+        width_pt, height_pt = size_pt
+        content = b'q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q' % (width_pt, height_pt)
+        return b''.join([
+            self._object(
+                image_id,
+                b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB '
+                b'/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>' % (*size_px, len(jpeg)),
+                jpeg,
+            ),
+            self._object(content_id, b'<< /Length %d >>' % len(content), content),
+            self._object(
+                page_id,
+                b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] '
+                b'/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>'
+                % (self.PAGES, width_pt, height_pt, image_id, content_id),
+            ),
+        ])
+
+    def trailer(self):
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self.page_ids)
+        data = self._object(
+            self.PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.page_ids))
+        )
+        data += self._object(self.CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES)
+
+        xref_at = self.position
+        xref = [b'xref\n0 %d\n' % self.next_id, b'0000000000 65535 f \n']
+        xref += [b'%010d 00000 n \n' % self.offsets[object_id] for object_id in range(1, self.next_id)]
+        xref.append(
+            b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (self.next_id, self.CATALOG, xref_at)
+        )
+        return data + self._emit(b''.join(xref))
+
+
+def _local_file(field_file):
+    """Path (or bytes) for an image field that pool workers can read"""
+    if not field_file:
+        return None
+    try:
+        return field_file.path
+    except NotImplementedError:
+        # Remote storage: read it here, the worker cannot open storage URLs
+        with field_file.open('rb') as handle:
+            return handle.read()
+
+
+def card_spec(student):
+    """Build the picklable card description for a student"""
+    barcode = getattr(student, 'barcode', None)
+    return CardSpec(
+        name=student.user.get_full_name(),
+        student_id_number=student.student_id_number,
+        barcode_data=barcode.barcode_data if barcode else make_barcode_data(student.student_id_number),
+        photo=_local_file(student.user.profile_image),
+        barcode=_local_file(barcode.barcode_image) if barcode else None,
+    )
+
+
+def _pages(students, layout, chunk_size):
+    students = students.select_related('user', 'barcode').order_by('student_id_number')
+    page = []
+    for student in students.iterator(chunk_size=chunk_size):
+        page.append(card_spec(student))
+        if len(page) == layout.cards_per_page:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _compose_in_order(pages, layout, workers):
+    """Compose pages, keeping at most ``2 * workers`` pages in flight"""
+    if workers <= 1:
+        for cards in pages:
+            yield compose_page(cards, layout)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        try:
+            for cards in pages:
+                in_flight.append(executor.submit(compose_page, cards, layout))
+                if len(in_flight) >= workers * 2:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            # Client went away mid-download: drop queued pages
+            for future in in_flight:
+                future.cancel()
+
+
+def iter_id_card_pdf(students, layout=None, workers=None, chunk_size=500):
+    """Yield a multi-page ID card PDF for ``students`` chunk by chunk"""
+    layout = layout or SheetLayout()
+    workers = os.cpu_count() if workers is None else workers
+    writer = StreamingPdfWriter()
+    # A card is only any use at the door if its code is on file
+    issue_missing_barcodes(students)
+
+    yield writer.header()
+    for jpeg in _compose_in_order(_pages(students, layout, chunk_size), layout, workers):
+        yield writer.page(jpeg, layout.page_size_px, layout.page_size_pt)
+    yield writer.trailer()
+
+
+def write_id_card_pdf(students, output, **kwargs):
+    """Write the ID card PDF to a binary file object; returns bytes written"""
+    written = 0
+    for chunk in iter_id_card_pdf(students, **kwargs):
+        output.write(chunk)
+        written += len(chunk)
+    return written
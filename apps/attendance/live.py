@@ -0,0 +1,243 @@
+"""
+Live check-in feed for the attendance dashboard (server-sent events).
+
+Each ``LiveClass`` with at least one open dashboard has a single
+``ClassFeed`` task in the ASGI process. It polls for attendance rows newer
+than its cursor (``Attendance.pk``) every ``ATTENDANCE_LIVE_POLL_SECONDS``
+and fans each batch out to every subscriber, so N open screens cost one
+indexed query per interval instead of N. Check-ins handled by this process
+wake the feed at once through ``notify_checkin``.
+
+Primary keys are handed out when a row is inserted but become visible when
+its transaction commits, so under concurrent check-ins a lower pk can show
+up after a higher one has been read. ``pk > cursor`` alone would skip it for
+good; every poll therefore also re-reads the rows created in the last
+``ATTENDANCE_LIVE_OVERLAP_SECONDS`` and drops the ones already sent
+(``RecentIds``). A check-in whose transaction stays open longer than the
+overlap can still be missed; they commit in milliseconds.
+
+A client that connects (or reconnects) sends the last ``id:`` it saw as
+``Last-Event-ID``; everything after it, and the overlap window before it,
+is replayed from the database before live events, so a dropped connection
+never loses check-ins. ``id:`` carries the highest pk sent so far, not the
+event's own, and the event data carries the attendance ``id``: a replay
+after a reconnect may repeat a few recent events, which the dashboard
+recognises by that ``id``.
+"""
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Attendance
+
+EVENT_FIELDS = (
+    'pk', 'student_id', 'student__student_id_number', 'student__user__first_name',
+    'student__user__last_name', 'status', 'attendance_method', 'check_in_time',
+)
+CATCH_UP_LIMIT = 1000
+
+
+def poll_interval():
+    return getattr(settings, 'ATTENDANCE_LIVE_POLL_SECONDS', 1.0)
+
+
+def subscriber_queue_size():
+    return getattr(settings, 'ATTENDANCE_LIVE_QUEUE_SIZE', 1000)
+
+
+def overlap_seconds():
+    return getattr(settings, 'ATTENDANCE_LIVE_OVERLAP_SECONDS', 10)
+
+
+def overlap_start():
+    return timezone.now() - timedelta(seconds=overlap_seconds())
+
+
+def _event(row):
+    pk, student_pk, student_id_number, first_name, last_name, status, method, check_in_time = row
+    return {
+        'id': pk,
+        'student': student_pk,
+        'student_id_number': student_id_number,
+        'name': f'{first_name} {last_name}'.strip(),
+        'status': status,
+        'method': method,
+        'check_in_time': check_in_time.isoformat() if check_in_time else None,
+    }
+
+
+async def attendance_since(live_class_id, cursor, since=None, limit=CATCH_UP_LIMIT):
+    """Check-in events for a class with ``pk > cursor`` or created from ``since`` on, oldest first"""
+    condition = Q(pk__gt=cursor)
+    if since is not None:
+        condition |= Q(created_at__gte=since)
+    queryset = Attendance.objects.filter(
+        condition, live_class_id=live_class_id
+    ).order_by('pk').values_list(*EVENT_FIELDS)[:limit]
+    return [_event(row) async for row in queryset]
+
+
+def format_sse(event, name='checkin', cursor=None):
+    """SSE frame for ``event``; ``cursor`` (default: the event's id) is what the client resumes from"""
+    last_id = event['id'] if cursor is None else cursor
+    return f'id: {last_id}\nevent: {name}\ndata: {json.dumps(event)}\n\n'
+
+
+class RecentIds:
+    """Ids sent within the overlap window, to drop events a re-scan returns again"""
+
+    def __init__(self):
+        self._seen = {}
+
+    def fresh(self, events):
+        """The events not sent yet, remembering them as sent"""
+        now = time.monotonic()
+        # A row seen at t was created no later than t, so it leaves the re-scan window by t + overlap
+        expired = now - overlap_seconds() - poll_interval()
+        self._seen = {pk: seen_at for pk, seen_at in self._seen.items() if seen_at >= expired}
+        fresh = [event for event in events if event['id'] not in self._seen]
+        for event in fresh:
+            self._seen[event['id']] = now
+        return fresh
+
+
+class SlowSubscriber(Exception):
+    """The subscriber's queue overflowed; it should reconnect and catch up"""
+
+
+class ClassFeed:
+    """One poller per class, fanned out to every subscribed dashboard"""
+
+    def __init__(self, live_class_id):
+        self.live_class_id = live_class_id
+        self.cursor = None
+        self.recent = RecentIds()
+        self.subscribers = set()
+        self.wake = asyncio.Event()
+        self.task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=subscriber_queue_size())
+        self.subscribers.add(queue)
+        return queue
+
+    def start(self, cursor):
+        """Start polling after ``cursor`` unless this feed is already running"""
+        if self.task is None or self.task.done():
+            self.cursor = cursor
+            self.recent = RecentIds()
+            self.task = asyncio.create_task(self._run())
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.wake.set()  # let the poller notice and exit
+
+    def _publish(self, events):
+        for queue in list(self.subscribers):
+            try:
+                for event in events:
+                    queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Dropped rather than buffered without bound; the client replays from its cursor
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(SlowSubscriber())
+        return events
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=poll_interval())
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            if not self.subscribers:
+                break
+            events = await attendance_since(self.live_class_id, self.cursor, overlap_start())
+            if events:
+                self.cursor = max(self.cursor, events[-1]['id'])
+                self._publish(self.recent.fresh(events))
+
+
+class AttendanceBroadcaster:
+    """Registry of per-class feeds for this process's event loop"""
+
+    def __init__(self):
+        self._feeds = {}
+        self._loop = None
+
+    def feed(self, live_class_id):
+        self._loop = asyncio.get_running_loop()
+        feed = self._feeds.get(live_class_id)
+        if feed is None:
+            feed = self._feeds[live_class_id] = ClassFeed(live_class_id)
+        return feed
+
+    def release(self, feed, queue):
+        feed.unsubscribe(queue)
+        if not feed.subscribers and self._feeds.get(feed.live_class_id) is feed:
+            del self._feeds[feed.live_class_id]
+
+    def notify(self, live_class_id):
+        """Wake a class's feed now; safe to call from any thread"""
+        loop = self._loop
+        feed = self._feeds.get(live_class_id)
+        if loop is None or feed is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(feed.wake.set)
+        except RuntimeError:
+            pass
+
+    def __len__(self):
+        return sum(len(feed.subscribers) for feed in self._feeds.values())
+
+
+broadcaster = AttendanceBroadcaster()
+
+
+def notify_checkin(live_class_id):
+    broadcaster.notify(live_class_id)
+
+
+async def stream_checkins(live_class_id, last_event_id=0):
+    """Replay check-ins after ``last_event_id``, then yield live ones as SSE frames"""
+    feed = broadcaster.feed(live_class_id)
+    # Subscribe before the catch-up query so nothing written in between is missed;
+    # a running feed's cursor is never ahead of what the catch-up query can see
+    queue = feed.subscribe()
+    try:
+        yield f'retry: {int(poll_interval() * 1000) + 1000}\n\n'
+        cursor = last_event_id
+        recent = RecentIds()
+        while True:
+            backlog = await attendance_since(live_class_id, cursor, overlap_start())
+            fresh = recent.fresh(backlog)
+            for event in fresh:
+                cursor = max(cursor, event['id'])
+                yield format_sse(event, cursor=cursor)
+            if len(backlog) < CATCH_UP_LIMIT or not fresh:
+                break
+        feed.start(cursor)
+
+        keepalive = getattr(settings, 'ATTENDANCE_LIVE_KEEPALIVE_SECONDS', 15)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if isinstance(event, SlowSubscriber):
+                return
+            for event in recent.fresh([event]):
+                cursor = max(cursor, event['id'])
+                yield format_sse(event, cursor=cursor)
+    finally:
+        broadcaster.release(feed, queue)
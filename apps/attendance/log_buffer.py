@@ -0,0 +1,197 @@
+"""
+Write-behind buffering for ``AttendanceLog`` audit records.
+
+``ATTENDANCE_LOG_MODE`` selects the durability trade-off:
+
+* ``immediate`` (default) - every entry is inserted on the request path,
+  nothing can be lost.
+* ``buffered`` - entries go into a bounded in-process queue that a
+  background thread flushes with ``bulk_create`` when it reaches
+  ``ATTENDANCE_LOG_FLUSH_SIZE`` entries or every
+  ``ATTENDANCE_LOG_FLUSH_SECONDS``. It is also flushed at worker shutdown
+  (gunicorn ``worker_exit`` hook and ``atexit``). A hard crash loses at most
+  one flush interval of entries.
+
+When the queue is full, the request thread flushes a batch itself before
+enqueueing (backpressure) rather than dropping the entry; if that writes
+nothing, the entry is saved directly, as in ``immediate`` mode.
+
+A batch whose ``bulk_create`` fails is inserted row by row, so one bad
+entry (say, a duplicate device event) costs only itself. If the database
+itself is failing, the rest of the batch is kept and retried first on the
+next flush.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, close_old_connections, connection, transaction
+
+from .models import AttendanceLog
+
+logger = logging.getLogger(__name__)
+
+
+class AttendanceLogBuffer:
+    """Bounded queue of unsaved ``AttendanceLog`` instances with a flusher thread"""
+
+    def __init__(self, max_size=10_000, flush_size=500, flush_interval=2.0):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.flushed = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._retry = []  # entries kept after the database failed, written first next time
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Started lazily, and restarted after a fork (threads do not survive it)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='attendance-log-flusher', daemon=True)
+            self._thread.start()
+
+    def add(self, entry):
+        """Queue an unsaved ``AttendanceLog``; flushes in the caller if the queue is full"""
+        self._ensure_thread()
+        while True:
+            try:
+                self._queue.put_nowait(entry)
+                break
+            except queue.Full:
+                if not self.flush(limit=self.flush_size):
+                    # The database is not taking writes; fail like immediate mode would
+                    entry.save()
+                    return
+        if self._queue.qsize() >= self.flush_size:
+            self._wake.set()
+
+    def _drain(self, limit=None):
+        batch = []
+        while limit is None or len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Insert a batch; returns ``(written, entries to retry)``"""
+        try:
+            # A savepoint, in case a request thread flushes inside a transaction
+            with transaction.atomic():
+                AttendanceLog.objects.bulk_create(batch, batch_size=self.flush_size)
+            return len(batch), []
+        except DatabaseError:
+            logger.warning('Inserting %d attendance log entries one by one after a failed flush', len(batch),
+                           exc_info=True)
+        written = 0
+        for index, entry in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    entry.save(force_insert=True)
+                written += 1
+            except (IntegrityError, DataError):
+                self.failed += 1
+                logger.exception('Dropped an attendance log entry the database rejected (student %s, device %r)',
+                                 entry.student_id, entry.device_id)
+            except DatabaseError:
+                logger.exception('Keeping %d attendance log entries for the next flush', len(batch) - index)
+                return written, batch[index:]
+        return written, []
+
+    def flush(self, limit=None):
+        """Write queued entries now; returns how many were written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._retry or self._drain(min(limit - written, self.flush_size) if limit else self.flush_size)
+                if not batch:
+                    break
+                batch_written, self._retry = self._write(batch)
+                written += batch_written
+                if self._retry or (limit and written >= limit):
+                    break
+        self.flushed += written
+        return written
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            close_old_connections()
+            self.flush()
+        connection.close()
+
+    def shutdown(self):
+        """Stop the flusher thread and write everything still queued"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self._thread = None
+        written = self.flush()
+        if self._retry:
+            self.failed += len(self._retry)
+            logger.error('Lost %d attendance log entries at shutdown: the database is not taking writes',
+                         len(self._retry))
+            self._retry = []
+        return written
+
+    def __len__(self):
+        return self._queue.qsize() + len(self._retry)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_log_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AttendanceLogBuffer(
+                    max_size=getattr(settings, 'ATTENDANCE_LOG_BUFFER_SIZE', 10_000),
+                    flush_size=getattr(settings, 'ATTENDANCE_LOG_FLUSH_SIZE', 500),
+                    flush_interval=getattr(settings, 'ATTENDANCE_LOG_FLUSH_SECONDS', 2.0),
+                )
+    return _buffer
+
+
+def is_buffered():
+    return getattr(settings, 'ATTENDANCE_LOG_MODE', 'immediate') == 'buffered'
+
+
+def record_attendance_log(entry):
+    """Persist an unsaved ``AttendanceLog`` according to ``ATTENDANCE_LOG_MODE``"""
+    if is_buffered():
+        get_log_buffer().add(entry)
+    else:
+        entry.save()
+    return entry
+
+
+def shutdown_log_buffer():
+    """Flush pending entries; called from gunicorn's worker_exit hook and atexit"""
+    if _buffer is not None:
+        written = _buffer.shutdown()
+        if written:
+            logger.info('Flushed %d buffered attendance log entries at shutdown', written)
+
+
+atexit.register(shutdown_log_buffer)
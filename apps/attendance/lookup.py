@@ -0,0 +1,187 @@
+"""
+In-process barcode -> student lookup table for the check-in path.
+
+The table is warmed with one query and then answers scans from memory.
+Saving or deleting a barcode drops it from this process's table at once
+and bumps a generation number in the shared cache; every process that sees
+a new generation reloads. Without a shared cache backend other processes still
+reload after ``ATTENDANCE_LOOKUP_MAX_AGE_SECONDS``. Expiry needs no invalidation,
+it is checked against ``expires_at`` on every lookup.
+
+Unknown and inactive barcodes are remembered for
+``ATTENDANCE_LOOKUP_MISS_SECONDS`` too, so a revoked card scanned again and
+again (or a scanner reading garbage) does not query on every scan. Misses
+are dropped with the table on a reload and when their barcode is saved.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.core.cache import bump_version, get_version
+
+from .models import StudentBarcode
+
+GENERATION_NAME = 'attendance:barcode-lookup'
+# Remembered misses beyond this are dropped wholesale (random scans cannot grow memory)
+MAX_MISSES = 10_000
+
+
+@dataclass(frozen=True)
+class BarcodeMatch:
+    """Outcome of resolving scanned barcode data"""
+
+    student_id: int = None
+    status: str = 'unknown'  # active, expired, revoked or unknown
+
+    @property
+    def is_valid(self):
+        return self.status == 'active'
+
+
+class BarcodeLookup:
+    """Warm, self-refreshing map of active barcode data to (student_id, expires_at)"""
+
+    def __init__(self):
+        self._entries = None
+        self._misses = {}  # barcode data -> (monotonic time, BarcodeMatch)
+        self._generation = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def check_interval(self):
+        """Seconds between checks of the shared generation number"""
+        return getattr(settings, 'ATTENDANCE_LOOKUP_CHECK_SECONDS', 1.0)
+
+    @property
+    def max_age(self):
+        """Upper bound on staleness for changes made with queryset.update()"""
+        return getattr(settings, 'ATTENDANCE_LOOKUP_MAX_AGE_SECONDS', 300.0)
+
+    @property
+    def miss_seconds(self):
+        """How long an unknown or inactive barcode is answered without a query"""
+        return getattr(settings, 'ATTENDANCE_LOOKUP_MISS_SECONDS', 10.0)
+
+    def _load(self):
+        entries = {
+            barcode_data: (student_id, expires_at)
+            for barcode_data, student_id, expires_at in StudentBarcode.objects.filter(
+                status='active'
+            ).values_list('barcode_data', 'student_id', 'expires_at').iterator(chunk_size=5000)
+        }
+        self._entries = entries
+        self._misses = {}
+        self._loaded_at = self._checked_at = time.monotonic()
+
+    def _refresh_if_stale(self):
+        now = time.monotonic()
+        if self._entries is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._entries is not None and now - self._checked_at < self.check_interval:
+                return
+            generation = get_version(GENERATION_NAME)
+            if (
+                self._entries is None
+                or generation != self._generation
+                or now - self._loaded_at >= self.max_age
+            ):
+                self._load()
+                self._generation = generation
+            self._checked_at = now
+
+    def _known_miss(self, barcode_data, now):
+        miss = self._misses.get(barcode_data)
+        if miss is not None and now - miss[0] < self.miss_seconds:
+            return miss[1]
+        return None
+
+    def _miss(self, barcode_data, match, now):
+        if len(self._misses) >= MAX_MISSES:
+            self._misses = {}
+        self._misses[barcode_data] = (now, match)
+        return match
+
+    def resolve(self, barcode_data):
+        """Resolve scanned data to a ``BarcodeMatch``; hits and recent misses are served from memory"""
+        self._refresh_if_stale()
+        entry = self._entries.get(barcode_data)
+        if entry is None:
+            now = time.monotonic()
+            miss = self._known_miss(barcode_data, now)
+            if miss is not None:
+                return miss
+            # Issued after the table was warmed (e.g. bulk_create), or not active
+            row = StudentBarcode.objects.filter(barcode_data=barcode_data).values_list(
+                'student_id', 'status', 'expires_at'
+            ).first()
+            if row is None:
+                return self._miss(barcode_data, BarcodeMatch(), now)
+            student_id, status, expires_at = row
+            if status != 'active':
+                return self._miss(barcode_data, BarcodeMatch(student_id, status), now)
+            entry = self._entries[barcode_data] = (student_id, expires_at)
+        return self._match(entry, timezone.now())
+
+    def resolve_many(self, barcode_datas):
+        """Resolve many scans at once; all misses are fetched in a single query"""
+        self._refresh_if_stale()
+        now = timezone.now()
+        checked_at = time.monotonic()
+        matches = {}
+        missing = set()
+        for barcode_data in set(barcode_datas):
+            entry = self._entries.get(barcode_data)
+            if entry is not None:
+                matches[barcode_data] = self._match(entry, now)
+            elif (miss := self._known_miss(barcode_data, checked_at)) is not None:
+                matches[barcode_data] = miss
+            else:
+                missing.add(barcode_data)
+
+        if missing:
+            rows = StudentBarcode.objects.filter(barcode_data__in=missing).values_list(
+                'barcode_data', 'student_id', 'status', 'expires_at'
+            )
+            for barcode_data, student_id, status, expires_at in rows:
+                if status == 'active':
+                    entry = self._entries[barcode_data] = (student_id, expires_at)
+                    matches[barcode_data] = self._match(entry, now)
+                else:
+                    matches[barcode_data] = self._miss(barcode_data, BarcodeMatch(student_id, status), checked_at)
+        for barcode_data in missing - matches.keys():
+            matches[barcode_data] = self._miss(barcode_data, BarcodeMatch(), checked_at)
+        return matches
+
+    @staticmethod
+    def _match(entry, now):
+        student_id, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            return BarcodeMatch(student_id, 'expired')
+        return BarcodeMatch(student_id, 'active')
+
+    def invalidate(self, barcode_data=None):
+        """Forget a barcode now and make every process reload on its next scan"""
+        if self._entries is not None and barcode_data:
+            self._entries.pop(barcode_data, None)
+        if barcode_data:
+            self._misses.pop(barcode_data, None)
+        self._checked_at = 0.0
+        bump_generation()
+
+    def clear(self):
+        self._entries = None
+        self._misses = {}
+
+
+def bump_generation():
+    """Invalidate every process's lookup table"""
+    bump_version(GENERATION_NAME)
+
+
+barcode_lookup = BarcodeLookup()
@@ -0,0 +1,65 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.attendance.benchmarks import logged_in_client, seed_scan_fixture
+from apps.attendance.lookup import barcode_lookup
+
+
+class Command(BaseCommand):
+    help = 'Time offline-scan batch ingestion through POST /attendance/sync (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10_000)
+        parser.add_argument('--students', type=int, default=8_000)
+        parser.add_argument('--classes', type=int, default=4)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._run(options)
+            transaction.set_rollback(True)
+        barcode_lookup.clear()
+
+    def _run(self, options):
+        teacher_user, classes, barcodes = seed_scan_fixture(options['students'], options['classes'])
+        barcode_lookup.clear()
+        client = logged_in_client(teacher_user)
+        url = reverse('attendance:sync')
+
+        started_at = timezone.now() - timedelta(minutes=4)
+        events = [
+            {
+                'event_id': f'evt-{n}',
+                'barcode': random.choice(barcodes),
+                'live_class': random.choice(classes).pk,
+                'timestamp': (started_at + timedelta(milliseconds=n * 10)).isoformat(),
+                'lat': '6.927079',
+                'lng': '79.861244',
+            }
+            for n in range(options['events'])
+        ]
+        body = json.dumps({'device_id': 'tablet-1', 'events': events})
+        self.stdout.write(f'Upload size: {len(body) / 1024:.0f} KiB')
+
+        for label in ('first upload', 're-upload'):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.post(url, body, content_type='application/json', secure=not settings.DEBUG)
+                elapsed = time.perf_counter() - started
+            payload = response.json()
+            statuses = {}
+            for result in payload['results']:
+                statuses[result['status']] = statuses.get(result['status'], 0) + 1
+            self.stdout.write(
+                f'{label}: {payload["received"]} events in {elapsed:.2f}s '
+                f'({payload["received"] / elapsed:.0f} events/s, {len(queries.captured_queries)} queries) '
+                f'{statuses}'
+            )
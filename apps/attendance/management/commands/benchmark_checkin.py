@@ -0,0 +1,69 @@
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from apps.attendance.benchmarks import logged_in_client, percentile, seed_scan_fixture
+from apps.attendance.lookup import barcode_lookup
+from apps.attendance.ratelimit import backend as scan_limits
+
+
+class Command(BaseCommand):
+    help = 'Measure POST /attendance/checkin latency end to end (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=5_000, help='Students with barcodes to seed')
+        parser.add_argument('--scans', type=int, default=2_000, help='Check-in requests to time')
+        parser.add_argument('--rescan-ratio', type=float, default=0.2, help='Share of scans that repeat a student')
+        parser.add_argument('--target-ms', type=float, default=20.0, help='p99 budget to check against')
+
+    def handle(self, *args, **options):
+        # One simulated door scanner goes far beyond a real device's scan rate
+        with transaction.atomic(), override_settings(ATTENDANCE_DEVICE_SCAN_LIMIT=0):
+            timings = self._run(options)
+            transaction.set_rollback(True)
+        barcode_lookup.clear()
+        scan_limits.clear()
+
+        p99 = percentile(timings, 0.99)
+        self.stdout.write(
+            f'{len(timings)} scans: p50 {percentile(timings, 0.5):.2f} ms, '
+            f'p95 {percentile(timings, 0.95):.2f} ms, p99 {p99:.2f} ms, '
+            f'max {max(timings):.2f} ms, mean {statistics.fmean(timings):.2f} ms'
+        )
+        if p99 <= options['target_ms']:
+            self.stdout.write(self.style.SUCCESS(f'p99 within {options["target_ms"]} ms budget.'))
+        else:
+            self.stdout.write(self.style.ERROR(f'p99 exceeds {options["target_ms"]} ms budget.'))
+
+    def _run(self, options):
+        teacher_user, (live_class,), barcodes = seed_scan_fixture(options['students'])
+        barcode_lookup.clear()
+        client = logged_in_client(teacher_user)
+        url = reverse('attendance:checkin')
+
+        random.shuffle(barcodes)
+        scanned = []
+        timings = []
+        for n in range(options['scans'] + 1):
+            if scanned and random.random() < options['rescan_ratio']:
+                barcode = random.choice(scanned)
+            else:
+                barcode = barcodes[len(scanned) % len(barcodes)]
+                scanned.append(barcode)
+            body = json.dumps({'barcode': barcode, 'live_class': live_class.pk, 'device_id': 'door-1'})
+
+            started = time.perf_counter()
+            response = client.post(url, body, content_type='application/json', secure=not settings.DEBUG)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200 or not response.json()['success']:
+                raise RuntimeError(f'Check-in failed: {response.status_code} {response.content!r}')
+            if n:  # the first request warms the lookup table
+                timings.append(elapsed)
+        return timings
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.attendance.models import LiveClass
+from apps.attendance.rendering import render_qr_png
+from apps.attendance.tokens import class_qr_png, make_class_token, verify_class_token
+
+
+class Command(BaseCommand):
+    help = 'Measure rotating QR token verification and class QR rendering throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verifications', type=int, default=100_000, help='Tokens to verify')
+        parser.add_argument('--renders', type=int, default=200, help='QR images to fetch')
+
+    def handle(self, *args, **options):
+        ends_at = timezone.now() + timedelta(hours=1)
+        tokens = [make_class_token(pk, ends_at) for pk in range(1, 1001)]
+
+        count = options['verifications']
+        started = time.perf_counter()
+        for n in range(count):
+            if not verify_class_token(tokens[n % len(tokens)]).valid:
+                raise RuntimeError('Freshly issued token failed verification')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Verified {count} tokens in {elapsed:.2f}s '
+            f'({count / elapsed:,.0f}/s, {elapsed / count * 1e6:.1f} us each, no queries)'
+        )
+
+        live_class = LiveClass(pk=1, scheduled_at=timezone.now(), duration_minutes=60)
+        renders = options['renders']
+        started = time.perf_counter()
+        for _ in range(renders):
+            render_qr_png(live_class.checkin_token(), box_size=10)
+        uncached = (time.perf_counter() - started) / renders * 1000
+
+        class_qr_png(live_class)
+        started = time.perf_counter()
+        for _ in range(renders):
+            class_qr_png(live_class)
+        cached = (time.perf_counter() - started) / renders * 1000
+        self.stdout.write(
+            f'QR image: {uncached:.2f} ms rendered, {cached:.3f} ms from cache '
+            f'(rendered once per class per rotation window)'
+        )
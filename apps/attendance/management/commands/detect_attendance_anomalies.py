@@ -0,0 +1,46 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.attendance.anomalies import LOAD_CHUNK_SIZE, detect_anomalies
+
+
+class Command(BaseCommand):
+    help = 'Flag buddy punching, impossible travel and out-of-window check-ins in a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First local date to scan (YYYY-MM-DD); default: 30 days ago')
+        parser.add_argument('--until', help='Last local date to scan (YYYY-MM-DD); default: today')
+        parser.add_argument('--chunk-size', type=int, default=LOAD_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Report findings without storing them')
+
+    def _date(self, value, default):
+        if not value:
+            return default
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date: {value}')
+        return day
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        since = self._date(options['since'], today - timedelta(days=30))
+        until = self._date(options['until'], today)
+        start = timezone.make_aware(datetime.combine(since, datetime.min.time()))
+        end = timezone.make_aware(datetime.combine(until + timedelta(days=1), datetime.min.time()))
+
+        started = time.perf_counter()
+        report = detect_anomalies(start, end, chunk_size=options['chunk_size'], save=not options['dry_run'])
+        elapsed = time.perf_counter() - started
+
+        loaded = ', '.join(f'{count} {name}' for name, count in report.rows_loaded.items())
+        self.stdout.write(f'Scanned {since} to {until}: {loaded} rows in {elapsed:.2f}s')
+        for kind, count in report.found.items():
+            self.stdout.write(f'  {kind}: {count}')
+        if options['dry_run']:
+            self.stdout.write('Dry run: nothing stored.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Stored {report.created} new anomalies.'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from apps.attendance.barcodes import generate_student_barcodes, students_needing_barcodes
+from apps.users.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Generate Code128 and QR images for every student missing a barcode (safe to re-run to resume)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Students rendered and saved per batch')
+        parser.add_argument('--grade', help='Only students in this grade level, e.g. grade_10')
+
+    def handle(self, *args, **options):
+        students = Student.objects.all()
+        if options['grade']:
+            students = students.filter(grade_level=options['grade'])
+
+        total = students_needing_barcodes(students).count()
+        if not total:
+            self.stdout.write('All students already have barcodes.')
+            return
+        self.stdout.write(f'Generating barcodes for {total} student(s)...')
+
+        def progress(stats):
+            self.stdout.write(
+                f'  {stats.students}/{total} students, {stats.images_per_second:.0f} images/s'
+            )
+
+        stats = generate_student_barcodes(
+            students,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {stats.images} images for {stats.students} student(s) in {stats.seconds:.1f}s '
+            f'({stats.images_per_second:.0f} images/s).'
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.attendance.id_cards import write_id_card_pdf
+from apps.attendance.rendering import SheetLayout
+from apps.users.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Render print-ready A4 sheets of student ID cards to a PDF file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the PDF to write')
+        parser.add_argument('--grade', help='Only students in this grade level, e.g. grade_10')
+        parser.add_argument('--columns', type=int, default=SheetLayout.columns)
+        parser.add_argument('--rows', type=int, default=SheetLayout.rows)
+        parser.add_argument('--dpi', type=int, default=SheetLayout.dpi)
+        parser.add_argument('--workers', type=int, default=None, help='Compositing processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        students = Student.objects.all()
+        if options['grade']:
+            students = students.filter(grade_level=options['grade'])
+        layout = SheetLayout(columns=options['columns'], rows=options['rows'], dpi=options['dpi'])
+
+        started = time.perf_counter()
+        with open(options['output'], 'wb') as output:
+            size = write_id_card_pdf(students, output, layout=layout, workers=options['workers'])
+        elapsed = time.perf_counter() - started
+
+        count = students.count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {count} card(s) on {-(-count // layout.cards_per_page)} page(s) '
+            f'to {options["output"]} ({size / 1_048_576:.1f} MB) in {elapsed:.1f}s.'
+        ))
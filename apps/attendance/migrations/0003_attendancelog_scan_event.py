@@ -0,0 +1,27 @@
+# Generated by Django 5.0 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancelog',
+            name='event_id',
+            field=models.CharField(blank=True, help_text='Device-side scan ID, used to ignore re-uploads', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='attendancelog',
+            name='scanned_at',
+            field=models.DateTimeField(blank=True, help_text='When the device scanned (offline sync)', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='attendancelog',
+            constraint=models.UniqueConstraint(condition=models.Q(('event_id', ''), _negated=True), fields=('device_id', 'event_id'), name='unique_device_scan_event'),
+        ),
+    ]
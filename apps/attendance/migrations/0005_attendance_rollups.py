@@ -0,0 +1,86 @@
+# Generated by Django 5.0 on 2026-10-18 10:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DateField, Q
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+ROLLUP_STATUSES = ('present', 'late', 'absent')
+
+
+def populate_attendance_rollups(apps, schema_editor):
+    """Count the attendance recorded before the rollups existed (as rebuild_attendance_rollups does)"""
+    Attendance = apps.get_model('attendance', 'Attendance')
+    CourseDailyAttendance = apps.get_model('attendance', 'CourseDailyAttendance')
+    StudentMonthlyAttendance = apps.get_model('attendance', 'StudentMonthlyAttendance')
+    tz = timezone.get_current_timezone()
+    attendance = Attendance.objects.filter(status__in=ROLLUP_STATUSES)
+    counts = {status: Count('pk', filter=Q(status=status)) for status in ROLLUP_STATUSES}
+
+    def fields(row):
+        return {field: row[field] for field in (*ROLLUP_STATUSES, 'total')}
+
+    daily = attendance.values(
+        'live_class__course_id', day=TruncDate('live_class__scheduled_at', tzinfo=tz)
+    ).annotate(total=Count('pk'), **counts).order_by()
+    CourseDailyAttendance.objects.bulk_create([
+        CourseDailyAttendance(course_id=row['live_class__course_id'], date=row['day'], **fields(row))
+        for row in daily.iterator(chunk_size=1000)
+    ], batch_size=1000)
+    monthly = attendance.values(
+        'student_id', first_day=TruncMonth('live_class__scheduled_at', output_field=DateField(), tzinfo=tz)
+    ).annotate(total=Count('pk'), **counts).order_by()
+    StudentMonthlyAttendance.objects.bulk_create([
+        StudentMonthlyAttendance(student_id=row['student_id'], month=row['first_day'], **fields(row))
+        for row in monthly.iterator(chunk_size=1000)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_attendancelog_timestamp_default'),
+        ('courses', '0003_course_active_enrollment_count'),
+        ('users', '0002_studentidsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseDailyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Local date the live classes were scheduled on')),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('late', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_attendance', to='courses.course')),
+            ],
+            options={
+                'verbose_name': 'Course Daily Attendance',
+                'verbose_name_plural': 'Course Daily Attendance',
+                'ordering': ['-date'],
+                'unique_together': {('course', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentMonthlyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('late', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_attendance', to='users.student')),
+            ],
+            options={
+                'verbose_name': 'Student Monthly Attendance',
+                'verbose_name_plural': 'Student Monthly Attendance',
+                'ordering': ['-month'],
+                'unique_together': {('student', 'month')},
+            },
+        ),
+        migrations.RunPython(populate_attendance_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-18 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0005_attendance_rollups'),
+        ('users', '0002_studentidsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('buddy_punching', 'Buddy Punching'), ('impossible_travel', 'Impossible Travel'), ('outside_window', 'Check-in Outside Class Window')], max_length=20)),
+                ('device_id', models.CharField(blank=True, max_length=100)),
+                ('occurred_at', models.DateTimeField()),
+                ('score', models.FloatField(help_text='Students per device, km/h, or minutes outside the window')),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('fingerprint', models.CharField(help_text='Identifies the finding so re-runs do not repeat it', max_length=64, unique=True)),
+                ('reviewed', models.BooleanField(default=False)),
+                ('detected_at', models.DateTimeField(auto_now_add=True)),
+                ('attendance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='attendance.attendance')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_anomalies', to='users.student')),
+            ],
+            options={
+                'verbose_name': 'Attendance Anomaly',
+                'verbose_name_plural': 'Attendance Anomalies',
+                'ordering': ['-occurred_at'],
+                'indexes': [models.Index(fields=['kind', 'occurred_at'], name='attendance__kind_5e6668_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,7 @@
+from datetime import timedelta
+
 from django.db import models
+from django.utils import timezone
 from apps.users.models import Student
 from apps.courses.models import Course
 
@@ -56,6 +59,15 @@ class LiveClass(models.Model):
     def __str__(self):
         return f"{self.course.title} - {self.title}"
 
+    @property
+    def ends_at(self):
+        return self.scheduled_at + timedelta(minutes=self.duration_minutes)
+
+    def checkin_token(self, timestamp=None):
+        """Signed check-in token for the current QR rotation window"""
+        from .tokens import make_class_token
+        return make_class_token(self.pk, self.ends_at, timestamp)
+
 
 class Attendance(models.Model):
     """Attendance record for live classes"""
@@ -105,16 +117,98 @@ class AttendanceLog(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     attendance = models.ForeignKey(Attendance, on_delete=models.CASCADE, null=True, blank=True)
     action = models.CharField(max_length=15, choices=ACTION_CHOICES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered entries are bulk-inserted later but keep the time they were recorded
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     success = models.BooleanField()
     failure_reason = models.CharField(max_length=100, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     device_id = models.CharField(max_length=100, blank=True)
+    event_id = models.CharField(max_length=64, blank=True, help_text="Device-side scan ID, used to ignore re-uploads")
+    scanned_at = models.DateTimeField(null=True, blank=True, help_text="When the device scanned (offline sync)")
 
     class Meta:
         verbose_name = 'Attendance Log'
         verbose_name_plural = 'Attendance Logs'
         ordering = ['-timestamp']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['device_id', 'event_id'],
+                condition=~models.Q(event_id=''),
+                name='unique_device_scan_event',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.student.user.get_full_name()} - {self.action} at {self.timestamp}"
+
+
+class CourseDailyAttendance(models.Model):
+    """Attendance counts per course per day, maintained by apps.attendance.rollups"""
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_attendance')
+    date = models.DateField(help_text="Local date the live classes were scheduled on")
+    present = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Course Daily Attendance'
+        verbose_name_plural = 'Course Daily Attendance'
+        unique_together = ['course', 'date']
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.course.title} - {self.date}: {self.present + self.late}/{self.total}"
+
+
+class StudentMonthlyAttendance(models.Model):
+    """Attendance counts per student per month, maintained by apps.attendance.rollups"""
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='monthly_attendance')
+    month = models.DateField(help_text="First day of the month")
+    present = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Student Monthly Attendance'
+        verbose_name_plural = 'Student Monthly Attendance'
+        unique_together = ['student', 'month']
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.student} - {self.month:%Y-%m}: {self.present + self.late}/{self.total}"
+
+
+class AttendanceAnomaly(models.Model):
+    """Suspicious attendance pattern flagged by the anomaly detection job"""
+
+    KIND_CHOICES = [
+        ('buddy_punching', 'Buddy Punching'),
+        ('impossible_travel', 'Impossible Travel'),
+        ('outside_window', 'Check-in Outside Class Window'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    student = models.ForeignKey(
+        Student, on_delete=models.CASCADE, null=True, blank=True, related_name='attendance_anomalies'
+    )
+    attendance = models.ForeignKey(Attendance, on_delete=models.CASCADE, null=True, blank=True)
+    device_id = models.CharField(max_length=100, blank=True)
+    occurred_at = models.DateTimeField()
+    score = models.FloatField(help_text="Students per device, km/h, or minutes outside the window")
+    details = models.JSONField(default=dict, blank=True)
+    fingerprint = models.CharField(max_length=64, unique=True, help_text="Identifies the finding so re-runs do not repeat it")
+    reviewed = models.BooleanField(default=False)
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Attendance Anomaly'
+        verbose_name_plural = 'Attendance Anomalies'
+        ordering = ['-occurred_at']
+        indexes = [models.Index(fields=['kind', 'occurred_at'])]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} at {self.occurred_at:%Y-%m-%d %H:%M}"
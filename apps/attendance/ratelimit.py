@@ -0,0 +1,183 @@
+"""
+Scan rate limiting and duplicate-scan suppression for barcode check-in.
+
+Three checks sit in front of ``check_in``:
+
+* a repeat scan of the same barcode for the same class within
+  ``ATTENDANCE_DUPLICATE_SCAN_SECONDS`` is coalesced: it gets the first
+  scan's result back without touching ``Attendance``;
+* a barcode scanned more than ``ATTENDANCE_BARCODE_SCAN_LIMIT`` times, or a
+  device scanning more than ``ATTENDANCE_DEVICE_SCAN_LIMIT`` times, within
+  ``ATTENDANCE_SCAN_LIMIT_WINDOW_SECONDS`` is rejected.
+
+Limits use a sliding-window counter: the current and previous fixed
+windows' counts, with the previous one weighted by how much of it still
+overlaps the sliding window. That is two integers per key, however many
+scans it sees. A rejected hit is not counted, so a key that keeps going
+over its limit is let through again at the limit's rate rather than
+locked out for as long as it keeps trying. ``ATTENDANCE_RATELIMIT_BACKEND`` selects where the state
+lives: ``LocalBackend`` (per process, for a single node) or
+``CacheBackend`` (the default cache, shared when that is Redis/Memcached;
+the local-memory cache stands in for it in tests).
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+KEY_PREFIX = 'attendance:scan'
+
+
+def sliding_window_estimate(previous, current, window, now):
+    """Weighted count of hits in the sliding window ending at ``now``"""
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+
+class LocalBackend:
+    """In-process state; correct for one process, per process with several"""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._counters = {}  # key -> [window index, current count, previous count]
+        self._results = {}  # key -> (expires at, value)
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        """Record a hit; False if it goes over ``limit`` per ``window`` seconds"""
+        now = time.time()
+        index = int(now // window)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                if len(self._counters) >= self.max_keys:
+                    self._prune(now, window)
+                counter = self._counters[key] = [index, 0, 0]
+            if counter[0] != index:
+                counter[2] = counter[1] if counter[0] == index - 1 else 0
+                counter[0], counter[1] = index, 0
+            if sliding_window_estimate(counter[2], counter[1] + 1, window, now) > limit:
+                return False
+            counter[1] += 1
+            return True
+
+    def recall(self, key):
+        """Value remembered for ``key`` and not yet expired, or None"""
+        entry = self._results.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        return None
+
+    def remember(self, key, value, window):
+        """Keep ``value`` for ``window`` seconds unless ``key`` already holds one"""
+        now = time.time()
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and entry[0] > now:
+                return
+            if len(self._results) >= self.max_keys:
+                self._results = {k: v for k, v in self._results.items() if v[0] > now}
+            self._results[key] = (now + window, value)
+
+    def _prune(self, now, window):
+        # Keys idle for two windows carry no weight any more
+        oldest = int(now // window) - 1
+        self._counters = {k: v for k, v in self._counters.items() if v[0] >= oldest}
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._results.clear()
+
+
+class CacheBackend:
+    """State in a Django cache, shared by every process using the same cache server"""
+
+    def __init__(self, alias=None):
+        self.alias = alias or getattr(settings, 'ATTENDANCE_RATELIMIT_CACHE', 'default')
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _key(kind, key, *parts):
+        # Device ids are free text; hashing keeps keys valid for memcached
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return ':'.join([KEY_PREFIX, kind, digest, *map(str, parts)])
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        index = int(now // window)
+        current_key = self._key('n', key, index)
+        timeout = int(window * 2) + 1
+        # add + incr are atomic on shared backends, so concurrent workers never lose a hit
+        self.cache.add(current_key, 0, timeout=timeout)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:  # expired between add and incr
+            self.cache.set(current_key, 1, timeout=timeout)
+            current = 1
+        previous = self.cache.get(self._key('n', key, index - 1), 0)
+        if sliding_window_estimate(previous, current, window, now) > limit:
+            # Take the rejected hit back out, as LocalBackend never counts it
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            return False
+        return True
+
+    def recall(self, key):
+        return self.cache.get(self._key('result', key))
+
+    def remember(self, key, value, window):
+        self.cache.add(self._key('result', key), value, timeout=window)
+
+    def clear(self):
+        pass
+
+
+def _load_backend():
+    path = getattr(settings, 'ATTENDANCE_RATELIMIT_BACKEND', 'apps.attendance.ratelimit.LocalBackend')
+    return import_string(path)()
+
+
+backend = SimpleLazyObject(_load_backend)
+
+
+def scan_limit_window():
+    return getattr(settings, 'ATTENDANCE_SCAN_LIMIT_WINDOW_SECONDS', 60)
+
+
+def scan_limit_reason(barcode_data, device_id=''):
+    """'' if the scan may proceed, otherwise the failure reason"""
+    window = scan_limit_window()
+    barcode_limit = getattr(settings, 'ATTENDANCE_BARCODE_SCAN_LIMIT', 10)
+    device_limit = getattr(settings, 'ATTENDANCE_DEVICE_SCAN_LIMIT', 120)
+    if device_id and device_limit and not backend.hit(f'device:{device_id}', device_limit, window):
+        return 'device_rate_limited'
+    if barcode_limit and not backend.hit(f'barcode:{barcode_data}', barcode_limit, window):
+        return 'barcode_rate_limited'
+    return ''
+
+
+def duplicate_scan_window():
+    return getattr(settings, 'ATTENDANCE_DUPLICATE_SCAN_SECONDS', 30)
+
+
+def earlier_scan(barcode_data, live_class_id):
+    """Result of a successful scan of this barcode for this class within the duplicate window"""
+    if not duplicate_scan_window():
+        return None
+    return backend.recall(f'{live_class_id}:{barcode_data}')
+
+
+def remember_scan(barcode_data, live_class_id, result):
+    """Remember a successful scan's result (a plain dict, so it can live in a shared cache)"""
+    if duplicate_scan_window():
+        backend.remember(f'{live_class_id}:{barcode_data}', result, duplicate_scan_window())
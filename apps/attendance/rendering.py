@@ -0,0 +1,185 @@
+"""
+Pure image rendering helpers used inside process pool workers.
+
+Nothing here imports Django models, so workers started with ``spawn`` or
+``forkserver`` can import this module without configuring Django.
+"""
+import io
+from dataclasses import dataclass
+from functools import lru_cache
+
+BARCODE_OPTIONS = {'module_height': 12, 'font_size': 8, 'text_distance': 4, 'quiet_zone': 2}
+QR_BOX_SIZE = 6
+
+
+def render_barcode_images(barcode_data):
+    """Render ``(code128_png, qr_png)`` bytes for the given barcode data"""
+    from barcode import Code128
+    from barcode.writer import ImageWriter
+
+    code128 = io.BytesIO()
+    Code128(barcode_data, writer=ImageWriter()).write(code128, options=BARCODE_OPTIONS)
+
+    return code128.getvalue(), render_qr_png(barcode_data)
+
+
+def render_qr_png(data, box_size=QR_BOX_SIZE, border=2):
+    """Render ``data`` as a QR code PNG"""
+    import qrcode
+
+    output = io.BytesIO()
+    qrcode.make(data, box_size=box_size, border=border).save(output, format='PNG')
+    return output.getvalue()
+
+
+# Print-ready ID card sheets
+
+MM_PER_INCH = 25.4
+A4_MM = (210.0, 297.0)
+CARD_MM = (85.6, 54.0)  # ISO/IEC 7810 ID-1, the usual ID card size
+
+
+@dataclass(frozen=True)
+class SheetLayout:
+    """Page geometry for a sheet of ID cards"""
+
+    columns: int = 2
+    rows: int = 5
+    dpi: int = 300
+    jpeg_quality: int = 85
+    title: str = 'Achievers Learning Center'
+
+    @property
+    def cards_per_page(self):
+        return self.columns * self.rows
+
+    def px(self, mm):
+        return round(mm / MM_PER_INCH * self.dpi)
+
+    @property
+    def page_size_px(self):
+        return self.px(A4_MM[0]), self.px(A4_MM[1])
+
+    @property
+    def page_size_pt(self):
+        return A4_MM[0] / MM_PER_INCH * 72, A4_MM[1] / MM_PER_INCH * 72
+
+
+@dataclass(frozen=True)
+class CardSpec:
+    """Everything needed to draw one card; ``photo``/``barcode`` are file paths or bytes"""
+
+    name: str
+    student_id_number: str
+    barcode_data: str = ''
+    photo: object = None
+    barcode: object = None
+
+
+def _open_image(source, size):
+    from PIL import Image
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+    # Lets the JPEG decoder downscale by 2/4/8 while decoding, never below ``size``
+    image.draft('RGB', size)
+    return image.convert('RGB')
+
+
+def _fit_photo(source, size):
+    """Decode and crop-to-fill a profile photo"""
+    from PIL import ImageOps
+
+    if source is None:
+        return _placeholder_photo(size)
+    try:
+        return ImageOps.fit(_open_image(source, size), size)
+    except OSError:
+        return _placeholder_photo(size)
+
+
+def _fit_barcode(source, barcode_data, size):
+    """Decode a stored barcode image, or render one from its data"""
+    from PIL import Image
+
+    if source is None and barcode_data:
+        source = render_barcode_images(barcode_data)[0]
+    if source is None:
+        return Image.new('RGB', size, 'white')
+    image = _open_image(source, size)
+    image.thumbnail(size)
+    return image
+
+
+@lru_cache(maxsize=4)
+def _placeholder_photo(size):
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', size, '#dfe3e8')
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    draw.ellipse((width * 0.3, height * 0.18, width * 0.7, height * 0.5), fill='#aab2bd')
+    draw.ellipse((width * 0.12, height * 0.56, width * 0.88, height * 1.2), fill='#aab2bd')
+    return image
+
+
+@lru_cache(maxsize=8)
+def _font(size):
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _draw_card(page, draw, origin, card, layout):
+    left, top = origin
+    width, height = layout.px(CARD_MM[0]), layout.px(CARD_MM[1])
+    pad = layout.px(3)
+
+    header_height = layout.px(9)
+    draw.rounded_rectangle(
+        (left, top, left + width, top + header_height), radius=layout.px(3), fill='#1f3c88',
+        corners=(True, True, False, False),
+    )
+    draw.text((left + pad, top + layout.px(2.5)), layout.title, font=_font(layout.px(3.4)), fill='white')
+    draw.rounded_rectangle((left, top, left + width, top + height), radius=layout.px(3), outline='#555', width=2)
+
+    photo_size = (layout.px(22), layout.px(28))
+    # Every student has their own photo and barcode, so only the placeholder is cached
+    page.paste(_fit_photo(card.photo, photo_size), (left + pad, top + header_height + pad))
+
+    text_left = left + pad * 2 + photo_size[0]
+    text_top = top + header_height + pad
+    draw.text((text_left, text_top), card.name, font=_font(layout.px(3.6)), fill='black')
+    draw.text((text_left, text_top + layout.px(6)), card.student_id_number, font=_font(layout.px(3.2)), fill='#333')
+
+    barcode_box = (width - photo_size[0] - pad * 4, layout.px(18))
+    barcode = _fit_barcode(card.barcode, card.barcode_data, barcode_box)
+    page.paste(barcode, (text_left, top + height - pad - barcode.height))
+
+
+def compose_page(cards, layout):
+    """Draw up to ``layout.cards_per_page`` cards onto an A4 page and return JPEG bytes"""
+    from PIL import Image, ImageDraw
+
+    page_width, page_height = layout.page_size_px
+    card_width, card_height = layout.px(CARD_MM[0]), layout.px(CARD_MM[1])
+    gap = layout.px(4)
+    grid_width = layout.columns * card_width + (layout.columns - 1) * gap
+    grid_height = layout.rows * card_height + (layout.rows - 1) * gap
+    margin_left = (page_width - grid_width) // 2
+    margin_top = (page_height - grid_height) // 2
+
+    page = Image.new('RGB', (page_width, page_height), 'white')
+    draw = ImageDraw.Draw(page)
+    for index, card in enumerate(cards):
+        row, column = divmod(index, layout.columns)
+        origin = (margin_left + column * (card_width + gap), margin_top + row * (card_height + gap))
+        _draw_card(page, draw, origin, card, layout)
+
+    output = io.BytesIO()
+    page.save(output, format='JPEG', quality=layout.jpeg_quality, dpi=(layout.dpi, layout.dpi))
+    return output.getvalue()
@@ -0,0 +1,173 @@
+"""
+Pre-aggregated attendance counts for reports.
+
+``CourseDailyAttendance`` (per course per local day) and
+``StudentMonthlyAttendance`` (per student per month) are kept current by
+applying deltas as attendance is written: the check-in and sync paths call
+``apply_attendance_changes`` for the rows they bulk insert, and the
+``Attendance`` / ``LiveClass`` signals cover saves, status edits, moves and
+deletes. Deltas are F() updates, so concurrent writers never overwrite each
+other; decrements stop at zero, so a bucket that has drifted low cannot
+trip the counters' non-negative constraints and fail the write that
+touched it. Migration 0005 filled the tables from the attendance recorded
+before them; ``rebuild_attendance_rollups`` recomputes them from scratch.
+
+Reports read the rollups: a year of a course is at most 366 rows.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Greatest, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Attendance, CourseDailyAttendance, LiveClass, StudentMonthlyAttendance
+
+ROLLUP_STATUSES = ('present', 'late', 'absent')
+UPDATE_CHUNK_SIZE = 500
+BULK_BATCH_SIZE = 1000
+
+
+def rollup_day(scheduled_at):
+    """Local date a class counts towards"""
+    return timezone.localdate(scheduled_at)
+
+
+def apply_attendance_changes(changes):
+    """Shift the rollups by ``(course_id, scheduled_at, student_id, status, delta)`` changes"""
+    daily = defaultdict(Counter)
+    monthly = defaultdict(Counter)
+    for course_id, scheduled_at, student_id, status, delta in changes:
+        if status not in ROLLUP_STATUSES or not delta:
+            continue
+        day = rollup_day(scheduled_at)
+        daily[(day, course_id)][status] += delta
+        monthly[(day.replace(day=1), student_id)][status] += delta
+    if not daily:
+        return
+    with transaction.atomic():
+        _apply(CourseDailyAttendance, 'date', 'course_id', daily)
+        _apply(StudentMonthlyAttendance, 'month', 'student_id', monthly)
+
+
+def _apply(model, period_field, owner_field, buckets):
+    buckets = {key: counts for key, counts in buckets.items() if any(counts.values())}
+    # Only buckets gaining counts are created: decrements can come from cascade
+    # deletes of the course or student, whose rollup rows may already be gone
+    model.objects.bulk_create(
+        [
+            model(**{period_field: period, owner_field: owner})
+            for (period, owner), counts in buckets.items()
+            if any(delta > 0 for delta in counts.values())
+        ],
+        batch_size=BULK_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    # Buckets with the same period and the same deltas share one UPDATE
+    # (a synced class is one UPDATE for every student's month, not one each)
+    groups = defaultdict(list)
+    for (period, owner), counts in buckets.items():
+        groups[(period, tuple(counts[status] for status in ROLLUP_STATUSES))].append(owner)
+    for (period, deltas), owners in groups.items():
+        changes = {status: _shift(status, delta) for status, delta in zip(ROLLUP_STATUSES, deltas) if delta}
+        if sum(deltas):
+            changes['total'] = _shift('total', sum(deltas))
+        for start in range(0, len(owners), UPDATE_CHUNK_SIZE):
+            model.objects.filter(
+                **{period_field: period, f'{owner_field}__in': owners[start:start + UPDATE_CHUNK_SIZE]}
+            ).update(**changes)
+
+
+def _shift(field, delta):
+    return F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+
+
+def class_buckets(live_class_ids):
+    """``{live_class_id: (course_id, scheduled_at)}`` for computing changes"""
+    return {
+        pk: (course_id, scheduled_at)
+        for pk, course_id, scheduled_at in LiveClass.objects.filter(
+            pk__in=set(live_class_ids)
+        ).values_list('pk', 'course_id', 'scheduled_at')
+    }
+
+
+def rebuild_rollups(since=None):
+    """Recompute the rollups from ``Attendance``, from the month containing ``since`` onwards
+
+    Run it when check-ins are quiet: deltas applied while it runs are lost.
+    Returns ``(daily_rows, monthly_rows)`` written.
+    """
+    tz = timezone.get_current_timezone()
+    attendance = Attendance.objects.filter(status__in=ROLLUP_STATUSES)
+    daily_rows = CourseDailyAttendance.objects.all()
+    monthly_rows = StudentMonthlyAttendance.objects.all()
+    if since is not None:
+        month = since.replace(day=1)
+        attendance = attendance.filter(
+            live_class__scheduled_at__gte=timezone.make_aware(datetime.combine(month, time.min), tz)
+        )
+        daily_rows = daily_rows.filter(date__gte=month)
+        monthly_rows = monthly_rows.filter(month__gte=month)
+
+    counts = {status: Count('pk', filter=Q(status=status)) for status in ROLLUP_STATUSES}
+    daily = attendance.values(
+        'live_class__course_id', day=TruncDate('live_class__scheduled_at', tzinfo=tz)
+    ).annotate(total=Count('pk'), **counts).order_by()
+    monthly = attendance.values(
+        'student_id', first_day=TruncMonth('live_class__scheduled_at', output_field=DateField(), tzinfo=tz)
+    ).annotate(total=Count('pk'), **counts).order_by()
+
+    with transaction.atomic():
+        daily_rows.delete()
+        monthly_rows.delete()
+        written_daily = _insert_rows(CourseDailyAttendance, (
+            CourseDailyAttendance(course_id=row['live_class__course_id'], date=row['day'], **_counts(row))
+            for row in daily.iterator(chunk_size=BULK_BATCH_SIZE)
+        ))
+        written_monthly = _insert_rows(StudentMonthlyAttendance, (
+            StudentMonthlyAttendance(student_id=row['student_id'], month=row['first_day'], **_counts(row))
+            for row in monthly.iterator(chunk_size=BULK_BATCH_SIZE)
+        ))
+    return written_daily, written_monthly
+
+
+def _counts(row):
+    return {field: row[field] for field in (*ROLLUP_STATUSES, 'total')}
+
+
+def _insert_rows(model, rows):
+    written = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BULK_BATCH_SIZE:
+            written += len(model.objects.bulk_create(batch))
+            batch = []
+    if batch:
+        written += len(model.objects.bulk_create(batch))
+    return written
+
+
+def course_attendance_report(course_id, start, end, period='day'):
+    """Counts for a course between two dates, grouped by ``day``, ``week`` or ``month``"""
+    rows = CourseDailyAttendance.objects.filter(course_id=course_id, date__range=(start, end))
+    if period == 'day':
+        return list(rows.order_by('date').values('date', *ROLLUP_STATUSES, 'total'))
+    trunc = {'week': TruncWeek, 'month': TruncMonth}[period]
+    return list(
+        rows.annotate(period_start=trunc('date', output_field=DateField()))
+        .values('period_start')
+        .annotate(**{field: Sum(field) for field in (*ROLLUP_STATUSES, 'total')})
+        .order_by('period_start')
+    )
+
+
+def student_attendance_report(student_id, start, end):
+    """Monthly counts for a student between two dates"""
+    return list(
+        StudentMonthlyAttendance.objects.filter(
+            student_id=student_id, month__range=(start.replace(day=1), end)
+        ).order_by('month').values('month', *ROLLUP_STATUSES, 'total')
+    )
@@ -0,0 +1,95 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .checkin import forget_live_class
+from .lookup import barcode_lookup
+from .models import Attendance, LiveClass, StudentBarcode
+from .rollups import apply_attendance_changes, class_buckets, rollup_day
+
+
+@receiver(post_save, sender=StudentBarcode)
+@receiver(post_delete, sender=StudentBarcode)
+def invalidate_barcode_lookup(sender, instance, **kwargs):
+    """Keep the in-process check-in lookup table in step with barcode changes"""
+    barcode_lookup.invalidate(instance.barcode_data)
+
+
+@receiver(post_save, sender=LiveClass)
+@receiver(post_delete, sender=LiveClass)
+def forget_cached_live_class(sender, instance, **kwargs):
+    forget_live_class(instance.pk)
+
+
+_UNKNOWN = object()
+_ROLLUP_FIELDS = ('live_class_id', 'student_id', 'status')
+
+
+@receiver(post_init, sender=Attendance)
+def remember_attendance_state(sender, instance, **kwargs):
+    """Record what the row was counted as so saves can compute rollup deltas"""
+    # Read __dict__ directly so deferred fields are not loaded here
+    if instance.pk is None:
+        instance._rolled_up = None
+    else:
+        instance._rolled_up = tuple(instance.__dict__.get(field, _UNKNOWN) for field in _ROLLUP_FIELDS)
+
+
+@receiver(pre_save, sender=Attendance)
+@receiver(pre_delete, sender=Attendance)
+def load_attendance_state(sender, instance, raw=False, **kwargs):
+    """Fetch the stored state if it was deferred when the instance was loaded"""
+    if raw or instance._state.adding:
+        return
+    if instance._rolled_up is None or _UNKNOWN in instance._rolled_up:
+        instance._rolled_up = Attendance.objects.filter(pk=instance.pk).values_list(*_ROLLUP_FIELDS).first()
+
+
+def _changes(states):
+    buckets = class_buckets(state[0] for state, _ in states)
+    return [
+        (*buckets[live_class_id], student_id, status, delta)
+        for (live_class_id, student_id, status), delta in states
+        if live_class_id in buckets
+    ]
+
+
+@receiver(post_save, sender=Attendance)
+def update_attendance_rollups(sender, instance, created, raw=False, **kwargs):
+    """Move the row's count between rollup buckets when it is added or edited"""
+    if raw:
+        return
+    current = (instance.live_class_id, instance.student_id, instance.status)
+    previous = None if created else instance._rolled_up
+    if previous != current:
+        states = [(current, 1)]
+        if previous:
+            states.append((previous, -1))
+        apply_attendance_changes(_changes(states))
+    instance._rolled_up = current
+
+
+@receiver(post_delete, sender=Attendance)
+def release_attendance_rollups(sender, instance, **kwargs):
+    if instance._rolled_up:
+        apply_attendance_changes(_changes([(instance._rolled_up, -1)]))
+
+
+@receiver(post_init, sender=LiveClass)
+def remember_live_class_bucket(sender, instance, **kwargs):
+    instance._rollup_bucket = (instance.__dict__.get('course_id'), instance.__dict__.get('scheduled_at'))
+
+
+@receiver(post_save, sender=LiveClass)
+def move_live_class_rollups(sender, instance, created, raw=False, **kwargs):
+    """Re-bucket a class's attendance when it is rescheduled to another day or course"""
+    course_id, scheduled_at = instance._rollup_bucket
+    instance._rollup_bucket = (instance.course_id, instance.scheduled_at)
+    if raw or created or None in (course_id, scheduled_at):
+        return
+    if course_id == instance.course_id and rollup_day(scheduled_at) == rollup_day(instance.scheduled_at):
+        return
+    changes = []
+    for student_id, status in instance.attendances.values_list('student_id', 'status'):
+        changes.append((course_id, scheduled_at, student_id, status, -1))
+        changes.append((instance.course_id, instance.scheduled_at, student_id, status, 1))
+    apply_attendance_changes(changes)
@@ -0,0 +1,305 @@
+"""
+Batched ingestion of scans recorded offline by attendance devices.
+
+A whole upload is processed with a fixed number of statements regardless of
+its size: one lookup for unknown barcodes, one for the live classes, one
+for existing attendance, one for already-synced events, then one
+``bulk_create`` each for ``Attendance`` and ``AttendanceLog`` (plus a few
+grouped rollup updates, see ``rollups``). Re-uploading
+the same events is harmless: attendance is unique per student and class,
+and logs are unique per ``(device_id, event_id)``. The earliest scan of a
+student for a class becomes the check-in, also when the row already exists
+from a later scan (one extra UPDATE per such row). If a concurrent check-in
+inserts one of the new rows first, the batch is inserted row by row and the
+rows that lost are treated as existing ones; the rollups only count the
+rows this upload inserted.
+"""
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .checkin import attendance_status_for, check_in_window_error, parse_coordinate
+from .live import notify_checkin
+from .lookup import barcode_lookup
+from .models import Attendance, AttendanceLog, LiveClass
+from .rollups import apply_attendance_changes
+
+BULK_BATCH_SIZE = 1000
+# Devices' clocks drift; scans slightly "in the future" are still accepted
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+class InvalidScanEvent(ValueError):
+    pass
+
+
+@dataclass
+class ScanEvent:
+    index: int
+    event_id: str
+    barcode: str
+    live_class_id: int
+    scanned_at: datetime
+    device_id: str = ''
+    location_lat: Decimal = None
+    location_lng: Decimal = None
+    student_id: int = None
+    result: dict = field(default_factory=dict)
+
+
+def _parse_timestamp(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise InvalidScanEvent('invalid_timestamp')
+    try:
+        # None for malformed strings, ValueError for impossible dates such as February 30
+        parsed = parse_datetime(str(value or ''))
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise InvalidScanEvent('invalid_timestamp')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_coordinate(value, limit):
+    try:
+        return parse_coordinate(value, limit)
+    except ValueError:
+        raise InvalidScanEvent('invalid_location')
+
+
+def parse_event(index, raw, default_device_id=''):
+    """Validate one raw event dict into a ``ScanEvent``"""
+    if not isinstance(raw, dict):
+        raise InvalidScanEvent('invalid_event')
+    barcode = str(raw.get('barcode') or '').strip()
+    if not barcode:
+        raise InvalidScanEvent('missing_barcode')
+    try:
+        live_class_id = int(raw.get('live_class'))
+    except (TypeError, ValueError):
+        raise InvalidScanEvent('invalid_live_class')
+    scanned_at = _parse_timestamp(raw.get('timestamp'))
+    device_id = str(raw.get('device_id') or default_device_id)[:100]
+    event_id = str(raw.get('event_id') or '')[:64]
+    if not event_id:
+        # Deterministic fallback so re-uploads of the same scan still collapse
+        digest = hashlib.sha256(f'{barcode}|{live_class_id}|{scanned_at.isoformat()}'.encode())
+        event_id = digest.hexdigest()[:64]
+    return ScanEvent(
+        index=index,
+        event_id=event_id,
+        barcode=barcode,
+        live_class_id=live_class_id,
+        scanned_at=scanned_at,
+        device_id=device_id,
+        location_lat=_parse_coordinate(raw.get('lat'), 90),
+        location_lng=_parse_coordinate(raw.get('lng'), 180),
+    )
+
+
+def _move_check_ins_earlier(first_scans, existing, live_classes):
+    """Give existing rows the time of an earlier scan in this batch; returns the keys moved
+
+    A device that was offline can upload a scan from before the student's
+    online check-in. The row then takes the earlier scan's time, device and
+    location, and a present/late status is worked out again from it (any
+    other status was set by hand and stays). One UPDATE per moved row, and
+    only if the row still has the time it was read with.
+    """
+    moved = set()
+    changes = []
+    for key, event in first_scans.items():
+        pk, status, check_in_time = existing[key]
+        if check_in_time is not None and check_in_time <= event.scanned_at:
+            continue
+        live_class = live_classes[event.live_class_id]
+        new_status = attendance_status_for(live_class, event.scanned_at) if status in ('present', 'late') else status
+        updated = Attendance.objects.filter(pk=pk, check_in_time=check_in_time).update(
+            check_in_time=event.scanned_at,
+            status=new_status,
+            device_info=event.device_id,
+            location_lat=event.location_lat,
+            location_lng=event.location_lng,
+        )
+        if not updated:
+            continue
+        moved.add(key)
+        existing[key] = (pk, new_status, event.scanned_at)
+        if new_status != status:
+            changes.append((live_class[3], live_class[0], event.student_id, status, -1))
+            changes.append((live_class[3], live_class[0], event.student_id, new_status, 1))
+    apply_attendance_changes(changes)
+    return moved
+
+
+def _existing_rows(keys):
+    """``{(live_class_id, student_id): (pk, status, check_in_time)}`` for the rows that exist"""
+    rows = Attendance.objects.filter(
+        live_class_id__in={key[0] for key in keys},
+        student_id__in={key[1] for key in keys},
+    ).values_list('live_class_id', 'student_id', 'pk', 'status', 'check_in_time')
+    return {(live_class_id, student_id): tuple(row) for live_class_id, student_id, *row in rows}
+
+
+def _insert_attendance(new_attendance):
+    """Insert the new rows; returns the ones inserted, without those another writer inserted first"""
+    try:
+        with transaction.atomic():
+            Attendance.objects.bulk_create(new_attendance.values(), batch_size=BULK_BATCH_SIZE)
+        return new_attendance
+    except IntegrityError:
+        pass
+    inserted = {}
+    for key, attendance in new_attendance.items():
+        attendance.pk = None
+        try:
+            with transaction.atomic():
+                Attendance.objects.bulk_create([attendance])
+        except IntegrityError:
+            continue
+        inserted[key] = attendance
+    return inserted
+
+
+def ingest_scan_events(raw_events, default_device_id='', ip_address=None):
+    """Ingest a batch of offline scans and return one result dict per input event"""
+    now = timezone.now()
+    results = [None] * len(raw_events)
+    events = []
+    for index, raw in enumerate(raw_events):
+        try:
+            event = parse_event(index, raw, default_device_id)
+        except InvalidScanEvent as exc:
+            results[index] = {'index': index, 'success': False, 'status': str(exc)}
+            continue
+        event.result = {'index': index, 'event_id': event.event_id}
+        events.append(event)
+
+    matches = barcode_lookup.resolve_many(event.barcode for event in events)
+    live_classes = {
+        pk: row
+        for pk, *row in LiveClass.objects.filter(
+            pk__in={event.live_class_id for event in events}
+        ).values_list('pk', 'scheduled_at', 'duration_minutes', 'status', 'course_id')
+    }
+    synced = set(
+        AttendanceLog.objects.filter(
+            device_id__in={event.device_id for event in events},
+            event_id__in={event.event_id for event in events},
+        ).values_list('device_id', 'event_id')
+    )
+
+    def fail(event, reason):
+        event.result.update(success=False, status=reason)
+
+    accepted = []
+    for event in events:
+        match = matches[event.barcode]
+        event.student_id = match.student_id
+        live_class = live_classes.get(event.live_class_id)
+        if (event.device_id, event.event_id) in synced:
+            event.result.update(success=True, status='already_synced')
+        elif match.student_id is None:
+            fail(event, 'unknown_barcode')
+        elif not match.is_valid:
+            fail(event, f'barcode_{match.status}')
+        elif live_class is None:
+            fail(event, 'unknown_class')
+        elif event.scanned_at > now + MAX_CLOCK_SKEW:
+            fail(event, 'timestamp_in_future')
+        else:
+            reason = check_in_window_error(live_class, event.scanned_at)
+            if reason:
+                fail(event, reason)
+            else:
+                accepted.append(event)
+
+    # Earliest scan per (class, student) wins, both within the batch and against the table
+    accepted.sort(key=lambda event: event.scanned_at)
+    first_scans = {}
+    for event in accepted:
+        first_scans.setdefault((event.live_class_id, event.student_id), event)
+
+    existing = _existing_rows(first_scans) if first_scans else {}
+
+    new_attendance = {}
+    for key, event in first_scans.items():
+        if key not in existing:
+            new_attendance[key] = Attendance(
+                live_class_id=event.live_class_id,
+                student_id=event.student_id,
+                status=attendance_status_for(live_classes[event.live_class_id], event.scanned_at),
+                attendance_method='barcode_scan',
+                check_in_time=event.scanned_at,
+                location_lat=event.location_lat,
+                location_lng=event.location_lng,
+                device_info=event.device_id,
+            )
+
+    logs = []
+    with transaction.atomic():
+        if new_attendance:
+            inserted = _insert_attendance(new_attendance)
+            apply_attendance_changes(
+                (live_classes[attendance.live_class_id][3], live_classes[attendance.live_class_id][0],
+                 attendance.student_id, attendance.status, 1)
+                for attendance in inserted.values()
+            )
+            lost = new_attendance.keys() - inserted.keys()
+            if lost:
+                existing.update((key, row) for key, row in _existing_rows(lost).items() if key in lost)
+            new_attendance = inserted
+        for key, attendance in new_attendance.items():
+            existing[key] = (attendance.pk, attendance.status, attendance.check_in_time)
+        moved = _move_check_ins_earlier(
+            {key: event for key, event in first_scans.items() if key in existing and key not in new_attendance},
+            existing, live_classes,
+        )
+
+        for event in events:
+            if event.result.get('status') == 'already_synced' or event.student_id is None:
+                continue
+            key = (event.live_class_id, event.student_id)
+            # The scan a new or moved row was made from
+            is_check_in = first_scans.get(key) is event and (key in new_attendance or key in moved)
+            if 'status' not in event.result and key not in existing:
+                # Neither inserted nor found: the insert failed for another reason
+                event.result.update(success=False, status='not_recorded')
+            elif 'status' not in event.result:
+                attendance_id, attendance_status, _ = existing[key]
+                event.result.update(
+                    success=True,
+                    status='checked_in' if is_check_in else 'already_checked_in',
+                    attendance_id=attendance_id,
+                    attendance_status=attendance_status,
+                )
+            checked_in = event.result['status'] == 'checked_in'
+            logs.append(AttendanceLog(
+                student_id=event.student_id,
+                attendance_id=event.result.get('attendance_id'),
+                action='check_in' if checked_in else 'scan_attempt',
+                success=checked_in,
+                failure_reason='' if checked_in else event.result['status'][:100],
+                ip_address=ip_address,
+                device_id=event.device_id,
+                event_id=event.event_id,
+                scanned_at=event.scanned_at,
+            ))
+        AttendanceLog.objects.bulk_create(logs, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+
+    for live_class_id in {key[0] for key in new_attendance}:
+        notify_checkin(live_class_id)
+    for event in events:
+        results[event.index] = event.result
+    return results
+
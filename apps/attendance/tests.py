@@ -1,3 +1,389 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.courses.models import Enrollment
+from apps.users.models import Student
+
+from .anomalies import detect_buddy_punching, detect_impossible_travel, detect_outside_window
+from .benchmarks import CAMPUS, FAR_AWAY, logged_in_client, seed_scan_fixture
+from .checkin import _existing_attendance, check_in, check_in_student
+from .id_cards import write_id_card_pdf
+from .live import RecentIds, attendance_since, overlap_start, stream_checkins
+from .log_buffer import AttendanceLogBuffer
+from .lookup import barcode_lookup
+from .models import Attendance, AttendanceLog, CourseDailyAttendance, StudentBarcode, StudentMonthlyAttendance
+from .ratelimit import CacheBackend, LocalBackend, sliding_window_estimate
+from .sync import _existing_rows, ingest_scan_events
+from .tokens import make_class_token
+from .views import DEVICE_COOKIE
+
+# A process-local cache stands in for the shared one (Redis/Memcached) in tests
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'scan-limits'}}
+
+
+class AnomalyDetectorTests(SimpleTestCase):
+    def test_buddy_punching_counts_distinct_students_per_device_window(self):
+        devices = np.array([0, 0, 0, 0, 1, 1, 1])
+        students = np.array([1, 2, 2, 3, 4, 4, 4])
+        times = np.array([0, 60, 90, 120, 0, 60, 120], dtype=float)
+        order, flagged, counts, _ = detect_buddy_punching(devices, students, times, window=600, min_students=3)
+
+        self.assertEqual(counts.tolist(), [1, 2, 2, 3, 1, 1, 1])
+        self.assertEqual(order[flagged].tolist(), [3])
+        # The same device a window later starts counting again
+        _, flagged, _, _ = detect_buddy_punching(
+            devices, students, np.array([0, 700, 1400, 2100, 0, 60, 120], dtype=float), 600, 3
+        )
+        self.assertFalse(flagged.any())
+
+    def test_impossible_travel_needs_distance_and_speed(self):
+        students = np.array([1, 1, 1, 2])
+        times = np.array([0, 1800, 90_000, 0], dtype=float)
+        lat = np.array([CAMPUS[0], FAR_AWAY[0], CAMPUS[0], np.nan])
+        lng = np.array([CAMPUS[1], FAR_AWAY[1], CAMPUS[1], np.nan])
+        previous, current, km, _ = detect_impossible_travel(students, times, lat, lng, max_kmh=200, min_km=2)
+
+        self.assertEqual(list(zip(previous.tolist(), current.tolist())), [(0, 1)])
+        self.assertGreater(km[0], 250)
+
+    def test_outside_window_minutes(self):
+        minutes = detect_outside_window(
+            np.array([-3600, 0, 7200, np.nan]), np.zeros(4), np.full(4, 60.0), opens_before_minutes=30
+        )
+        self.assertEqual(minutes[:3].tolist(), [30, 0, 60])
+        self.assertTrue(np.isnan(minutes[3]))
+
+
+class SlidingWindowTests(SimpleTestCase):
+    def test_previous_window_weight_decays(self):
+        self.assertEqual(sliding_window_estimate(10, 0, 60, 0), 10)
+        self.assertEqual(sliding_window_estimate(10, 2, 60, 30), 7)
+        self.assertAlmostEqual(sliding_window_estimate(10, 0, 60, 59.99), 0, places=2)
+
+
+class BackendContract:
+    """Behaviour shared by every rate-limit backend"""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def test_rejects_hits_over_the_limit(self):
+        backend = self.make_backend()
+        with mock.patch('apps.attendance.ratelimit.time.time', return_value=600.0):
+            self.assertEqual([backend.hit('device:a', 3, 60) for _ in range(5)], [True] * 3 + [False] * 2)
+            self.assertTrue(backend.hit('device:b', 3, 60))
+
+    def test_rejected_hits_are_not_counted(self):
+        backend = self.make_backend()
+        with mock.patch('apps.attendance.ratelimit.time.time', return_value=600.0):
+            for _ in range(5):
+                backend.hit('device:a', 3, 60)
+        # Half of the previous window's three accepted hits remain
+        with mock.patch('apps.attendance.ratelimit.time.time', return_value=690.0):
+            self.assertEqual([backend.hit('device:a', 3, 60) for _ in range(2)], [True, False])
+
+    def test_previous_window_still_counts(self):
+        backend = self.make_backend()
+        with mock.patch('apps.attendance.ratelimit.time.time', return_value=650.0):
+            for _ in range(4):
+                backend.hit('barcode:x', 4, 60)
+        # 10s into the next window, 50/60 of the previous window's hits remain
+        with mock.patch('apps.attendance.ratelimit.time.time', return_value=670.0):
+            self.assertFalse(backend.hit('barcode:x', 4, 60))
+        # Once the previous window has slid out, the key is free again
+        with mock.patch('apps.attendance.ratelimit.time.time', return_value=839.0):
+            self.assertTrue(backend.hit('barcode:x', 4, 60))
+
+    def test_remember_keeps_the_first_value_until_it_expires(self):
+        backend = self.make_backend()
+        backend.remember('1:code', {'n': 1}, 30)
+        backend.remember('1:code', {'n': 2}, 30)
+        self.assertEqual(backend.recall('1:code'), {'n': 1})
+        self.assertIsNone(backend.recall('2:code'))
+
+
+class LocalBackendTests(BackendContract, SimpleTestCase):
+    def make_backend(self):
+        return LocalBackend()
+
+    def test_idle_keys_are_pruned(self):
+        backend = LocalBackend(max_keys=2)
+        with mock.patch('apps.attendance.ratelimit.time.time', return_value=0.0):
+            backend.hit('a', 1, 60)
+            backend.hit('b', 1, 60)
+        with mock.patch('apps.attendance.ratelimit.time.time', return_value=600.0):
+            backend.hit('c', 1, 60)
+        self.assertEqual(set(backend._counters), {'c'})
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class CacheBackendTests(BackendContract, SimpleTestCase):
+    def make_backend(self):
+        from django.core.cache import cache
+        cache.clear()
+        return CacheBackend('default')
+
+
+@override_settings(ATTENDANCE_BARCODE_SCAN_LIMIT=3, ATTENDANCE_DEVICE_SCAN_LIMIT=0)
+class ScanSuppressionTests(TestCase):
+    def setUp(self):
+        _, (self.live_class,), self.barcodes = seed_scan_fixture(2, prefix='limit')
+        barcode_lookup.clear()
+        patcher = mock.patch('apps.attendance.ratelimit.backend', LocalBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeat_scans_are_coalesced_then_rejected_and_logged(self):
+        statuses = [check_in(self.barcodes[0], self.live_class.pk, device_id='door').status for _ in range(4)]
+
+        self.assertEqual(statuses, ['checked_in', 'duplicate_scan', 'duplicate_scan', 'barcode_rate_limited'])
+        self.assertEqual(Attendance.objects.count(), 1)
+        self.assertEqual(
+            list(AttendanceLog.objects.order_by('pk').values_list('success', 'failure_reason')),
+            [(True, ''), (False, 'duplicate_scan'), (False, 'duplicate_scan'), (False, 'barcode_rate_limited')],
+        )
+
+
+class CheckInTests(TestCase):
+    def setUp(self):
+        _, (self.live_class,), self.barcodes = seed_scan_fixture(2, prefix='checkin')
+        self.student_ids = list(StudentBarcode.objects.order_by('pk').values_list('student_id', flat=True))
+        barcode_lookup.clear()
+
+    def daily_total(self):
+        return CourseDailyAttendance.objects.get(course_id=self.live_class.course_id).total
+
+    def test_rescans_report_the_first_check_in(self):
+        first = check_in_student(self.student_ids[0], self.live_class.pk, device_id='door-1')
+        again = check_in_student(self.student_ids[0], self.live_class.pk, device_id='door-2')
+        self.assertEqual((first.status, again.status), ('checked_in', 'already_checked_in'))
+        self.assertEqual((again.attendance_id, again.check_in_time), (first.attendance_id, first.check_in_time))
+        self.assertEqual(self.daily_total(), 1)
+
+    def test_a_lost_insert_race_leaves_the_winning_row_alone(self):
+        winner = check_in_student(self.student_ids[0], self.live_class.pk, device_id='door-1')
+        # The loser checked for a row before the winner inserted it
+        with mock.patch('apps.attendance.checkin._existing_attendance',
+                        side_effect=[None, _existing_attendance(self.live_class.pk, self.student_ids[0])]):
+            loser = check_in_student(self.student_ids[0], self.live_class.pk, device_id='door-2')
+        self.assertEqual(loser.status, 'already_checked_in')
+        self.assertEqual((loser.attendance_id, loser.check_in_time), (winner.attendance_id, winner.check_in_time))
+        self.assertEqual(Attendance.objects.get().device_info, 'door-1')
+        self.assertEqual(self.daily_total(), 1)
+
+    def test_unknown_and_revoked_barcodes_are_remembered_briefly(self):
+        barcode_lookup.resolve(self.barcodes[0])  # warm the table
+        self.assertEqual(barcode_lookup.resolve('no-such-card').status, 'unknown')
+        with self.assertNumQueries(0):
+            self.assertEqual(barcode_lookup.resolve('no-such-card').status, 'unknown')
+
+        barcode = StudentBarcode.objects.get(barcode_data=self.barcodes[1])
+        barcode.status = 'revoked'
+        barcode.save()
+        self.assertEqual(barcode_lookup.resolve(self.barcodes[1]).status, 'revoked')
+        with self.assertNumQueries(0):
+            self.assertEqual(barcode_lookup.resolve_many([self.barcodes[1]])[self.barcodes[1]].status, 'revoked')
+        barcode.status = 'active'
+        barcode.save()
+        self.assertEqual(barcode_lookup.resolve(self.barcodes[1]).status, 'active')
+
+    def test_a_card_printed_for_a_student_without_a_barcode_scans(self):
+        StudentBarcode.objects.filter(barcode_data=self.barcodes[0]).delete()
+        cards = []
+
+        def compose(page, layout):
+            cards.extend(page)
+            return b'jpeg'
+
+        with mock.patch('apps.attendance.id_cards.compose_page', side_effect=compose):
+            write_id_card_pdf(Student.objects.filter(pk=self.student_ids[0]), io.BytesIO(), workers=1)
+        self.assertEqual(check_in(cards[0].barcode_data, self.live_class.pk, device_id='door').status, 'checked_in')
+
+
+class LiveFeedTests(TestCase):
+    def setUp(self):
+        _, (self.live_class,), _ = seed_scan_fixture(2, prefix='live')
+        for student_id in StudentBarcode.objects.order_by('pk').values_list('student_id', flat=True):
+            check_in_student(student_id, self.live_class.pk, device_id='door')
+        self.first, self.second = Attendance.objects.order_by('pk').values_list('pk', flat=True)
+
+    def poll(self, cursor, recent):
+        events = async_to_sync(attendance_since)(self.live_class.pk, cursor, overlap_start())
+        return [event['id'] for event in recent.fresh(events)]
+
+    def test_a_lower_pk_committed_late_is_sent_once(self):
+        # The feed read the second row before the first one's transaction committed
+        recent = RecentIds()
+        recent.fresh([{'id': self.second}])
+        self.assertEqual(self.poll(self.second, recent), [self.first])
+        self.assertEqual(self.poll(self.second, recent), [])
+
+    def test_rows_older_than_the_overlap_are_not_rescanned(self):
+        Attendance.objects.filter(pk=self.first).update(created_at=overlap_start() - timedelta(seconds=1))
+        self.assertEqual(self.poll(self.second, RecentIds()), [self.second])
+
+    async def test_catch_up_resumes_from_the_highest_id_sent(self):
+        stream = stream_checkins(self.live_class.pk, last_event_id=self.second)
+        try:
+            self.assertTrue((await anext(stream)).startswith('retry: '))
+            frame = await anext(stream)
+        finally:
+            await stream.aclose()
+        self.assertTrue(frame.startswith(f'id: {self.second}\n'))
+        self.assertIn(f'"id": {self.first}', frame)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        _, (self.live_class,), self.barcodes = seed_scan_fixture(2, prefix='sync')
+        self.student_id = StudentBarcode.objects.get(barcode_data=self.barcodes[0]).student_id
+        barcode_lookup.clear()
+
+    def event(self, minutes_after_start, **extra):
+        at = self.live_class.scheduled_at + timedelta(minutes=minutes_after_start)
+        return {'barcode': self.barcodes[0], 'live_class': self.live_class.pk, 'timestamp': at.isoformat(), **extra}
+
+    def test_bad_events_fail_alone(self):
+        results = ingest_scan_events([
+            self.event(1, timestamp='2024-02-30T10:00:00'),
+            self.event(1, lat=95),
+            self.event(1, lng='Infinity'),
+            self.event(1, lat='6.9271', lng='79.8612'),
+        ])
+        self.assertEqual([result['status'] for result in results],
+                         ['invalid_timestamp', 'invalid_location', 'invalid_location', 'checked_in'])
+
+    @override_settings(ATTENDANCE_LATE_AFTER_MINUTES=3)
+    def test_an_earlier_offline_scan_becomes_the_check_in(self):
+        online = check_in_student(self.student_id, self.live_class.pk, device_id='door')
+        self.assertEqual(online.attendance_status, 'late')
+        results = ingest_scan_events([self.event(4, device_id='tablet'), self.event(1, device_id='tablet')])
+        self.assertEqual([result['status'] for result in results], ['already_checked_in', 'checked_in'])
+        attendance = Attendance.objects.get()
+        self.assertEqual((attendance.status, attendance.device_info), ('present', 'tablet'))
+        self.assertEqual(attendance.check_in_time, self.live_class.scheduled_at + timedelta(minutes=1))
+        daily = CourseDailyAttendance.objects.get(course_id=self.live_class.course_id)
+        self.assertEqual((daily.present, daily.late, daily.total), (1, 0, 1))
+        # Uploading the same scans again changes nothing
+        self.assertEqual({result['status'] for result in ingest_scan_events([self.event(1, device_id='tablet')])},
+                         {'already_synced'})
+
+    def test_a_row_inserted_concurrently_is_counted_once(self):
+        existing_rows = _existing_rows
+
+        def racing(keys):
+            # The online check-in lands just after the upload looked for existing rows
+            if not Attendance.objects.exists():
+                check_in_student(self.student_id, self.live_class.pk, device_id='door')
+                return {}
+            return existing_rows(keys)
+
+        with mock.patch('apps.attendance.sync._existing_rows', side_effect=racing):
+            results = ingest_scan_events([self.event(1, device_id='tablet')])
+        self.assertEqual(results[0]['status'], 'checked_in')
+        attendance = Attendance.objects.get()
+        self.assertEqual((results[0]['attendance_id'], attendance.device_info), (attendance.pk, 'tablet'))
+        self.assertEqual(CourseDailyAttendance.objects.get(course_id=self.live_class.course_id).total, 1)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        _, (self.live_class,), _ = seed_scan_fixture(2, prefix='rollup')
+        for student_id in StudentBarcode.objects.values_list('student_id', flat=True):
+            check_in_student(student_id, self.live_class.pk, device_id='door')
+
+    def counts(self):
+        daily = CourseDailyAttendance.objects.get(course_id=self.live_class.course_id)
+        return daily.present, daily.total, sorted(StudentMonthlyAttendance.objects.values_list('total', flat=True))
+
+    def test_decrements_stop_at_zero(self):
+        # Drifted low, e.g. rows written before the rollups existed
+        CourseDailyAttendance.objects.update(present=1, total=1)
+        Attendance.objects.all().delete()
+        self.assertEqual(self.counts(), (0, 0, [0, 0]))
+
+    def test_migration_counts_existing_attendance(self):
+        populate = import_module('apps.attendance.migrations.0005_attendance_rollups').populate_attendance_rollups
+        CourseDailyAttendance.objects.all().delete()
+        StudentMonthlyAttendance.objects.all().delete()
+        populate(apps, None)
+        self.assertEqual(self.counts(), (2, 2, [1, 1]))
+
+
+class AttendanceLogBufferTests(TestCase):
+    def setUp(self):
+        seed_scan_fixture(1, 0, prefix='buffer')
+        self.student_id = StudentBarcode.objects.get().student_id
+        # Filled directly: the flusher thread would write on its own connection
+        self.buffer = AttendanceLogBuffer(flush_size=10)
+
+    def queue(self, *event_ids):
+        for event_id in event_ids:
+            self.buffer._queue.put_nowait(AttendanceLog(
+                student_id=self.student_id, action='scan_attempt', success=False, device_id='door', event_id=event_id,
+            ))
+
+    def test_a_rejected_entry_costs_only_itself(self):
+        self.queue('1', '2', '2', '3')  # the second '2' breaks the unique device event constraint
+        with self.assertLogs('apps.attendance.log_buffer', 'WARNING'):
+            self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(self.buffer.failed, 1)
+        self.assertEqual(sorted(AttendanceLog.objects.values_list('event_id', flat=True)), ['1', '2', '3'])
+
+    def test_entries_are_kept_while_the_database_is_down(self):
+        self.queue('1', '2', '3')
+        down = OperationalError('server closed the connection unexpectedly')
+        with mock.patch.object(AttendanceLog.objects, 'bulk_create', side_effect=down), \
+                mock.patch.object(AttendanceLog, 'save', side_effect=down), \
+                self.assertLogs('apps.attendance.log_buffer', 'WARNING'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual((len(self.buffer), self.buffer.failed), (3, 0))
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(AttendanceLog.objects.count(), 3)
+
+
+class QrCheckInTests(TestCase):
+    def setUp(self):
+        _, (self.live_class,), _ = seed_scan_fixture(1, prefix='qr')
+        self.student = StudentBarcode.objects.select_related('student__user').get().student
+        self.client = logged_in_client(self.student.user)
+
+    def check_in(self, **data):
+        token = make_class_token(self.live_class.pk, self.live_class.ends_at)
+        return self.client.post('/attendance/qr-checkin', {'token': token, **data}, secure=True).json()
+
+    def test_only_students_enrolled_in_the_course_check_in(self):
+        self.assertEqual(self.check_in()['status'], 'not_enrolled')
+        enrollment = Enrollment.objects.create(student=self.student, course=self.live_class.course, status='pending')
+        self.assertEqual(self.check_in()['status'], 'not_enrolled')
+        self.assertFalse(Attendance.objects.exists())
+        self.assertEqual(AttendanceLog.objects.filter(failure_reason='not_enrolled').count(), 2)
+        enrollment.status = 'active'
+        enrollment.save()
+        self.assertEqual(self.check_in()['status'], 'checked_in')
+
+    def test_the_device_is_the_one_the_server_issued(self):
+        Enrollment.objects.create(student=self.student, course=self.live_class.course, status='active')
+        self.check_in(device_id='phone-of-someone-else')
+        self.check_in(device_id='another-phone')
+        devices = set(AttendanceLog.objects.values_list('device_id', flat=True))
+        self.assertEqual(len(devices), 1)
+        self.assertTrue(devices.pop().startswith('qr:'))
+        self.assertIn(DEVICE_COOKIE, self.client.cookies)
+
+    def test_tokens_other_than_the_issued_form_are_malformed(self):
+        Enrollment.objects.create(student=self.student, course=self.live_class.course, status='active')
+        token = make_class_token(self.live_class.pk, self.live_class.ends_at)
+        rest = token.split('.', 1)[1]
+        for forged in ('1.2.3.é', f'{token}é', f' {token}', f'+{token}', f'0x{token}', f'٣.{rest}'):
+            self.assertEqual(self.client.post('/attendance/qr-checkin', {'token': forged}, secure=True).json(),
+                             {'success': False, 'status': 'malformed_token'})
+        self.assertEqual(self.check_in()['status'], 'checked_in')
@@ -4,6 +4,11 @@ from . import views
 app_name = 'attendance'
 
 urlpatterns = [
-    # Attendance views will be added here
-    # Placeholder for now
+    path('checkin', views.checkin, name='checkin'),
+    path('sync', views.sync, name='sync'),
+    path('qr-checkin', views.qr_checkin, name='qr_checkin'),
+    path('classes/<int:pk>/qr.png', views.class_qr, name='class_qr'),
+    path('classes/<int:pk>/live', views.live_feed, name='live_feed'),
+    path('export/attendance', views.export_attendance, name='export_attendance'),
+    path('export/logs', views.export_attendance_logs, name='export_attendance_logs'),
 ]
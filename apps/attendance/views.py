@@ -1,3 +1,220 @@
-from django.shortcuts import render
+import ipaddress
+import json
+import secrets
 
-# Create your views here.
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_POST
+
+from apps.core.exports import export_from_request
+
+from .checkin import check_in, check_in_student, parse_coordinate
+from .exports import attendance_export, attendance_log_export, filter_attendance, filter_attendance_logs
+from .live import attendance_since, format_sse, overlap_start, poll_interval, stream_checkins
+from .models import LiveClass
+from .ratelimit import scan_limit_window
+from .sync import ingest_scan_events
+from .tokens import class_qr_png, seconds_left_in_window, verify_class_token
+
+
+def can_record_attendance(user):
+    """Teachers, admins and staff operate scanners"""
+    return user.is_authenticated and (user.is_staff or user.is_teacher or user.is_admin_user)
+
+
+def client_ip(request):
+    """Client address as forwarded by nginx, or None if it is not a valid IP"""
+    address = request.META.get('HTTP_X_REAL_IP') or request.META.get('REMOTE_ADDR')
+    try:
+        return str(ipaddress.ip_address(address))
+    except ValueError:
+        return None
+
+
+def request_data(request):
+    """Accept both JSON bodies (scanner apps) and form posts"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, (dict, list)) else None
+    return request.POST
+
+
+@require_POST
+def checkin(request):
+    """POST /attendance/checkin - record one barcode scan for a live class"""
+    if not can_record_attendance(request.user):
+        return JsonResponse({'error': 'Not allowed to record attendance'}, status=403)
+
+    data = request_data(request)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Expected a JSON object or form data'}, status=400)
+    barcode = str(data.get('barcode') or '').strip()
+    try:
+        live_class_id = int(data.get('live_class'))
+        location_lat = parse_coordinate(data.get('lat'), limit=90)
+        location_lng = parse_coordinate(data.get('lng'))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'barcode, live_class and valid lat/lng are required'}, status=400)
+    if not barcode:
+        return JsonResponse({'error': 'barcode is required'}, status=400)
+
+    result = check_in(
+        barcode,
+        live_class_id,
+        device_id=str(data.get('device_id') or ''),
+        ip_address=client_ip(request),
+        location_lat=location_lat,
+        location_lng=location_lng,
+    )
+    if result.status.endswith('_rate_limited'):
+        response = JsonResponse(result.as_dict(), status=429)
+        response['Retry-After'] = str(scan_limit_window())
+        return response
+    return JsonResponse(result.as_dict())
+
+
+@require_POST
+def sync(request):
+    """POST /attendance/sync - ingest a batch of scans recorded offline by a device"""
+    if not can_record_attendance(request.user):
+        return JsonResponse({'error': 'Not allowed to record attendance'}, status=403)
+
+    try:
+        data = request_data(request)
+    except RequestDataTooBig:
+        return JsonResponse({'error': 'Upload too large, split it into smaller batches'}, status=413)
+    if isinstance(data, dict):
+        events, device_id = data.get('events'), str(data.get('device_id') or '')
+    else:
+        events, device_id = data, ''
+    if not isinstance(events, list):
+        return JsonResponse({'error': 'Expected a list of events'}, status=400)
+
+    max_events = getattr(settings, 'ATTENDANCE_SYNC_MAX_EVENTS', 10_000)
+    if len(events) > max_events:
+        return JsonResponse({'error': f'At most {max_events} events per upload'}, status=413)
+
+    results = ingest_scan_events(events, default_device_id=device_id, ip_address=client_ip(request))
+    accepted = sum(1 for result in results if result['success'])
+    return JsonResponse({'received': len(events), 'accepted': accepted, 'results': results})
+
+
+@require_GET
+def class_qr(request, pk):
+    """GET /attendance/classes/<pk>/qr.png - the rotating code to project in class"""
+    if not can_record_attendance(request.user):
+        return JsonResponse({'error': 'Not allowed to display class codes'}, status=403)
+    live_class = get_object_or_404(LiveClass.objects.only('pk', 'scheduled_at', 'duration_minutes'), pk=pk)
+    response = HttpResponse(class_qr_png(live_class), content_type='image/png')
+    # Browsers refetch exactly when the code rotates
+    response['Cache-Control'] = f'private, max-age={int(seconds_left_in_window())}'
+    return response
+
+
+DEVICE_COOKIE = 'attendance_device'
+DEVICE_COOKIE_SALT = 'apps.attendance.device'
+
+
+def self_checkin_device(request):
+    """``(device id, new)`` for a student's own phone, from a signed cookie the server issues
+
+    A ``device_id`` sent by the client is free text and would let a phone
+    checking in for several students pass as several devices; buddy-punching
+    detection keys on this id instead. Clearing cookies still resets it.
+    """
+    token = request.get_signed_cookie(DEVICE_COOKIE, default=None, salt=DEVICE_COOKIE_SALT)
+    if token:
+        return f'qr:{token}', False
+    return f'qr:{secrets.token_urlsafe(16)}', True
+
+
+@require_POST
+def qr_checkin(request):
+    """POST /attendance/qr-checkin - a student checks in by scanning the class code"""
+    student = getattr(request.user, 'student_profile', None) if request.user.is_authenticated else None
+    if student is None:
+        return JsonResponse({'error': 'Only students can check in with a class code'}, status=403)
+
+    data = request_data(request)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Expected a JSON object or form data'}, status=400)
+    token = verify_class_token(str(data.get('token') or ''))
+    if not token.valid:
+        return JsonResponse({'success': False, 'status': token.reason})
+    try:
+        location_lat = parse_coordinate(data.get('lat'), limit=90)
+        location_lng = parse_coordinate(data.get('lng'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid lat/lng'}, status=400)
+
+    device_id, new_device = self_checkin_device(request)
+    result = check_in_student(
+        student.pk,
+        token.live_class_id,
+        device_id=device_id,
+        ip_address=client_ip(request),
+        location_lat=location_lat,
+        location_lng=location_lng,
+        method='qr_scan',
+        require_enrollment=True,
+    )
+    response = JsonResponse(result.as_dict())
+    if new_device:
+        # Outlives logins, so several students signing in on one phone share it
+        response.set_signed_cookie(
+            DEVICE_COOKIE, device_id[3:], salt=DEVICE_COOKIE_SALT, max_age=365 * 24 * 3600,
+            secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+        )
+    return response
+
+
+def _last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        return 0
+
+
+@require_GET
+async def live_feed(request, pk):
+    """GET /attendance/classes/<pk>/live - server-sent check-in events for the dashboard"""
+    user = await request.auser()
+    if not can_record_attendance(user):
+        return JsonResponse({'error': 'Not allowed to view live attendance'}, status=403)
+    if not await LiveClass.objects.filter(pk=pk).aexists():
+        return JsonResponse({'error': 'Unknown class'}, status=404)
+
+    last_event_id = _last_event_id(request)
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(stream_checkins(pk, last_event_id), content_type='text/event-stream')
+    else:
+        # Under WSGI a held-open stream would tie up a worker: send the catch-up only and
+        # let EventSource reconnect after ``retry`` with its Last-Event-ID (long polling)
+        frames = [f'retry: {int(poll_interval() * 3000)}\n\n']
+        cursor = last_event_id
+        for event in await attendance_since(pk, last_event_id, overlap_start()):
+            cursor = max(cursor, event['id'])
+            frames.append(format_sse(event, cursor=cursor))
+        response = HttpResponse(''.join(frames), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def export_attendance(request):
+    """GET /attendance/export/attendance?format=csv|xlsx&date_from=&date_to=&course=&live_class=&status="""
+    return export_from_request(request, attendance_export, filter_attendance)
+
+
+@require_GET
+def export_attendance_logs(request):
+    """GET /attendance/export/logs?format=csv|xlsx&date_from=&date_to=&action=&success=&device_id="""
+    return export_from_request(request, attendance_log_export, filter_attendance_logs)
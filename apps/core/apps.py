@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        from .cache import connect_model_versions
+        from .images import connect_image_fields
+
+        connect_model_versions()
+        connect_image_fields()
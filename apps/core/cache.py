@@ -0,0 +1,315 @@
+"""
+Two-tier cache and model version counters.
+
+``TieredCache`` is the ``default`` cache. Reads try a small per-process LRU
+(L1) first, then the cache every process shares (L2, the alias named by
+``LOCATION``: Redis, the database cache table or a cache directory, see
+settings), and copy L2 hits into L1 for at most ``L1_TIMEOUT`` seconds.
+Writes and deletes go to both tiers, but only the writing process's L1
+sees them, so another worker may serve its own L1 copy for up to
+``L1_TIMEOUT`` seconds. Anything that must agree across workers at once
+goes to ``shared_cache()`` directly (counters, rate limits, sessions) or
+puts a version number in its key.
+
+Version numbers live in the shared tier. ``get_version``/``bump_version``
+handle named ones (a course's curriculum, the catalog); every model in
+``CACHE_VERSIONED_MODELS`` has one bumped by its ``post_save`` and
+``post_delete`` signals. ``cached_queryset`` caches a function's rows
+under the versions of the models it reads, so a stale list is never
+served. Bulk ``update()``/``bulk_create()`` send no signals: call
+``bump_model_version`` after them.
+
+``TieredCache.stats()`` counts hits per tier and misses for this process
+(``/cache-stats/`` for staff).
+"""
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import transaction
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save
+
+VERSION_PREFIX = 'cache:version:'
+
+
+class LocalLRU:
+    """Pickled values with a per-entry expiry, least recently used dropped first"""
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (expires at, pickled value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """``(True, value)``, or ``(False, None)`` if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+        # Unpickled per read, like LocMemCache: callers may mutate what they get
+        return True, pickle.loads(entry[1])
+
+    def set(self, key, value, ttl):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, pickled)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache(BaseCache):
+    """Per-process L1 in front of the shared cache named by ``LOCATION``
+
+    OPTIONS: ``L1_MAX_ENTRIES`` (default 5000), ``L1_TIMEOUT`` (seconds, default 5).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        self.l1 = LocalLRU(options.get('L1_MAX_ENTRIES', 5000))
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._counts = Counter()
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _l1_ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        return self.l1_timeout if timeout is None else min(timeout, self.l1_timeout)
+
+    def _keep(self, local_key, value, timeout=DEFAULT_TIMEOUT):
+        ttl = self._l1_ttl(timeout)
+        if ttl > 0:
+            self.l1.set(local_key, value, ttl)
+        else:
+            self.l1.delete(local_key)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        found, value = self.l1.get(local_key)
+        if found:
+            self._counts['l1_hits'] += 1
+            return value
+        value = self.shared.get(key, self._missing_key, version=version)
+        if value is self._missing_key:
+            self._counts['misses'] += 1
+            return default
+        self._counts['l2_hits'] += 1
+        self._keep(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, remote = {}, []
+        for key in keys:
+            hit, value = self.l1.get(self.make_and_validate_key(key, version))
+            if hit:
+                found[key] = value
+            else:
+                remote.append(key)
+        self._counts['l1_hits'] += len(found)
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            self._counts['l2_hits'] += len(fetched)
+            self._counts['misses'] += len(remote) - len(fetched)
+            for key, value in fetched.items():
+                self._keep(self.make_and_validate_key(key, version), value)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._counts['sets'] += 1
+        self._keep(self.make_and_validate_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self._counts['sets'] += len(data)
+        for key, value in data.items():
+            if key not in failed:
+                self._keep(self.make_and_validate_key(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._counts['sets'] += 1
+            self._keep(self.make_and_validate_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.l1.delete(self.make_and_validate_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.l1.delete(self.make_and_validate_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.l1.get(self.make_and_validate_key(key, version))[0] or self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.l1.delete(self.make_and_validate_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def clear(self):
+        self.l1.clear()
+        self.shared.clear()
+
+    def stats(self):
+        """This process's counters since it started"""
+        counts = dict(self._counts)
+        reads = sum(counts.get(name, 0) for name in ('l1_hits', 'l2_hits', 'misses'))
+        hits = counts.get('l1_hits', 0) + counts.get('l2_hits', 0)
+        return {
+            'pid': os.getpid(),
+            'l1_hits': counts.get('l1_hits', 0),
+            'l2_hits': counts.get('l2_hits', 0),
+            'misses': counts.get('misses', 0),
+            'sets': counts.get('sets', 0),
+            'hit_ratio': round(hits / reads, 4) if reads else None,
+            'l1_entries': len(self.l1),
+            'l1_evictions': self.l1.evictions,
+        }
+
+
+def shared_cache():
+    """The cache all processes share: L2 behind a tiered default cache, else the default cache"""
+    return getattr(cache, 'shared', cache)
+
+
+def cache_stats():
+    """Hit/miss counters of the default cache in this process, or None if it is not tiered"""
+    backend = caches['default']
+    return backend.stats() if isinstance(backend, TieredCache) else None
+
+
+def _version_key(name):
+    return f'{VERSION_PREFIX}{name}'
+
+
+def get_version(name):
+    # Seeded from the clock rather than 1 so that a counter evicted from the
+    # cache never comes back as a number something was cached under before
+    return shared_cache().get_or_set(_version_key(name), time.time_ns, timeout=None)
+
+
+def get_versions(names):
+    """``get_version`` for several names in one round trip"""
+    keys = [_version_key(name) for name in names]
+    found = shared_cache().get_many(keys)
+    return [found[key] if key in found else get_version(name) for key, name in zip(keys, names)]
+
+
+def _bump(names):
+    for name in names:
+        try:
+            shared_cache().incr(_version_key(name))
+        except ValueError:
+            shared_cache().set(_version_key(name), time.time_ns(), timeout=None)
+
+
+def bump_version(*names):
+    """Invalidate everything cached under these version names"""
+    names = set(names) - {None}
+    _bump(names)
+    if transaction.get_connection().in_atomic_block:
+        # Another process may cache the old rows again before this transaction commits
+        transaction.on_commit(lambda: _bump(names))
+
+
+def model_version_name(model):
+    if isinstance(model, str):
+        model = apps.get_model(model)
+    return f'model:{model._meta.label_lower}'
+
+
+def model_version(model):
+    return get_version(model_version_name(model))
+
+
+def bump_model_version(*models):
+    bump_version(*map(model_version_name, models))
+
+
+def _bump_sender_version(sender, **kwargs):
+    bump_model_version(sender)
+
+
+def connect_model_versions():
+    """Bump the version of every model in ``CACHE_VERSIONED_MODELS`` when one of its rows changes"""
+    for label in getattr(settings, 'CACHE_VERSIONED_MODELS', ()):
+        model = apps.get_model(label)
+        for signal in (post_save, post_delete):
+            signal.connect(_bump_sender_version, sender=model, dispatch_uid=f'cache-version:{label}')
+
+
+def _key_part(value):
+    # Model instances repr as their __str__, which need not be unique
+    if isinstance(value, Model):
+        return (value._meta.label_lower, value.pk)
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_key_part, value))
+    return value
+
+
+def cached_queryset(*models, timeout=DEFAULT_TIMEOUT):
+    """Cache a function's rows (a queryset or any iterable, stored as a list) until one of ``models`` changes
+
+    ``models`` are classes or ``'app_label.Model'`` labels listed in
+    ``CACHE_VERSIONED_MODELS``; the arguments are part of the key, so they
+    need a stable ``repr``. The function itself stays available as ``.uncached``.
+    """
+    def decorator(func):
+        prefix = f'cache:rows:{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            versions = get_versions([model_version_name(model) for model in models])
+            arguments = repr((_key_part(args), sorted((k, _key_part(v)) for k, v in kwargs.items())))
+            key = f'{prefix}:{"-".join(map(str, versions))}:{hashlib.md5(arguments.encode()).hexdigest()}'
+            rows = cache.get(key)
+            if rows is None:
+                rows = list(func(*args, **kwargs))
+                cache.set(key, rows, timeout)
+            return rows
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,230 @@
+"""
+Responsive image derivatives for ``Course.thumbnail`` and ``User.profile_image``.
+
+Uploads are stored as they come, often multi-megabyte phone photos. For
+each one ``generate_derivatives`` writes WebP and JPEG copies at the
+``IMAGE_DERIVATIVE_WIDTHS`` narrower than the original (and one at the
+original width if that is below the largest) under
+``derivatives/<sha256 of the original>/<width>.<ext>``. Names depend only
+on the content: identical uploads share their files, a replaced image
+gets new ones, and nginx lets browsers keep them for good. An
+``ImageDerivativeSet`` row maps the stored name to its digest and widths.
+
+Nothing is resized on the request path. Saving a new image queues it,
+after commit, on a one-thread executor in the process that saved it, and
+``generate_image_derivatives`` backfills existing media (or anything a
+restart dropped) with a process pool. Until its derivatives exist an
+image is served as the original. ``responsive_images`` looks names up in
+bulk through the cache; the ``{% responsive_image %}`` and ``{% srcset %}``
+tags (``{% load images %}``) render them.
+"""
+import hashlib
+import io
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_init, post_save
+from PIL import Image, ImageOps
+
+from .models import ImageDerivativeSet
+
+logger = logging.getLogger(__name__)
+
+# (model, field) pairs whose uploads get derivatives
+IMAGE_FIELDS = (('courses.Course', 'thumbnail'), ('users.User', 'profile_image'))
+# extension: (Pillow format, MIME type, save options)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+ORIENTATION_TAG = 0x0112
+CACHE_SECONDS = 24 * 60 * 60
+# Images without derivatives yet are looked up again after this long
+MISSING_CACHE_SECONDS = 60
+
+
+def derivative_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (160, 320, 640, 1280))))
+
+
+def derivative_name(digest, width, extension):
+    return f'derivatives/{digest[:2]}/{digest}/{width}.{extension}'
+
+
+def target_widths(original_width, widths=None):
+    """Widths to render for an image ``original_width`` pixels wide; never wider than the original"""
+    widths = widths or derivative_widths()
+    targets = [width for width in widths if width < original_width]
+    if original_width <= widths[-1]:
+        targets.append(original_width)
+    return targets
+
+
+def render_derivatives(data, widths=None):
+    """``(width, height, {(width, extension): bytes})`` for the image in ``data``
+
+    Pure CPU work on bytes, so it can run in a process pool.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        stored_width, stored_height = image.size
+        # Orientations 5-8 are stored on their side
+        sideways = image.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8)
+        width, height = (stored_height, stored_width) if sideways else (stored_width, stored_height)
+        targets = target_widths(width, widths)
+        # JPEG can decode straight to a fraction of its size, far cheaper than decoding it whole
+        scale = targets[-1] / width
+        image.draft('RGB', (math.ceil(stored_width * scale), math.ceil(stored_height * scale)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            transparent = image.convert('RGBA')
+            opaque = Image.new('RGB', transparent.size, 'white')
+            opaque.paste(transparent, mask=transparent.getchannel('A'))
+        else:
+            transparent = opaque = image.convert('RGB')
+        files = {}
+        for target in targets:
+            size = (target, max(1, round(height * target / width)))
+            for extension, (image_format, _, options) in FORMATS.items():
+                source = transparent if extension == 'webp' else opaque
+                buffer = io.BytesIO()
+                source.resize(size, Image.LANCZOS, reducing_gap=3.0).save(buffer, image_format, **options)
+                files[(target, extension)] = buffer.getvalue()
+    return width, height, files
+
+
+def _entry(derivatives):
+    return {
+        'digest': derivatives.digest, 'width': derivatives.width, 'height': derivatives.height,
+        'widths': derivatives.widths,
+    }
+
+
+def _entry_key(source):
+    # Upload names may hold characters memcached does not take in keys
+    return f'images:derivatives:{hashlib.md5(source.encode()).hexdigest()}'
+
+
+def store_derivatives(source, digest, rendered):
+    """Save rendered files (unless already there) and record them for ``source``"""
+    width, height, files = rendered
+    for (target, extension), content in files.items():
+        name = derivative_name(digest, target, extension)
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(content))
+    derivatives, _ = ImageDerivativeSet.objects.update_or_create(
+        source=source,
+        defaults={'digest': digest, 'width': width, 'height': height,
+                  'widths': sorted({target for target, _ in files})},
+    )
+    cache.set(_entry_key(source), _entry(derivatives), timeout=CACHE_SECONDS)
+    return derivatives
+
+
+def read_source(source):
+    with default_storage.open(source, 'rb') as file:
+        data = file.read()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def reuse_derivatives(source, digest):
+    """Point ``source`` at another upload's derivatives of the same content; None if there are none"""
+    twin = ImageDerivativeSet.objects.filter(digest=digest).exclude(source=source).first()
+    if twin is None:
+        return None
+    derivatives, _ = ImageDerivativeSet.objects.update_or_create(
+        source=source, defaults={'digest': digest, 'width': twin.width, 'height': twin.height, 'widths': twin.widths},
+    )
+    cache.set(_entry_key(source), _entry(derivatives), timeout=CACHE_SECONDS)
+    return derivatives
+
+
+def generate_derivatives(source):
+    """Render and store the derivatives of one stored image; None if it cannot be read as an image"""
+    try:
+        data, digest = read_source(source)
+        existing = ImageDerivativeSet.objects.filter(source=source, digest=digest).first()
+        if existing is not None:
+            return existing
+        return reuse_derivatives(source, digest) or store_derivatives(source, digest, render_derivatives(data))
+    except (OSError, Image.DecompressionBombError):
+        # OSError covers missing files and Pillow's UnidentifiedImageError
+        logger.warning('No derivatives for %s', source, exc_info=True)
+        return None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _generate_in_background(source):
+    close_old_connections()
+    try:
+        generate_derivatives(source)
+    finally:
+        close_old_connections()
+
+
+def queue_derivatives(source):
+    """Generate derivatives on this process's background thread"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-derivatives')
+    _executor.submit(_generate_in_background, source)
+
+
+_image_fields = {}  # model -> name of its image field
+
+
+def _remember_image(sender, instance, **kwargs):
+    # __dict__, so a deferred field is not loaded here
+    value = instance.__dict__.get(_image_fields[sender])
+    instance._derived_image = getattr(value, 'name', value)
+
+
+def _queue_changed_image(sender, instance, raw=False, **kwargs):
+    name = getattr(instance, _image_fields[sender]).name
+    if name and not raw and name != instance._derived_image:
+        transaction.on_commit(lambda: queue_derivatives(name))
+    instance._derived_image = name
+
+
+def connect_image_fields():
+    for label, field in IMAGE_FIELDS:
+        model = apps.get_model(label)
+        _image_fields[model] = field
+        post_init.connect(_remember_image, sender=model, dispatch_uid=f'images:{label}')
+        post_save.connect(_queue_changed_image, sender=model, dispatch_uid=f'images:{label}')
+
+
+def responsive_images(sources):
+    """``{source: entry}`` for the given storage names that have derivatives (cached, one round trip)"""
+    sources = {source for source in sources if source}
+    keys = {_entry_key(source): source for source in sources}
+    cached = cache.get_many(keys)
+    found = {keys[key]: entry for key, entry in cached.items() if entry}
+    missing = [source for source in sources if _entry_key(source) not in cached]
+    if missing:
+        rows = {row.source: _entry(row) for row in ImageDerivativeSet.objects.filter(source__in=missing)}
+        found.update(rows)
+        cache.set_many({_entry_key(source): entry for source, entry in rows.items()}, timeout=CACHE_SECONDS)
+        cache.set_many({_entry_key(source): 0 for source in missing if source not in rows},
+                       timeout=MISSING_CACHE_SECONDS)
+    return found
+
+
+def derivative_url(entry, width, extension):
+    return default_storage.url(derivative_name(entry['digest'], width, extension))
+
+
+def srcset(entry, extension):
+    """``srcset`` attribute value of one format of a ``responsive_images`` entry"""
+    return ', '.join(f'{derivative_url(entry, width, extension)} {width}w' for width in entry['widths'])
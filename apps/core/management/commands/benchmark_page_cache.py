@@ -0,0 +1,122 @@
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.attendance.benchmarks import percentile
+
+PATHS = ('/', '/about/', '/contact/')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def _client(port, seconds, revalidate):
+    """One keep-alive client requesting the pages in turn; returns (status counts, latencies in ms)"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    etags, statuses, latencies = {}, {}, []
+    deadline = time.monotonic() + seconds
+    n = 0
+    while time.monotonic() < deadline:
+        path = PATHS[n % len(PATHS)]
+        n += 1
+        headers = {'If-None-Match': etags[path]} if revalidate and path in etags else {}
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        if response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+    connection.close()
+    return statuses, latencies
+
+
+class Command(BaseCommand):
+    help = 'Requests/second for the home, about and contact pages under gunicorn, with and without the page cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=2)
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        runs = [
+            ('rendered every time', 0, False),
+            ('page cache', 300, False),
+            ('page cache, revalidating', 300, True),
+        ]
+        for label, cache_seconds, revalidate in runs:
+            port = _free_port()
+            server = self._start(port, options, cache_seconds)
+            try:
+                if not _wait_for(port):
+                    raise CommandError('gunicorn did not start')
+                _client(port, 0.5, revalidate)  # warm up every worker
+                with ProcessPoolExecutor(options['clients']) as pool:
+                    results = list(pool.map(
+                        _client, [port] * options['clients'], [options['seconds']] * options['clients'],
+                        [revalidate] * options['clients'],
+                    ))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            statuses, latencies = {}, []
+            for client_statuses, client_latencies in results:
+                latencies += client_latencies
+                for status, count in client_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + count
+            if not latencies:
+                raise CommandError(f'No responses for "{label}"')
+            self.stdout.write(
+                f'{label:>26}: {len(latencies) / options["seconds"]:8.0f} req/s, '
+                f'p50 {percentile(latencies, 0.5):.2f} ms, p95 {percentile(latencies, 0.95):.2f} ms, '
+                f'statuses {dict(sorted(statuses.items()))}'
+            )
+
+    def _start(self, port, options, cache_seconds):
+        env = {
+            **os.environ,
+            'DEBUG': 'False',
+            'SECURE_SSL_REDIRECT': 'False',
+            'ALLOWED_HOSTS': '127.0.0.1',
+            'PAGE_CACHE_SECONDS': str(cache_seconds),
+            'RELEASE_VERSION': f'benchmark-{time.time_ns()}',
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'),
+        }
+        return subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', 'config.wsgi:application',
+                '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers']),
+                '--worker-class', 'gthread', '--threads', str(options['threads']),
+                '--keep-alive', '5', '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR, env=env,
+        )
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from apps.core.images import IMAGE_FIELDS, read_source, render_derivatives, reuse_derivatives, store_derivatives
+from apps.core.models import ImageDerivativeSet
+
+
+class Command(BaseCommand):
+    help = 'Generate WebP/JPEG derivatives for course thumbnails and profile images that have none, in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        sources = set()
+        for label, field in IMAGE_FIELDS:
+            sources.update(
+                apps.get_model(label).objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list(field, flat=True)
+            )
+        sources -= set(ImageDerivativeSet.objects.values_list('source', flat=True))
+        if not sources:
+            self.stdout.write(self.style.SUCCESS('Every image has its derivatives.'))
+            return
+
+        started = time.perf_counter()
+        self.rendered = self.failed = reused = 0
+        waiting = {}  # digest -> sources with that content, rendered once
+        # Forked workers only turn bytes into bytes; the parent does all storage and database work
+        with ProcessPoolExecutor(options['workers'], mp_context=multiprocessing.get_context('fork')) as pool:
+            running = {}
+            for source in sorted(sources):
+                try:
+                    data, digest = read_source(source)
+                except OSError as exc:
+                    self.stderr.write(f'{source}: {exc}')
+                    self.failed += 1
+                    continue
+                if digest in waiting:
+                    waiting[digest].append(source)
+                    continue
+                if reuse_derivatives(source, digest):
+                    reused += 1
+                    continue
+                waiting[digest] = [source]
+                running[pool.submit(render_derivatives, data)] = digest
+                # Keep a few images per worker in flight, not every original in memory
+                while len(running) >= options['workers'] * 2:
+                    self._collect(running, waiting)
+            while running:
+                self._collect(running, waiting)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.rendered} image(s) rendered, {reused} reused identical content, {self.failed} failed '
+            f'in {elapsed:.1f}s with {options["workers"]} worker(s).'
+        ))
+
+    def _collect(self, running, waiting):
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            digest = running.pop(future)
+            sources = waiting.pop(digest)
+            try:
+                result = future.result()
+            except (OSError, Image.DecompressionBombError) as exc:
+                self.stderr.write(f'{sources[0]}: {exc}')
+                self.failed += len(sources)
+                continue
+            for source in sources:
+                store_derivatives(source, digest, result)
+            self.rendered += len(sources)
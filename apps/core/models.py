@@ -1,3 +1,19 @@
 from django.db import models
 
-# Create your models here.
+
+class ImageDerivativeSet(models.Model):
+    """WebP and JPEG copies of an uploaded image at fixed widths (see apps/core/images.py)"""
+
+    source = models.CharField(max_length=255, unique=True, help_text='Storage name of the original')
+    digest = models.CharField(max_length=64, db_index=True, help_text='SHA-256 of the original')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    widths = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Image Derivative Set'
+        verbose_name_plural = 'Image Derivative Sets'
+
+    def __str__(self):
+        return self.source
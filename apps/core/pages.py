@@ -0,0 +1,113 @@
+"""
+Full-page cache for the public marketing pages (home, about, contact).
+
+These pages only change on deploy, so for anonymous visitors the rendered
+HTML is kept in the cache under the release (``RELEASE_VERSION``, else the
+git commit checked out) and the path; a new release starts with an empty
+set of pages. Each cached page carries a strong ``ETag`` (a hash of its
+body) and a ``Last-Modified`` of when it was first rendered, so a browser
+revalidating a page it already has gets a ``304`` without a body.
+
+A request without a session or messages cookie is anonymous and is
+answered without loading the session or the user. With a session it is
+served from the cache only if the user turns out to be anonymous and has
+no pending messages; everyone else gets the page rendered as before.
+Responses that set cookies (a CSRF token, say) are never stored.
+"""
+import functools
+import hashlib
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+MESSAGES_COOKIE = 'messages'
+
+
+def page_cache_seconds():
+    return getattr(settings, 'PAGE_CACHE_SECONDS', 24 * 60 * 60)
+
+
+@functools.lru_cache(maxsize=1)
+def _git_commit():
+    git = Path(settings.BASE_DIR) / '.git'
+    try:
+        head = (git / 'HEAD').read_text().strip()
+        if not head.startswith('ref: '):
+            return head
+        ref = head[5:]
+        if (git / ref).exists():
+            return (git / ref).read_text().strip()
+        for line in (git / 'packed-refs').read_text().splitlines():
+            if line.endswith(f' {ref}'):
+                return line.split()[0]
+    except OSError:
+        pass
+    return ''
+
+
+def release_version():
+    """What a deploy changes: ``RELEASE_VERSION`` if set, else the checked-out commit"""
+    return getattr(settings, 'RELEASE_VERSION', '') or _git_commit()
+
+
+def _is_anonymous(request):
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES and MESSAGES_COOKIE not in request.COOKIES:
+        return True
+    return not request.user.is_authenticated and not len(get_messages(request))
+
+
+def _page_key(request):
+    # The path only: query strings (tracking parameters) do not change these pages
+    return f'pages:{release_version()}:{request.path}'
+
+
+def _headers(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Browsers keep the page but ask again every time; a 304 costs no rendering
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def cached_page(view):
+    """Serve ``view``'s response to anonymous GET/HEAD requests from the cache, with ETag and Last-Modified"""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        timeout = page_cache_seconds()
+        if not timeout or request.method not in ('GET', 'HEAD') or not _is_anonymous(request):
+            return view(request, *args, **kwargs)
+        key = _page_key(request)
+        page = cache.get(key)
+        if page is None:
+            response = view(request, *args, **kwargs)
+            if (
+                response.status_code != 200
+                or response.cookies
+                or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+                or response.has_header('Cache-Control')
+            ):
+                return response
+            body = response.content
+            page = {
+                'body': body,
+                'content_type': response['Content-Type'],
+                'etag': f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+                'last_modified': int(timezone.now().timestamp()),
+            }
+            # add: every worker serves the same Last-Modified for a release
+            if not cache.add(key, page, timeout=timeout):
+                page = cache.get(key) or page
+        response = get_conditional_response(request, etag=page['etag'], last_modified=page['last_modified'])
+        if response is None:
+            response = HttpResponse(page['body'], content_type=page['content_type'])
+        return _headers(response, page['etag'], page['last_modified'])
+
+    return wrapper
@@ -0,0 +1,42 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..images import FORMATS, derivative_url, responsive_images, srcset as format_srcset
+
+register = template.Library()
+
+
+def _lookup(image):
+    name = getattr(image, 'name', image)
+    return name, responsive_images([name]).get(name) if name else None
+
+
+@register.simple_tag
+def srcset(image, extension='jpeg'):
+    """``srcset`` value for an ImageField value's derivatives in one format, or '' until they exist"""
+    _, entry = _lookup(image)
+    return format_srcset(entry, extension) if entry else ''
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes='100vw', css_class=''):
+    """A <picture> with WebP and JPEG ``srcset``s for an ImageField value, or a plain <img> until they exist
+
+    {% responsive_image course.thumbnail alt=course.title sizes="(min-width: 768px) 320px, 100vw" %}
+    """
+    name, entry = _lookup(image)
+    if not name:
+        return ''
+    if entry is None:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async">',
+                           image.url, alt, css_class)
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+        (mime_type, format_srcset(entry, extension), sizes)
+        for extension, (_, mime_type, _) in FORMATS.items() if extension != 'jpeg'
+    ))
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" '
+        'loading="lazy" decoding="async"></picture>',
+        sources, derivative_url(entry, entry['widths'][-1], 'jpeg'), format_srcset(entry, 'jpeg'), sizes,
+        entry['width'], entry['height'], alt, css_class,
+    )
@@ -0,0 +1,66 @@
+"""
+Query-budget assertions for tests.
+
+``query_budget`` fails when a block runs more queries than allowed, and
+``assert_queries_do_not_scale`` fails when the query count of a callable
+grows with the amount of data it works over (the signature of an N+1).
+Tests that count queries around cached code use ``MEMORY_CACHES``, so a
+database-backed shared cache tier does not add to the count.
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+MEMORY_CACHES = {
+    'default': {'BACKEND': 'apps.core.cache.TieredCache', 'LOCATION': 'shared'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-shared'},
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block of code issues more queries than its budget"""
+
+
+def _format_queries(queries, limit=20):
+    lines = [f"  {i}. {query['sql']}" for i, query in enumerate(queries[:limit], start=1)]
+    if len(queries) > limit:
+        lines.append(f'  ... and {len(queries) - limit} more')
+    return '\n'.join(lines)
+
+
+@contextmanager
+def query_budget(max_queries, using=DEFAULT_DB_ALIAS, label=''):
+    """Fail if the wrapped block executes more than ``max_queries`` queries"""
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    executed = len(context.captured_queries)
+    if executed > max_queries:
+        prefix = f'{label}: ' if label else ''
+        raise QueryBudgetExceeded(
+            f'{prefix}{executed} queries executed, budget was {max_queries}:\n'
+            f'{_format_queries(context.captured_queries)}'
+        )
+
+
+def count_queries(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Call ``func`` and return ``(result, number of queries it ran)``"""
+    with CaptureQueriesContext(connections[using]) as context:
+        result = func(*args, **kwargs)
+    return result, len(context.captured_queries)
+
+
+def assert_queries_do_not_scale(func, grow, using=DEFAULT_DB_ALIAS, label=''):
+    """
+    Check that ``func`` runs the same number of queries before and after ``grow``.
+
+    ``func`` is called once, then ``grow()`` adds data, then ``func`` is
+    called again; the second run may not issue more queries than the first.
+    Returns the baseline query count.
+    """
+    _, baseline = count_queries(func, using=using)
+    grow()
+    with query_budget(baseline, using=using, label=label):
+        func()
+    return baseline
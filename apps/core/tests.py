@@ -1,3 +1,331 @@
-from django.test import TestCase
+import io
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.shortcuts import render as render_page
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from apps.attendance.models import Attendance, AttendanceLog, LiveClass, StudentBarcode
+from apps.courses.models import Course, CourseModule, Enrollment, Lesson, LessonProgress
+from apps.courses.slugs import assign_course_slugs
+from apps.users.models import Parent, Student, Teacher, User
+from apps.users.student_ids import assign_student_ids
+
+from .cache import TieredCache, cached_queryset, model_version
+from .exports import iter_csv
+from .images import generate_derivatives, render_derivatives, responsive_images
+from .models import ImageDerivativeSet
+from .pages import _git_commit, release_version
+from .testing import MEMORY_CACHES, QueryBudgetExceeded, assert_queries_do_not_scale, count_queries, query_budget
+
+PROJECT_APPS = {'users', 'courses', 'attendance'}
+
+# The admin templates need static URLs without a collectstatic manifest
+PLAIN_STATIC_STORAGE = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def seed_rows(count, offset=0):
+    """Create ``count`` linked rows for every model shown in the admin"""
+    numbers = range(offset, offset + count)
+
+    def users(role):
+        return User.objects.bulk_create([
+            User(username=f'{role}{n}@example.com', email=f'{role}{n}@example.com',
+                 first_name=role.title(), last_name=str(n), role=role)
+            for n in numbers
+        ])
+
+    parent_users = users('parent')
+    Parent.objects.bulk_create([Parent(user=user) for user in parent_users])
+    teachers = Teacher.objects.bulk_create([Teacher(user=user, qualifications='BSc') for user in users('teacher')])
+    students = Student.objects.bulk_create(assign_student_ids([
+        Student(user=user, grade_level='grade_10', parent=parent)
+        for user, parent in zip(users('student'), parent_users)
+    ]))
+    courses = Course.objects.bulk_create(assign_course_slugs([
+        Course(title=f'Course {n}', description='-', grade_level='grade_10', subject='Maths', teacher=teacher)
+        for n, teacher in zip(numbers, teachers)
+    ]))
+    modules = CourseModule.objects.bulk_create([
+        CourseModule(course=course, title='Module', description='-') for course in courses
+    ])
+    lessons = Lesson.objects.bulk_create([Lesson(module=module, title='Lesson') for module in modules])
+    enrollments = Enrollment.objects.bulk_create([
+        Enrollment(student=student, course=course) for student, course in zip(students, courses)
+    ])
+    LessonProgress.objects.bulk_create([
+        LessonProgress(enrollment=enrollment, lesson=lesson) for enrollment, lesson in zip(enrollments, lessons)
+    ])
+    StudentBarcode.objects.bulk_create([
+        StudentBarcode(student=student, barcode_data=student.student_id_number) for student in students
+    ])
+    live_classes = LiveClass.objects.bulk_create([
+        LiveClass(course=course, title='Live', scheduled_at=timezone.now()) for course in courses
+    ])
+    attendances = Attendance.objects.bulk_create([
+        Attendance(live_class=live_class, student=student) for live_class, student in zip(live_classes, students)
+    ])
+    AttendanceLog.objects.bulk_create([
+        AttendanceLog(student=attendance.student, attendance=attendance, action='check_in', success=True)
+        for attendance in attendances
+    ])
+
+
+class QueryBudgetTests(TestCase):
+
+    def test_budget_allows_queries_within_limit(self):
+        with query_budget(1) as context:
+            User.objects.count()
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_budget_exceeded_lists_queries(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, '2 queries executed, budget was 1'):
+            with query_budget(1):
+                User.objects.count()
+                User.objects.exists()
+
+    def test_scaling_query_count_fails(self):
+        seed_rows(2)
+
+        def lazy_walk():
+            return [str(enrollment) for enrollment in Enrollment.objects.all()]
+
+        with self.assertRaises(QueryBudgetExceeded):
+            assert_queries_do_not_scale(lazy_walk, lambda: seed_rows(3, offset=2))
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+class AdminChangelistQueryTests(TestCase):
+    """Every project changelist must render in a constant number of queries"""
+
+    SMALL = 5
+    LARGE = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser(email='admin@example.com', password='x')
+        seed_rows(cls.SMALL)
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def changelist_urls(self):
+        for model in admin.site._registry:
+            if model._meta.app_label in PROJECT_APPS:
+                yield model._meta.label, reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+
+    def render(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changelists_do_not_scale_with_rows(self):
+        urls = dict(self.changelist_urls())
+        baselines = {label: count_queries(self.render, url)[1] for label, url in urls.items()}
+
+        seed_rows(self.LARGE - self.SMALL, offset=self.SMALL)
+
+        for label, url in urls.items():
+            with self.subTest(model=label):
+                with query_budget(baselines[label], label=label):
+                    self.render(url)
+
+
+class CsvExportTests(SimpleTestCase):
+    def test_cells_that_would_run_as_formulas_are_quoted(self):
+        rows = [('=HYPERLINK("http://x")', '+94 77', '-1', '@SUM(A1)', '\tcmd', '\rx', 'Nimal', -3, None)]
+        lines = ''.join(iter_csv(['a'] * 9, rows)).split('\r\n')
+        self.assertEqual(lines[1], '"\'=HYPERLINK(""http://x"")",\'+94 77,\'-1,\'@SUM(A1),\'\tcmd,"\'\rx",Nimal,-3,')
+
+
+@cached_queryset('courses.Course')
+def published_titles(subject):
+    return Course.objects.filter(status='published', subject=subject).values_list('title', flat=True)
+
+
+@override_settings(CACHES=MEMORY_CACHES)
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def worker(self, **options):
+        """A second process's default cache: its own L1 over the same shared tier"""
+        return TieredCache('shared', {'OPTIONS': {'L1_TIMEOUT': 5, **options}})
+
+    def test_other_workers_see_changes_once_their_copy_expires(self):
+        worker = self.worker()
+        cache.set('greeting', 'hello')
+        self.assertEqual(worker.get('greeting'), 'hello')
+        self.assertEqual(worker.get('greeting'), 'hello')
+        self.assertEqual((worker.stats()['l2_hits'], worker.stats()['l1_hits']), (1, 1))
+
+        cache.set('greeting', 'hi')
+        self.assertEqual(cache.get('greeting'), 'hi')
+        self.assertEqual(worker.get('greeting'), 'hello')
+        with mock.patch('apps.core.cache.time.monotonic', return_value=10 ** 9):
+            self.assertEqual(worker.get('greeting'), 'hi')
+        misses = cache.stats()['misses']
+        cache.delete('greeting')
+        self.assertIsNone(cache.get('greeting'))
+        self.assertEqual(cache.stats()['misses'], misses + 1)
+
+    def test_l1_is_bounded_and_copies_values(self):
+        worker = self.worker(L1_MAX_ENTRIES=2)
+        for key in 'abc':
+            worker.set(key, {'key': key})
+        self.assertEqual((len(worker.l1), worker.stats()['l1_evictions']), (2, 1))
+        worker.get('b')['key'] = 'changed'
+        self.assertEqual(worker.get('b'), {'key': 'b'})
+        self.assertEqual(worker.get('a'), {'key': 'a'})  # from the shared tier
+
+    def test_cached_rows_follow_model_versions(self):
+        teacher = Teacher.objects.create(
+            user=User.objects.create_user('cache-teacher@example.com', 'x', role='teacher'), qualifications='-',
+        )
+        course = Course.objects.create(title='Algebra', description='-', grade_level='grade_10', subject='Maths',
+                                       teacher=teacher, status='published')
+        with self.assertNumQueries(1):
+            self.assertEqual(published_titles('Maths'), ['Algebra'])
+        with self.assertNumQueries(0):
+            self.assertEqual(published_titles('Maths'), ['Algebra'])
+
+        version = model_version(Course)
+        course.title = 'Algebra I'
+        course.save()
+        self.assertNotEqual(model_version(Course), version)
+        self.assertEqual(published_titles('Maths'), ['Algebra I'])
+
+    def test_stats_are_for_staff(self):
+        self.assertEqual(self.client.get('/cache-stats/', secure=True).status_code, 302)
+        self.client.force_login(User.objects.create_user('cache-staff@example.com', 'x', is_staff=True))
+        self.assertIn('hit_ratio', self.client.get('/cache-stats/', secure=True).json()['default'])
+
+
+@override_settings(CACHES=MEMORY_CACHES, PAGE_CACHE_SECONDS=300, RELEASE_VERSION='r1')
+class CachedPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path='/', **headers):
+        return self.client.get(path, secure=True, headers=headers)
+
+    def test_anonymous_pages_are_rendered_once_per_release(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Sign Up Free', first.content.decode())
+        with mock.patch('apps.core.views.render') as render:
+            again = self.get('/?utm_source=newsletter')
+            render.assert_not_called()
+        self.assertEqual((again.content, again['ETag']), (first.content, first['ETag']))
+        self.assertIn('must-revalidate', again['Cache-Control'])
+
+        with override_settings(RELEASE_VERSION='r2'), mock.patch('apps.core.views.render', wraps=render_page) as render:
+            self.get()
+            render.assert_called_once()
+
+    def test_repeat_visitors_get_304(self):
+        first = self.get('/about/')
+        self.assertEqual(self.get('/about/', if_none_match=first['ETag']).status_code, 304)
+        self.assertEqual(self.get('/about/', if_modified_since=first['Last-Modified']).status_code, 304)
+        changed = self.get('/about/', if_none_match='"stale"')
+        self.assertEqual((changed.status_code, changed.content), (200, first.content))
+
+    def test_signed_in_users_get_their_own_page(self):
+        self.get('/contact/')
+        user = User.objects.create_user('page-visitor@example.com', 'x', first_name='Ruwan', last_name='Fernando')
+        self.client.force_login(user)
+        response = self.get('/contact/')
+        self.assertIn('Ruwan Fernando', response.content.decode())
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_release_defaults_to_the_checked_out_commit(self):
+        with tempfile.TemporaryDirectory() as base_dir:
+            git = Path(base_dir) / '.git'
+            git.mkdir()
+            (git / 'HEAD').write_text('ref: refs/heads/main\n')
+            (git / 'packed-refs').write_text('# pack-refs with: peeled\nabc123 refs/heads/main\n')
+            _git_commit.cache_clear()
+            self.addCleanup(_git_commit.cache_clear)
+            with override_settings(RELEASE_VERSION='', BASE_DIR=Path(base_dir)):
+                self.assertEqual(release_version(), 'abc123')
+
+
+def image_bytes(size=(300, 150), mode='RGB', image_format='JPEG', orientation=None):
+    buffer = io.BytesIO()
+    image = Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(buffer, image_format, exif=exif)
+    return buffer.getvalue()
+
+
+@override_settings(CACHES=MEMORY_CACHES, IMAGE_DERIVATIVE_WIDTHS=(100, 200))
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.teacher = Teacher.objects.create(
+            user=User.objects.create_user('image-teacher@example.com', 'x', role='teacher'), qualifications='-',
+        )
+
+    def sizes(self, files):
+        return {key: Image.open(io.BytesIO(data)).size for key, data in files.items()}
+
+    def test_widths_follow_the_upright_image_and_never_upscale(self):
+        width, height, files = render_derivatives(image_bytes(orientation=6))
+        self.assertEqual((width, height), (150, 300))
+        self.assertEqual(self.sizes(files), {
+            (100, 'webp'): (100, 200), (100, 'jpeg'): (100, 200), (150, 'webp'): (150, 300), (150, 'jpeg'): (150, 300),
+        })
+        _, _, files = render_derivatives(image_bytes((900, 300), 'RGBA', 'PNG'))
+        self.assertEqual(sorted({width for width, _ in files}), [100, 200])
+        self.assertEqual(Image.open(io.BytesIO(files[(200, 'jpeg')])).getpixel((0, 0))[1], 142)  # on white
+
+    def test_saving_an_image_generates_derivatives_after_commit(self):
+        course = Course(title='Optics', description='-', grade_level='grade_12', subject='Physics',
+                        teacher=self.teacher, status='published')
+        course.thumbnail.save('optics.jpg', ContentFile(image_bytes()), save=False)
+        with mock.patch('apps.core.images.queue_derivatives', side_effect=generate_derivatives) as queue:
+            with self.captureOnCommitCallbacks(execute=True):
+                course.save()
+            queue.assert_called_once_with(course.thumbnail.name)
+            course.title = 'Optics I'
+            with self.captureOnCommitCallbacks(execute=True):
+                course.save()
+            queue.assert_called_once()  # the image did not change
+
+        html = Template('{% load images %}{% responsive_image course.thumbnail alt="Optics" sizes="200px" %}').render(
+            Context({'course': course})
+        )
+        digest = responsive_images([course.thumbnail.name])[course.thumbnail.name]['digest']
+        self.assertIn(f'<source type="image/webp" srcset="/media/derivatives/{digest[:2]}/{digest}/100.webp 100w, '
+                      f'/media/derivatives/{digest[:2]}/{digest}/200.webp 200w" sizes="200px">', html)
+        self.assertIn('width="300" height="150" alt="Optics"', html)
+        with self.assertNumQueries(0):
+            responsive_images([course.thumbnail.name])
+
+    def test_backfill_renders_each_distinct_image_once(self):
+        users = [User.objects.create_user(f'image-user{n}@example.com', 'x') for n in range(3)]
+        for user, content in zip(users, [image_bytes(), image_bytes(), image_bytes((120, 120))]):
+            user.profile_image.save(f'{user.pk}.jpg', ContentFile(content), save=False)
+            User.objects.filter(pk=user.pk).update(profile_image=user.profile_image.name)
+        out = io.StringIO()
+        call_command('generate_image_derivatives', workers=2, stdout=out)
+        self.assertIn('3 image(s) rendered, 0 reused identical content, 0 failed', out.getvalue())
+        self.assertEqual(ImageDerivativeSet.objects.values('digest').distinct().count(), 2)
+        call_command('generate_image_derivatives', workers=2, stdout=out)
+        self.assertIn('Every image has its derivatives.', out.getvalue())
@@ -1,6 +1,12 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from .cache import cache_stats as tiered_cache_stats
+from .pages import cached_page
 
+
+@cached_page
 def home(request):
     """Homepage view"""
     context = {
@@ -9,6 +15,7 @@ def home(request):
     return render(request, 'core/home.html', context)
 
 
+@cached_page
 def about(request):
     """About page view"""
     context = {
@@ -17,9 +24,16 @@ def about(request):
     return render(request, 'core/about.html', context)
 
 
+@cached_page
 def contact(request):
     """Contact page view"""
     context = {
         'title': 'Contact Us - Achievers Learning Center',
     }
     return render(request, 'core/contact.html', context)
+
+
+@staff_member_required
+def cache_stats(request):
+    """Hit/miss counters of the worker process that serves the request"""
+    return JsonResponse({'default': tiered_cache_stats()})
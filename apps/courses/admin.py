@@ -1,5 +1,7 @@
 from django.contrib import admin
+from .exports import enrollment_export
 from .models import Course, CourseModule, Lesson, Enrollment, LessonProgress
+from .search import search_course_ids
 
 
 class CourseModuleInline(admin.TabularInline):
@@ -14,17 +16,26 @@ class LessonInline(admin.TabularInline):
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('title', 'teacher', 'course_type', 'grade_level', 'price', 'status', 'enrollment_count')
+    list_display = ('title', 'teacher', 'course_type', 'grade_level', 'price', 'status', 'active_enrollment_count')
     list_filter = ('status', 'course_type', 'grade_level')
     search_fields = ('title', 'description', 'teacher__user__first_name', 'teacher__user__last_name')
+    list_select_related = ('teacher__user',)
     prepopulated_fields = {'slug': ('title',)}
+    readonly_fields = ('active_enrollment_count',)
     inlines = [CourseModuleInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text index instead of icontains over every row (see apps.courses.search)
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=search_course_ids(search_term)), False
+
 
 @admin.register(CourseModule)
 class CourseModuleAdmin(admin.ModelAdmin):
     list_display = ('title', 'course', 'order_index')
     list_filter = ('course',)
+    list_select_related = ('course',)
     inlines = [LessonInline]
 
 
@@ -32,6 +43,7 @@ class CourseModuleAdmin(admin.ModelAdmin):
 class LessonAdmin(admin.ModelAdmin):
     list_display = ('title', 'module', 'content_type', 'duration_minutes', 'is_free_preview')
     list_filter = ('content_type', 'is_free_preview')
+    list_select_related = ('module__course',)
 
 
 @admin.register(Enrollment)
@@ -39,9 +51,12 @@ class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ('student', 'course', 'status', 'payment_status', 'enrollment_date', 'completion_percentage')
     list_filter = ('status', 'payment_status', 'enrollment_date')
     search_fields = ('student__user__first_name', 'student__user__last_name', 'course__title')
+    list_select_related = ('student__user', 'course')
+    actions = enrollment_export.admin_actions()
 
 
 @admin.register(LessonProgress)
 class LessonProgressAdmin(admin.ModelAdmin):
     list_display = ('enrollment', 'lesson', 'status', 'time_spent_minutes', 'completed_at')
     list_filter = ('status',)
+    list_select_related = ('enrollment__student__user', 'enrollment__course', 'lesson__module__course')
@@ -0,0 +1,207 @@
+"""
+Faceted course catalog (HLD 4.1.2).
+
+Published courses are filtered by ``grade_level``, ``subject``, ``language``
+and ``course_type`` (any of several values each) and a price range.
+Facet counts for all four fields come from one grouped query: the rows are
+grouped by every facet column at once, and each facet's counts are summed
+from those groups with the other facets' selections applied, so selecting
+"Grade 10" still shows how many courses every other grade has.
+
+Pages use keyset pagination on the sort key plus ``pk``, so page 200 costs
+the same as page 1 and nothing shifts when a course is published between
+requests. Pages and facets are cached per normalized filter combination
+under a catalog version that every ``Course`` save or delete bumps.
+"""
+import base64
+import hashlib
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_datetime
+
+from apps.core.cache import bump_version, get_version
+
+from .models import Course
+
+FACETS = ('grade_level', 'subject', 'language', 'course_type')
+# sort name -> (field, descending); pk breaks ties in the same direction
+SORTS = {
+    'newest': ('created_at', True),
+    'price_low': ('price', False),
+    'price_high': ('price', True),
+}
+CARD_FIELDS = (
+    'pk', 'title', 'slug', 'grade_level', 'subject', 'language', 'course_type', 'price', 'thumbnail',
+    'duration_weeks', 'active_enrollment_count', 'enrollment_limit', 'created_at',
+    'teacher__user__first_name', 'teacher__user__last_name',
+)
+VERSION_NAME = 'courses:catalog'
+MAX_PAGE_SIZE = 100
+
+
+def catalog_page_size():
+    return getattr(settings, 'CATALOG_PAGE_SIZE', 24)
+
+
+def catalog_cache_seconds():
+    return getattr(settings, 'CATALOG_CACHE_SECONDS', 300)
+
+
+@dataclass(frozen=True)
+class CatalogQuery:
+    """Normalized catalog filters; equal filters give equal cache keys"""
+
+    selected: tuple = ()  # ((facet, (value, ...)), ...) for facets with a selection
+    min_price: Decimal = None
+    max_price: Decimal = None
+    sort: str = 'newest'
+    after: str = ''
+    page_size: int = field(default_factory=catalog_page_size)
+
+    @classmethod
+    def from_params(cls, params):
+        """Build from request GET params; raises ``ValueError`` for invalid values"""
+        choices = {'language': Course.LANGUAGE_CHOICES, 'course_type': Course.COURSE_TYPE_CHOICES}
+        selected = []
+        for facet in FACETS:
+            values = sorted({value for value in params.getlist(facet) if value})
+            if facet in choices:
+                unknown = set(values) - {value for value, _ in choices[facet]}
+                if unknown:
+                    raise ValueError(f'Unknown {facet}: {", ".join(sorted(unknown))}')
+            if values:
+                selected.append((facet, tuple(values)))
+        sort = params.get('sort') or 'newest'
+        if sort not in SORTS:
+            raise ValueError(f'sort must be one of {", ".join(SORTS)}')
+        try:
+            page_size = min(int(params.get('page_size') or catalog_page_size()), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValueError('page_size must be a number')
+        query = cls(
+            selected=tuple(selected), min_price=_price(params.get('min_price')),
+            max_price=_price(params.get('max_price')), sort=sort, after=params.get('after', ''),
+            page_size=max(page_size, 1),
+        )
+        query.cursor_values()  # reject a malformed cursor before touching the cache
+        return query
+
+    def facet_filter(self):
+        condition = Q()
+        for facet, values in self.selected:
+            condition &= Q(**{f'{facet}__in': values})
+        return condition
+
+    def base_queryset(self):
+        """Published courses in the price range, before facet selections"""
+        queryset = Course.objects.filter(status='published')
+        if self.min_price is not None:
+            queryset = queryset.filter(price__gte=self.min_price)
+        if self.max_price is not None:
+            queryset = queryset.filter(price__lte=self.max_price)
+        return queryset
+
+    def cursor_values(self):
+        """Sort key values of the last row on the previous page, or None"""
+        if not self.after:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(self.after.encode()))
+            value = parse_datetime(value) if self.sort == 'newest' else Decimal(value)
+            # Decimal() takes NaN and Infinity, which the price filter cannot
+            if value is None or (isinstance(value, Decimal) and not value.is_finite()):
+                raise ValueError
+            return value, int(pk)
+        except (ValueError, TypeError, InvalidOperation, json.JSONDecodeError):
+            raise ValueError('Invalid page cursor')
+
+    def cache_key(self, part):
+        """Facet counts depend only on the filters; pages also on sort, cursor and size"""
+        parts = (self.selected, str(self.min_price), str(self.max_price))
+        if part == 'page':
+            parts += (self.sort, self.after, self.page_size)
+        digest = hashlib.md5(repr(parts).encode()).hexdigest()
+        return f'courses:catalog:{catalog_version()}:{part}:{digest}'
+
+
+def _price(value):
+    if value in (None, ''):
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'Invalid price: {value}')
+    if not price.is_finite():
+        raise ValueError(f'Invalid price: {value}')
+    return price
+
+
+def make_cursor(row, sort):
+    key = SORTS[sort][0]
+    value = row[key].isoformat() if sort == 'newest' else str(row[key])
+    return base64.urlsafe_b64encode(json.dumps([value, row['pk']]).encode()).decode()
+
+
+def catalog_version():
+    return get_version(VERSION_NAME)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog page and facet count"""
+    bump_version(VERSION_NAME)
+
+
+def compute_facets(query):
+    """``{facet: [(value, count), ...]}`` for every facet, from one grouped query"""
+    groups = list(query.base_queryset().values(*FACETS).annotate(n=Count('pk')).order_by())
+    facets = {}
+    for facet in FACETS:
+        # A facet's own selection does not narrow its counts, the other facets' do
+        others = [(name, set(values)) for name, values in query.selected if name != facet]
+        counts = Counter()
+        for group in groups:
+            if all(group[name] in values for name, values in others):
+                counts[group[facet]] += group['n']
+        facets[facet] = sorted(counts.items())
+    return facets
+
+
+def fetch_page(query):
+    """``(courses, next_cursor)``: up to ``page_size`` course dicts after the cursor"""
+    queryset = query.base_queryset().filter(query.facet_filter())
+    key, descending = SORTS[query.sort]
+    cursor = query.cursor_values()
+    if cursor is not None:
+        value, pk = cursor
+        beyond = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{key}__{beyond}': value}) | Q(**{key: value, f'pk__{beyond}': pk})
+        )
+    order = [f'-{key}', '-pk'] if descending else [key, 'pk']
+    rows = list(queryset.order_by(*order).values(*CARD_FIELDS)[:query.page_size + 1])
+    next_cursor = make_cursor(rows[query.page_size - 1], query.sort) if len(rows) > query.page_size else None
+    return rows[:query.page_size], next_cursor
+
+
+def catalog_facets(query):
+    key = query.cache_key('facets')
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(query)
+        cache.set(key, facets, timeout=catalog_cache_seconds())
+    return facets
+
+
+def catalog_page(query):
+    key = query.cache_key('page')
+    page = cache.get(key)
+    if page is None:
+        page = fetch_page(query)
+        cache.set(key, page, timeout=catalog_cache_seconds())
+    return page
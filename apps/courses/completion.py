@@ -0,0 +1,94 @@
+"""
+Incremental ``Enrollment.completion_percentage``.
+
+Each enrollment keeps ``completed_lessons``, shifted by one with ``F()``
+when a ``LessonProgress`` becomes (or stops being) completed, and the
+percentage is set from it in the same UPDATE against the course's lesson
+count. The count is cached per course in the shared cache tier (every
+worker must see a change at once) and dropped when a ``Lesson`` or
+``CourseModule`` is saved or deleted; since that also changes every
+enrollment's percentage, the course is then recomputed with one aggregate
+query (``recompute_course_completion``). A decrement stops at zero, so a
+count that drifted low cannot trip the column's non-negative constraint;
+migration 0006 counted the lessons completed before the column existed,
+and ``reconcile_completion`` fixes any drift.
+"""
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least, Round
+
+from apps.core.cache import shared_cache
+
+from .models import Enrollment, Lesson, LessonProgress
+
+PERCENT = DecimalField(max_digits=5, decimal_places=2)
+
+
+def _lesson_count_key(course_id):
+    return f'courses:lesson-count:{course_id}'
+
+
+def course_lesson_count(course_id):
+    """Number of lessons in a course, cached until its lessons or modules change"""
+    key = _lesson_count_key(course_id)
+    count = shared_cache().get(key)
+    if count is None:
+        count = Lesson.objects.filter(module__course_id=course_id).count()
+        shared_cache().set(key, count, timeout=None)
+    return count
+
+
+def forget_lesson_count(course_id):
+    shared_cache().delete(_lesson_count_key(course_id))
+
+
+def percentage(completed, total):
+    """SQL expression for ``completed`` (an expression) out of ``total`` lessons, capped at 100"""
+    if not total:
+        return Value(0, output_field=PERCENT)
+    share = Round(completed * Value(100.0) / Value(total), 2, output_field=PERCENT)
+    return Least(share, Value(100, output_field=PERCENT))
+
+
+def shift_completed_lessons(enrollment_id, delta, course_id=None):
+    """Move an enrollment's completed lesson count by ``delta`` and reset its percentage (one UPDATE)"""
+    if not delta:
+        return
+    if course_id is None:
+        course_id = Enrollment.objects.filter(pk=enrollment_id).values_list('course_id', flat=True).first()
+        if course_id is None:
+            return
+    completed = F('completed_lessons') + delta if delta > 0 else Greatest(F('completed_lessons') + delta, 0)
+    Enrollment.objects.filter(pk=enrollment_id).update(
+        completed_lessons=completed,
+        completion_percentage=percentage(completed, course_lesson_count(course_id)),
+    )
+
+
+def _completed_count(course_id):
+    return Subquery(
+        LessonProgress.objects.filter(
+            enrollment=OuterRef('pk'), status='completed', lesson__module__course_id=course_id
+        ).order_by().values('enrollment').annotate(n=Count('pk')).values('n')
+    )
+
+
+def recompute_course_completion(course_id):
+    """Recount every enrollment of a course in one UPDATE; returns enrollments updated"""
+    forget_lesson_count(course_id)
+    completed = Coalesce(_completed_count(course_id), 0)
+    return Enrollment.objects.filter(course_id=course_id).update(
+        completed_lessons=completed,
+        completion_percentage=percentage(completed, course_lesson_count(course_id)),
+    )
+
+
+def completion_drift(course_id):
+    """Enrollments of a course whose stored count or percentage is off, annotated with ``actual``"""
+    forget_lesson_count(course_id)
+    return Enrollment.objects.filter(course_id=course_id).annotate(
+        actual=Count('lesson_progress', filter=Q(
+            lesson_progress__status='completed', lesson_progress__lesson__module__course_id=course_id,
+        )),
+    ).annotate(
+        expected=percentage(F('actual'), course_lesson_count(course_id)),
+    ).filter(~Q(completed_lessons=F('actual')) | ~Q(completion_percentage=F('expected')))
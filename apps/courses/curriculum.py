@@ -0,0 +1,84 @@
+"""
+Cached course curriculum (course -> modules -> lessons).
+
+``load_curriculum`` reads a whole course in three queries (course with
+teacher, modules, lessons) and returns a compact tree of plain dicts.
+``course_curriculum`` caches it under the course's curriculum version,
+which signals bump whenever the course, one of its modules or one of its
+lessons is saved or deleted; a repeat view is one cache read for the
+version and one for the tree, and a stale tree is never served.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from apps.core.cache import bump_version, get_version
+
+from .models import Course, CourseModule, Lesson
+
+LESSON_FIELDS = ('pk', 'module_id', 'title', 'content_type', 'duration_minutes', 'order_index', 'is_free_preview')
+
+
+def curriculum_cache_seconds():
+    return getattr(settings, 'CURRICULUM_CACHE_SECONDS', 24 * 60 * 60)
+
+
+def curriculum_version(course_id):
+    return get_version(f'courses:curriculum:{course_id}')
+
+
+def bump_curriculum_version(*course_ids):
+    bump_version(*(f'courses:curriculum:{course_id}' for course_id in set(course_ids) - {None}))
+
+
+def load_curriculum(course_id):
+    """The course's tree as plain dicts, or None if there is no such course"""
+    lessons = Lesson.objects.only(*LESSON_FIELDS).order_by('order_index', 'pk')
+    modules = CourseModule.objects.only('pk', 'course_id', 'title', 'order_index').order_by('order_index', 'pk')
+    course = (
+        Course.objects.select_related('teacher__user')
+        .prefetch_related(Prefetch('modules', queryset=modules), Prefetch('modules__lessons', queryset=lessons))
+        .filter(pk=course_id)
+        .first()
+    )
+    if course is None:
+        return None
+    tree = {
+        'id': course.pk,
+        'slug': course.slug,
+        'title': course.title,
+        'status': course.status,
+        'teacher': {
+            'user_id': course.teacher.user_id,
+            'name': f'{course.teacher.user.first_name} {course.teacher.user.last_name}'.strip(),
+        },
+        'modules': [],
+        'lesson_count': 0,
+        'duration_minutes': 0,
+    }
+    for module in course.modules.all():
+        module_lessons = [
+            {
+                'id': lesson.pk,
+                'title': lesson.title,
+                'content_type': lesson.content_type,
+                'duration_minutes': lesson.duration_minutes,
+                'is_free_preview': lesson.is_free_preview,
+            }
+            for lesson in module.lessons.all()
+        ]
+        tree['modules'].append({'id': module.pk, 'title': module.title, 'lessons': module_lessons})
+        tree['lesson_count'] += len(module_lessons)
+        tree['duration_minutes'] += sum(lesson['duration_minutes'] for lesson in module_lessons)
+    return tree
+
+
+def course_curriculum(course_id):
+    """``load_curriculum`` through the cache"""
+    key = f'courses:curriculum:{course_id}:{curriculum_version(course_id)}'
+    tree = cache.get(key)
+    if tree is None:
+        tree = load_curriculum(course_id)
+        if tree is not None:
+            cache.set(key, tree, timeout=curriculum_cache_seconds())
+    return tree
@@ -0,0 +1,168 @@
+"""
+Protected delivery of ``Lesson.file_attachment``.
+
+Lesson files are for students enrolled in the course (active or
+completed, also once the course is archived), for anyone when the lesson
+is a free preview of a published course, and for the course's teacher and
+staff. ``lesson_file_access``
+answers that with one query: the file name, the course and the
+enrollment check (an ``Exists`` subquery) come back in a single row.
+
+Files run up to 100 MB, and streaming one through a gthread worker would
+hold a thread for the whole download. With ``PROTECTED_MEDIA_ACCEL_PREFIX``
+set (the nginx setup in ``deployment/`` sets it) the view answers with an
+empty response carrying ``X-Accel-Redirect`` and nginx sends the file from
+an ``internal`` location, handling Range and conditional requests itself;
+``/media/lesson_files/`` is not served publicly. Without it (development,
+or a host without nginx) ``serve_file`` streams the file with a
+``FileResponse`` that answers single byte ranges and ``If-None-Match`` /
+``If-Modified-Since`` / ``If-Range`` itself.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Exists, OuterRef, Value
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from .models import Enrollment, Lesson
+
+ACCESS_STATUSES = ('active', 'completed')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def accel_prefix():
+    return getattr(settings, 'PROTECTED_MEDIA_ACCEL_PREFIX', '')
+
+
+def lesson_file_access(user, lesson_id):
+    """``(file name, allowed)`` for the lesson's attachment; None if the lesson has none"""
+    student = getattr(user, 'student_profile', None) if user.is_authenticated else None
+    enrolled = Exists(Enrollment.objects.filter(
+        student_id=student.pk, course=OuterRef('module__course'), status__in=ACCESS_STATUSES,
+    )) if student is not None else Value(False)
+    row = Lesson.objects.filter(pk=lesson_id).annotate(enrolled=enrolled).values_list(
+        'file_attachment', 'is_free_preview', 'module__course__status', 'module__course__teacher__user_id', 'enrolled',
+    ).first()
+    if row is None or not row[0]:
+        return None
+    name, free_preview, course_status, teacher_user_id, is_enrolled = row
+    allowed = (
+        user.is_staff
+        or (user.is_authenticated and user.pk == teacher_user_id)
+        or is_enrolled
+        or (free_preview and course_status == 'published')
+    )
+    return name, allowed
+
+
+def _content_type(name):
+    content_type, encoding = mimetypes.guess_type(name)
+    # A .gz file is sent as it is, not as content for the browser to unpack
+    return 'application/octet-stream' if encoding or not content_type else content_type
+
+
+def _protected_headers(response, name):
+    response['Content-Disposition'] = content_disposition_header(False, os.path.basename(name))
+    response['Accept-Ranges'] = 'bytes'
+    # Browsers may keep what they were allowed to see; shared caches may not
+    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
+
+
+def accel_response(name):
+    """Empty response telling nginx to send ``name`` from the protected location"""
+    response = HttpResponse(content_type=_content_type(name))
+    response['X-Accel-Redirect'] = f'{accel_prefix()}{quote(name)}'
+    return _protected_headers(response, name)
+
+
+def parse_range(header, size):
+    """``(start, end)`` (inclusive) of a single ``bytes=`` range
+
+    None when there is no range to honour (absent, malformed or several
+    ranges: the whole file is sent), False when it cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the last N bytes
+        length = int(last)
+        return (max(size - length, 0), size - 1) if length and size else False
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    return (start, end) if start < size else False
+
+
+class _FileRange:
+    """Reads at most ``length`` bytes of ``file`` from where it stands"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _range_applies(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # Ranges only follow a strong validator
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def serve_file(request, name):
+    """Stream a stored file with Range and conditional request support (development fallback)"""
+    path = default_storage.path(name)
+    stat = os.stat(path)
+    size, last_modified = stat.st_size, int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return _protected_headers(response, name)
+    file = open(path, 'rb')
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size) if _range_applies(request, etag, last_modified) else None
+    if byte_range is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return _protected_headers(response, name)
+    filename = os.path.basename(name)
+    if byte_range is None:
+        response = FileResponse(file, filename=filename, content_type=_content_type(name))
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(
+            _FileRange(file, end - start + 1), filename=filename, content_type=_content_type(name), status=206,
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return _protected_headers(response, name)
+
+
+def lesson_file_response(request, name):
+    return accel_response(name) if accel_prefix() else serve_file(request, name)
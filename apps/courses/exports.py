@@ -0,0 +1,31 @@
+"""
+Enrollment exports (see ``apps.core.exports``).
+"""
+from apps.core.exports import Export, date_range_filter
+
+from .models import Enrollment
+
+enrollment_export = Export('enrollments', (
+    ('Student ID', 'student__student_id_number'),
+    ('First name', 'student__user__first_name'),
+    ('Last name', 'student__user__last_name'),
+    ('Email', 'student__user__email'),
+    ('Course', 'course__title'),
+    ('Enrolled on', 'enrollment_date'),
+    ('Status', 'status'),
+    ('Payment status', 'payment_status'),
+    ('Completion %', 'completion_percentage'),
+    ('Grade', 'grade'),
+))
+
+
+def filter_enrollments(params):
+    """Enrollments filtered in SQL by enrollment date range, course, status and payment status"""
+    queryset = Enrollment.objects.filter(**date_range_filter('enrollment_date', params))
+    if params.get('course'):
+        queryset = queryset.filter(course_id=int(params['course']))
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    if params.get('payment_status'):
+        queryset = queryset.filter(payment_status=params['payment_status'])
+    return queryset
@@ -0,0 +1,80 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.attendance.benchmarks import percentile
+from apps.courses.models import Course, CourseModule, Lesson
+from apps.courses.search import rebuild_search_index, search
+from apps.users.models import Teacher, User
+
+SUBJECTS = ['Mathematics', 'Physics', 'Chemistry', 'Biology', 'ICT', 'English', 'Accounting', 'Economics']
+# The commonest words of the vocabulary play the part of stop words and are never searched for
+STOP_WORDS = 100
+
+
+def _vocabulary(rng, size=20_000):
+    """Made-up words with Zipf-distributed frequencies, like real text"""
+    words = list({''.join(rng.choices('abcdefghiklmnoprstuvy', k=rng.randint(4, 10))) for _ in range(size)})
+    rng.shuffle(words)
+    return words, [1 / rank for rank in range(1, len(words) + 1)]
+
+
+class Command(BaseCommand):
+    help = 'Time ranked course/lesson search over a synthetic catalog (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=10_000)
+        parser.add_argument('--lessons-per-course', type=int, default=4)
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._run(options)
+            transaction.set_rollback(True)
+
+    def _run(self, options):
+        rng = random.Random(0)
+        words, weights = _vocabulary(rng)
+
+        def text(count):
+            return ' '.join(rng.choices(words, weights, k=count))
+
+        user = User.objects.create_user('search-bench-teacher@example.com', 'x', role='teacher',
+                                        first_name='Nimal', last_name='Perera')
+        teacher = Teacher.objects.create(user=user, qualifications='-')
+        courses = Course.objects.bulk_create([
+            Course(title=f'{rng.choice(SUBJECTS)} {text(3)}', slug=f'search-bench-{n}', teacher=teacher,
+                   description=text(60), syllabus=text(40), subject=rng.choice(SUBJECTS),
+                   grade_level='grade_12', status='published')
+            for n in range(options['courses'])
+        ], batch_size=2_000)
+        modules = CourseModule.objects.bulk_create([
+            CourseModule(course=course, title=text(2), description='-') for course in courses
+        ], batch_size=2_000)
+        Lesson.objects.bulk_create([
+            Lesson(module=module, title=text(4), article_content=text(120), order_index=n)
+            for module in modules for n in range(options['lessons_per_course'])
+        ], batch_size=2_000)
+
+        started = time.perf_counter()
+        documents = rebuild_search_index()
+        self.stdout.write(f'Indexed {documents} documents in {time.perf_counter() - started:.1f}s '
+                          f'({connection.vendor})')
+
+        # Whole words, and the first few letters of a word while the user is still typing
+        searchable, searchable_weights = words[STOP_WORDS:], weights[STOP_WORDS:]
+        queries = [
+            ' '.join(rng.choices(searchable, searchable_weights, k=rng.randint(1, 3)))[:rng.choice([3, 5, 60])]
+            for _ in range(options['queries'])
+        ]
+        timings, hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            hits += bool(search(query))
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f'{len(queries)} queries: p50 {percentile(timings, 0.5):.1f} ms, p95 {percentile(timings, 0.95):.1f} ms, '
+            f'max {max(timings):.1f} ms; {hits} with results'
+        )
@@ -0,0 +1,83 @@
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.attendance.benchmarks import seed_scan_fixture
+from apps.courses.models import Course, CourseModule, Enrollment, Lesson, LessonProgress
+from apps.courses.progress import ProgressBuffer
+from apps.users.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Compare per-heartbeat UPDATEs with coalesced lesson progress flushes (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--learners', type=int, default=1_000)
+        parser.add_argument('--minutes', type=int, default=5, help='Simulated watch time per learner')
+        parser.add_argument('--interval', type=int, default=15, help='Seconds between heartbeats')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._run(options)
+            transaction.set_rollback(True)
+
+    def _run(self, options):
+        teacher_user, _, _ = seed_scan_fixture(options['learners'], 0, prefix='heartbeat')
+        course = Course.objects.get(teacher__user=teacher_user)
+        module = CourseModule.objects.create(course=course, title='-', description='-')
+        lessons = Lesson.objects.bulk_create([Lesson(module=module, title=f'Lesson {n}') for n in range(10)])
+        enrollments = Enrollment.objects.bulk_create([
+            Enrollment(student=student, course=course, status='active')
+            for student in Student.objects.filter(user__username__startswith='heartbeat')
+        ], batch_size=2_000)
+        beats = options['minutes'] * 60 // options['interval']
+        heartbeats = [
+            (enrollment.pk, lessons[n % len(lessons)].pk)
+            for _ in range(beats) for n, enrollment in enumerate(enrollments)
+        ]
+        self.stdout.write(f'{len(heartbeats)} heartbeats from {len(enrollments)} learners')
+
+        # One UPDATE per heartbeat, as the request path would do without coalescing
+        LessonProgress.objects.bulk_create([
+            LessonProgress(enrollment_id=enrollment_id, lesson_id=lesson_id, status='in_progress')
+            for enrollment_id, lesson_id in heartbeats[:len(enrollments)]
+        ])
+        sample = heartbeats[:min(len(heartbeats), 5_000)]
+        started = time.perf_counter()
+        for enrollment_id, lesson_id in sample:
+            LessonProgress.objects.filter(enrollment_id=enrollment_id, lesson_id=lesson_id).update(
+                time_spent_minutes=F('time_spent_minutes') + 1, last_accessed_at=timezone.now()
+            )
+        per_update = (time.perf_counter() - started) / len(sample)
+        self.stdout.write(
+            f'direct: {per_update * 1e6:.0f} us per heartbeat on the request path, '
+            f'{len(heartbeats)} statements ({per_update * len(heartbeats):.2f}s of database time)'
+        )
+        LessonProgress.objects.all().delete()
+
+        with mock.patch.object(ProgressBuffer, '_ensure_thread'):
+            buffer = ProgressBuffer(flush_interval=options['interval'] * 2)
+            flush_every = len(enrollments) * 2  # one flush per two heartbeat rounds
+            statements = flush_seconds = 0
+            started = time.perf_counter()
+            for n, (enrollment_id, lesson_id) in enumerate(heartbeats, 1):
+                buffer.add(enrollment_id, lesson_id, options['interval'])
+                if n % flush_every == 0:
+                    with CaptureQueriesContext(connection) as queries:
+                        flush_started = time.perf_counter()
+                        buffer.flush()
+                        flush_seconds += time.perf_counter() - flush_started
+                    statements += len(queries)
+            total = time.perf_counter() - started - flush_seconds
+            buffer.flush(final=True)
+        self.stdout.write(
+            f'coalesced: {total / len(heartbeats) * 1e6:.1f} us per heartbeat on the request path, '
+            f'{statements} statements in flushes ({flush_seconds:.2f}s of database time)'
+        )
+        minutes = sorted(LessonProgress.objects.values_list('time_spent_minutes', flat=True).distinct())
+        self.stdout.write(f'recorded minutes per learner: {minutes} (expected {options["minutes"]})')
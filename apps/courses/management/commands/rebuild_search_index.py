@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.courses.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the course and lesson search documents (after bulk imports, which skip signals)'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            written = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {written} courses and lessons in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses.completion import completion_drift, recompute_course_completion
+from apps.courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Recompute Enrollment.completed_lessons / completion_percentage and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+        parser.add_argument('--course', type=int, help='Only this course id')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by('pk').values_list('pk', 'title')
+        if options['course']:
+            courses = courses.filter(pk=options['course'])
+
+        drifted_courses = drifted_enrollments = 0
+        for course_id, title in list(courses):
+            # One aggregate query per course to find drift, one UPDATE to fix it
+            drifted = completion_drift(course_id).count()
+            if not drifted:
+                continue
+            self.stdout.write(f'{title}: {drifted} enrollments drifted')
+            drifted_courses += 1
+            drifted_enrollments += drifted
+            if not options['dry_run']:
+                recompute_course_completion(course_id)
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {drifted_enrollments} enrollment(s) with drifted completion in {drifted_courses} course(s).'
+        ))
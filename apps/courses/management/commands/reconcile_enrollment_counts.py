@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+
+from apps.courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Recompute Course.active_enrollment_count and fix any drift from the enrollments table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        drifted = (
+            Course.objects
+            .annotate(actual=Count('enrollments', filter=Q(enrollments__status='active')))
+            .exclude(active_enrollment_count=F('actual'))
+            .only('pk', 'title', 'active_enrollment_count')
+        )
+
+        fixed = []
+        for course in drifted.iterator(chunk_size=options['batch_size']):
+            self.stdout.write(f'{course.title}: stored {course.active_enrollment_count}, actual {course.actual}')
+            course.active_enrollment_count = course.actual
+            fixed.append(course)
+
+        if fixed and not options['dry_run']:
+            Course.objects.bulk_update(fixed, ['active_enrollment_count'], batch_size=options['batch_size'])
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(fixed)} course(s) with drifted enrollment counts.'))
@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-18 10:29
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_active_enrollment_count(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    active = (
+        Enrollment.objects
+        .filter(course=OuterRef('pk'), status='active')
+        .order_by()
+        .values('course')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Course.objects.update(
+        active_enrollment_count=Coalesce(Subquery(active, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='active_enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Active enrollments, maintained by signals (see reconcile_enrollment_counts)'),
+        ),
+        migrations.RunPython(populate_active_enrollment_count, migrations.RunPython.noop),
+    ]
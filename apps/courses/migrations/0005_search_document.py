@@ -0,0 +1,125 @@
+# Generated by Django 5.0 on 2026-10-18 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# 'simple' configuration: no stemming, but no English-only stop words either
+# for Sinhala and Tamil text. Weights: title A, subject/teacher B, body C.
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE courses_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(keywords, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(body, '')), 'C')
+    ) STORED
+    """,
+    'CREATE INDEX courses_searchdocument_vector ON courses_searchdocument USING gin (search_vector)',
+]
+POSTGRESQL_REVERSE = [
+    'DROP INDEX IF EXISTS courses_searchdocument_vector',
+    'ALTER TABLE courses_searchdocument DROP COLUMN IF EXISTS search_vector',
+]
+
+# External-content FTS5 table; M* keeps Sinhala/Tamil vowel signs inside
+# words, and the prefix indexes serve the type-ahead prefix of the last term
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE courses_searchdocument_fts USING fts5(
+        title, keywords, body, content='courses_searchdocument', content_rowid='id', prefix='2 3',
+        tokenize="unicode61 remove_diacritics 2 categories 'L* N* Co M*'"
+    )
+    """,
+    """
+    CREATE TRIGGER courses_searchdocument_ai AFTER INSERT ON courses_searchdocument BEGIN
+        INSERT INTO courses_searchdocument_fts(rowid, title, keywords, body)
+        VALUES (new.id, new.title, new.keywords, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_searchdocument_ad AFTER DELETE ON courses_searchdocument BEGIN
+        INSERT INTO courses_searchdocument_fts(courses_searchdocument_fts, rowid, title, keywords, body)
+        VALUES ('delete', old.id, old.title, old.keywords, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_searchdocument_au AFTER UPDATE ON courses_searchdocument BEGIN
+        INSERT INTO courses_searchdocument_fts(courses_searchdocument_fts, rowid, title, keywords, body)
+        VALUES ('delete', old.id, old.title, old.keywords, old.body);
+        INSERT INTO courses_searchdocument_fts(rowid, title, keywords, body)
+        VALUES (new.id, new.title, new.keywords, new.body);
+    END
+    """,
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS courses_searchdocument_au',
+    'DROP TRIGGER IF EXISTS courses_searchdocument_ad',
+    'DROP TRIGGER IF EXISTS courses_searchdocument_ai',
+    'DROP TABLE IF EXISTS courses_searchdocument_fts',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+create_fulltext_index = _run({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD})
+drop_fulltext_index = _run({'postgresql': POSTGRESQL_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+def index_existing_content(apps, schema_editor):
+    """Write the documents of the courses and lessons that already exist (as rebuild_search_index does)"""
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    SearchDocument = apps.get_model('courses', 'SearchDocument')
+    documents = [
+        SearchDocument(
+            kind='course', object_id=course.pk, course_id=course.pk, published=course.status == 'published',
+            title=course.title,
+            keywords=f'{course.subject} {course.teacher.user.first_name} {course.teacher.user.last_name}',
+            body=f'{course.description}\n{course.syllabus}',
+        )
+        for course in Course.objects.select_related('teacher__user').iterator(chunk_size=1000)
+    ]
+    documents += [
+        SearchDocument(
+            kind='lesson', object_id=lesson.pk, course_id=lesson.module.course_id,
+            published=lesson.module.course.status == 'published', title=lesson.title,
+            keywords=f'{lesson.module.course.title} {lesson.module.title}', body=lesson.article_content,
+        )
+        for lesson in Lesson.objects.select_related('module__course').iterator(chunk_size=1000)
+    ]
+    SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_course_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Course'), ('lesson', 'Lesson')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('published', models.BooleanField(default=False)),
+                ('title', models.CharField(max_length=200)),
+                ('keywords', models.TextField(blank=True, help_text='Subject and teacher, or the course of a lesson')),
+                ('body', models.TextField(blank=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+            ],
+            options={
+                'verbose_name': 'Search Document',
+                'verbose_name_plural': 'Search Documents',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        # Other databases fall back to icontains (see apps.courses.search)
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(index_existing_content, migrations.RunPython.noop),
+    ]
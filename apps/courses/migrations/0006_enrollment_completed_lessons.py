@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-18 11:05
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_completed_lessons(apps, schema_editor):
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    completed = (
+        LessonProgress.objects
+        .filter(enrollment=OuterRef('pk'), status='completed', lesson__module__course=OuterRef('course'))
+        .order_by()
+        .values('enrollment')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Enrollment.objects.update(
+        completed_lessons=Coalesce(Subquery(completed, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Completed lessons, maintained by apps.courses.completion (see reconcile_completion)'),
+        ),
+        migrations.RunPython(populate_completed_lessons, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,6 @@
-from django.db import models
-from django.utils.text import slugify
+from django.db import IntegrityError, models, transaction
 from apps.users.models import Teacher, Student
+from .slugs import SLUG_SAVE_ATTEMPTS, unique_course_slug
 
 
 class Course(models.Model):
@@ -40,6 +40,11 @@ class Course(models.Model):
     prerequisites = models.TextField(blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     enrollment_limit = models.IntegerField(null=True, blank=True, help_text="Maximum students (leave blank for unlimited)")
+    active_enrollment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Active enrollments, maintained by signals (see reconcile_enrollment_counts)"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -48,31 +53,50 @@ class Course(models.Model):
         verbose_name = 'Course'
         verbose_name_plural = 'Courses'
         ordering = ['-created_at']
+        # Catalog queries (apps.courses.catalog) always filter on status='published'
+        indexes = [
+            models.Index(
+                fields=['status', 'grade_level', 'subject', 'language', 'course_type'], name='course_catalog_facets'
+            ),
+            models.Index(fields=['status', 'subject'], name='course_catalog_subject'),
+            models.Index(fields=['status', '-created_at', '-id'], name='course_catalog_newest'),
+            models.Index(fields=['status', 'price', 'id'], name='course_catalog_price'),
+        ]
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.title)
-            # Ensure uniqueness
-            original_slug = self.slug
-            counter = 1
-            while Course.objects.filter(slug=self.slug).exists():
-                self.slug = f"{original_slug}-{counter}"
-                counter += 1
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        # Ensure uniqueness; retry if a concurrent save claims the same slug
+        original_slug = self.slug
+        for attempt in range(SLUG_SAVE_ATTEMPTS):
+            self.slug = unique_course_slug(self.title, exclude_pk=self.pk)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except Exception as exc:
+                retry = (
+                    isinstance(exc, IntegrityError) and attempt < SLUG_SAVE_ATTEMPTS - 1
+                    and Course.objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                )
+                # A caller that catches the error and saves again starts from what it had
+                self.slug = original_slug
+                if not retry:
+                    raise
 
     @property
     def enrollment_count(self):
         """Return number of enrolled students"""
-        return self.enrollments.filter(status='active').count()
+        return self.active_enrollment_count
 
     @property
     def is_full(self):
         """Check if course has reached enrollment limit"""
         if self.enrollment_limit:
-            return self.enrollment_count >= self.enrollment_limit
+            return self.active_enrollment_count >= self.enrollment_limit
         return False
 
 
@@ -146,6 +170,11 @@ class Enrollment(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='unpaid')
     completion_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
+    completed_lessons = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Completed lessons, maintained by apps.courses.completion (see reconcile_completion)"
+    )
     grade = models.CharField(max_length=5, blank=True, help_text="Final grade (A, B, C, etc.)")
 
     class Meta:
@@ -157,6 +186,12 @@ class Enrollment(models.Model):
     def __str__(self):
         return f"{self.student.user.get_full_name()} enrolled in {self.course.title}"
 
+    def save(self, *args, **kwargs):
+        # apps.courses.signals reads the stored status under a row lock to
+        # adjust Course.active_enrollment_count; the lock lasts until commit
+        with transaction.atomic():
+            return super().save(*args, **kwargs)
+
 
 class LessonProgress(models.Model):
     """Track student progress for each lesson"""
@@ -181,3 +216,33 @@ class LessonProgress(models.Model):
 
     def __str__(self):
         return f"{self.enrollment.student.user.get_full_name()} - {self.lesson.title}: {self.status}"
+
+
+class SearchDocument(models.Model):
+    """Searchable text of a course or lesson, maintained by apps.courses.search
+
+    The full-text index over it is database specific and created by its
+    migration: a weighted tsvector column with a GIN index on PostgreSQL, an
+    FTS5 table kept in step by triggers on SQLite.
+    """
+
+    KIND_CHOICES = [
+        ('course', 'Course'),
+        ('lesson', 'Lesson'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    published = models.BooleanField(default=False)
+    title = models.CharField(max_length=200)
+    keywords = models.TextField(blank=True, help_text="Subject and teacher, or the course of a lesson")
+    body = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Search Document'
+        verbose_name_plural = 'Search Documents'
+        unique_together = ['kind', 'object_id']
+
+    def __str__(self):
+        return f"{self.kind}: {self.title}"
@@ -0,0 +1,305 @@
+"""
+Coalesced ingestion of video-player heartbeats into ``LessonProgress``.
+
+Players report watch time every ~15 seconds. Instead of one UPDATE per
+heartbeat, each process adds the seconds to an in-memory entry per
+(enrollment, lesson) and a background thread writes all entries every
+``LESSON_PROGRESS_FLUSH_SECONDS``: one ``INSERT ... ON CONFLICT DO NOTHING``
+for rows seen for the first time, one SELECT for their ids, and UPDATEs
+that add the minutes with ``F()`` (so concurrent processes never overwrite
+each other's time), one per distinct (minutes, access second) rather than
+one per row.
+
+``time_spent_minutes`` only takes whole minutes; the seconds left over stay
+in the entry for the next flush. An entry that has had no heartbeat for
+``LESSON_PROGRESS_IDLE_SECONDS`` is written one last time (leftover
+rounded to the nearest minute) and dropped.
+
+Status only moves forward: a flush turns ``not_started`` into
+``in_progress`` and never touches ``completed``. Completing a lesson is not
+buffered: ``complete_lesson`` writes it at once, together with any time
+still pending for that lesson.
+
+Worst-case loss on a hard crash is one flush interval of watch time per
+process, plus leftover seconds under a minute per entry. A flush that
+fails puts its seconds back into the buffer for the next one (as far as
+``LESSON_PROGRESS_BUFFER_SIZE`` allows). Everything is
+written out like idle entries when the buffer holds
+``LESSON_PROGRESS_BUFFER_SIZE`` of them (by the request that fills it) and
+at worker shutdown (gunicorn ``worker_exit`` hook and ``atexit``).
+"""
+import atexit
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .completion import shift_completed_lessons
+from .models import Enrollment, LessonProgress
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 500
+ACCESS_CACHE_SECONDS = 300
+# The most a single heartbeat may add, whatever the client reports
+MAX_HEARTBEAT_SECONDS = 120
+
+
+@dataclass
+class PendingProgress:
+    seconds: float = 0.0
+    last_accessed_at: object = None  # time of the newest heartbeat
+    touched: bool = False  # heartbeats arrived since the last flush
+    seen_at: float = 0.0  # monotonic time of the newest heartbeat
+
+
+def _whole_minutes(entries, final=False):
+    """Minutes to write per key; leaves the leftover seconds in each entry"""
+    minutes = {}
+    for key, entry in entries.items():
+        whole = int((entry.seconds + (30 if final else 0)) // 60)
+        entry.seconds = 0.0 if final else entry.seconds - whole * 60
+        minutes[key] = whole
+    return minutes
+
+
+def write_progress(entries, final=False):
+    """Add pending time to ``LessonProgress`` rows, creating them if needed; returns rows written"""
+    minutes = _whole_minutes(entries, final)
+    keys = [key for key, entry in entries.items() if entry.touched or minutes[key]]
+    written = 0
+    for start in range(0, len(keys), FLUSH_BATCH_SIZE):
+        batch = keys[start:start + FLUSH_BATCH_SIZE]
+        with transaction.atomic():
+            LessonProgress.objects.bulk_create(
+                [LessonProgress(enrollment_id=enrollment_id, lesson_id=lesson_id, status='in_progress')
+                 for enrollment_id, lesson_id in batch],
+                ignore_conflicts=True,
+            )
+            rows = LessonProgress.objects.filter(
+                enrollment_id__in={enrollment_id for enrollment_id, _ in batch},
+                lesson_id__in={lesson_id for _, lesson_id in batch},
+            ).values_list('pk', 'enrollment_id', 'lesson_id')
+            ids = {(enrollment_id, lesson_id): pk for pk, enrollment_id, lesson_id in rows}
+            # Rows adding the same minutes with the same access time (to the second) share
+            # one UPDATE ... WHERE id IN (...)
+            groups = defaultdict(list)
+            for key in batch:
+                if key in ids:  # otherwise the enrollment or lesson was deleted meanwhile
+                    accessed_at = entries[key].last_accessed_at.replace(microsecond=0)
+                    groups[(minutes[key], accessed_at)].append(ids[key])
+            for (added, accessed_at), pks in groups.items():
+                LessonProgress.objects.filter(pk__in=pks).update(
+                    time_spent_minutes=F('time_spent_minutes') + added,
+                    last_accessed_at=accessed_at,
+                    status=Case(When(status='not_started', then=Value('in_progress')), default=F('status')),
+                )
+                written += len(pks)
+    for entry in entries.values():
+        entry.touched = False
+    return written
+
+
+class ProgressBuffer:
+    """Per-process map of (enrollment_id, lesson_id) to pending watch time, with a flusher thread"""
+
+    def __init__(self, max_size=20_000, flush_interval=30.0, idle_after=300.0):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.idle_after = idle_after
+        self.flushed = 0
+        self.failed = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Started lazily, and restarted after a fork (threads do not survive it)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='lesson-progress-flusher', daemon=True)
+            self._thread.start()
+
+    def add(self, enrollment_id, lesson_id, seconds, at=None):
+        """Count ``seconds`` of watch time; flushes in the caller if the buffer is full"""
+        self._ensure_thread()
+        seconds = float(seconds)
+        # NaN would survive the clamp below and poison the entry's total
+        seconds = min(max(seconds, 0.0), MAX_HEARTBEAT_SECONDS) if math.isfinite(seconds) else 0.0
+        with self._lock:
+            full = len(self._entries) >= self.max_size and (enrollment_id, lesson_id) not in self._entries
+        if full:
+            # Backpressure: this request writes out everything rather than grow without bound
+            self.flush(final=True)
+        with self._lock:
+            entry = self._entries.setdefault((enrollment_id, lesson_id), PendingProgress())
+            entry.seconds += seconds
+            entry.last_accessed_at = at or timezone.now()
+            entry.touched = True
+            entry.seen_at = time.monotonic()
+
+    def take(self, enrollment_id, lesson_id):
+        """Remove and return the pending entry for one lesson, or None"""
+        with self._lock:
+            return self._entries.pop((enrollment_id, lesson_id), None)
+
+    def flush(self, final=False):
+        """Write pending time now; returns how many rows were written"""
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._lock:
+                if final:
+                    idle, self._entries = self._entries, {}
+                    active = {}
+                else:
+                    idle = {k: e for k, e in self._entries.items() if now - e.seen_at >= self.idle_after}
+                    for key in idle:
+                        del self._entries[key]
+                    # Heartbeats keep landing in these entries while they are written;
+                    # the snapshot carries the seconds to write and is merged back after
+                    active = {}
+                    for key, entry in self._entries.items():
+                        if entry.touched or entry.seconds >= 60:
+                            active[key] = PendingProgress(
+                                entry.seconds, entry.last_accessed_at, entry.touched, entry.seen_at
+                            )
+                            entry.seconds, entry.touched = 0.0, False
+            written = 0
+            for entries, is_final in ((active, False), (idle, True)):
+                if not entries:
+                    continue
+                # write_progress takes the minutes out of the entries; a failed write puts them back
+                pending = {key: entry.seconds for key, entry in entries.items()}
+                try:
+                    written += write_progress(entries, final=is_final)
+                except Exception:
+                    dropped = self._requeue(entries, pending)
+                    self.failed += dropped
+                    logger.exception('Failed to flush progress for %d lessons (%d dropped, the rest kept)',
+                                     len(entries), dropped)
+                    continue
+                if not is_final:
+                    with self._lock:
+                        for key, snapshot in entries.items():
+                            if key in self._entries:
+                                self._entries[key].seconds += snapshot.seconds
+            self.flushed += written
+            return written
+
+    def _requeue(self, entries, pending):
+        """Put the seconds of a failed write back; returns how many entries did not fit"""
+        dropped = 0
+        with self._lock:
+            for key, snapshot in entries.items():
+                entry = self._entries.get(key)
+                if entry is None:
+                    if len(self._entries) >= self.max_size:
+                        dropped += 1
+                        continue
+                    entry = self._entries[key] = PendingProgress(
+                        last_accessed_at=snapshot.last_accessed_at, seen_at=snapshot.seen_at
+                    )
+                entry.seconds += pending[key]
+                entry.touched = True
+        return dropped
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            close_old_connections()
+            self.flush()
+        connection.close()
+
+    def shutdown(self):
+        """Stop the flusher thread and write everything still pending"""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self._thread = None
+        return self.flush(final=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_progress_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ProgressBuffer(
+                    max_size=getattr(settings, 'LESSON_PROGRESS_BUFFER_SIZE', 20_000),
+                    flush_interval=getattr(settings, 'LESSON_PROGRESS_FLUSH_SECONDS', 30.0),
+                    idle_after=getattr(settings, 'LESSON_PROGRESS_IDLE_SECONDS', 300.0),
+                )
+    return _buffer
+
+
+def enrollment_for_lesson(student_id, lesson_id):
+    """Id of the student's active or completed enrollment in the lesson's course, or None
+
+    Cached for a few minutes: every heartbeat asks, and the answer rarely changes.
+    """
+    key = f'courses:lesson-access:{student_id}:{lesson_id}'
+    enrollment_id = cache.get(key)
+    if enrollment_id is None:
+        enrollment_id = Enrollment.objects.filter(
+            student_id=student_id, course__modules__lessons=lesson_id, status__in=('active', 'completed'),
+        ).values_list('pk', flat=True).first() or 0
+        cache.set(key, enrollment_id, timeout=ACCESS_CACHE_SECONDS)
+    return enrollment_id or None
+
+
+def record_heartbeat(enrollment_id, lesson_id, seconds, at=None):
+    get_progress_buffer().add(enrollment_id, lesson_id, seconds, at)
+
+
+def complete_lesson(enrollment_id, lesson_id, at=None):
+    """Mark a lesson completed now, with its pending time; True if it was not completed before"""
+    at = at or timezone.now()
+    pending = get_progress_buffer().take(enrollment_id, lesson_id)
+    minutes = int(((pending.seconds if pending else 0) + 30) // 60)
+    with transaction.atomic():
+        progress, _ = LessonProgress.objects.get_or_create(enrollment_id=enrollment_id, lesson_id=lesson_id)
+        flipped = LessonProgress.objects.filter(pk=progress.pk).exclude(status='completed').update(
+            status='completed', completed_at=Coalesce(F('completed_at'), Value(at)),
+        )
+        LessonProgress.objects.filter(pk=progress.pk).update(
+            time_spent_minutes=F('time_spent_minutes') + minutes, last_accessed_at=at,
+        )
+        if flipped:
+            shift_completed_lessons(enrollment_id, 1)
+    return bool(flipped)
+
+
+def shutdown_progress_buffer():
+    """Write pending progress; called from gunicorn's worker_exit hook and atexit"""
+    if _buffer is not None:
+        written = _buffer.shutdown()
+        if written:
+            logger.info('Flushed progress for %d lessons at shutdown', written)
+
+
+atexit.register(shutdown_progress_buffer)
@@ -0,0 +1,190 @@
+"""
+Ranked full-text search over courses and lessons.
+
+Every course and lesson has a ``SearchDocument`` row (title; subject and
+teacher name, or the lesson's course; description and syllabus, or the
+article text). Signals upsert the rows as courses, modules, lessons and
+teacher names change; migration 0005 wrote them for the content that
+existed before, and ``rebuild_search_index`` recreates them after bulk
+imports. The full-text index over the rows is the database's own:
+
+* PostgreSQL: a generated, weighted ``tsvector`` column with a GIN index,
+  ranked with ``ts_rank_cd``;
+* SQLite: an FTS5 table kept in step by triggers, ranked with ``bm25``;
+* anything else: ``icontains``, unranked beyond title matches first.
+
+Only documents of published courses are returned. The last search term
+matches as a prefix once it has two characters, so results come up while
+the user is still typing.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Course, Lesson, SearchDocument
+
+MAX_TERMS = 8
+# A shorter last term only matches whole words: "a*" would match nearly everything
+MIN_PREFIX_LENGTH = 2
+INDEX_BATCH_SIZE = 1000
+# Relative weight of title, keywords and body matches for bm25 on SQLite
+SQLITE_WEIGHTS = (10.0, 4.0, 1.0)
+# Whitespace and the ASCII punctuation both query syntaxes give meaning to
+TERM_SEPARATORS = re.compile(r'[\s!"#$%&\'()*+,\-./:;<=>?@\[\\\]^`{|}~]+')
+
+
+def search_terms(query):
+    return [term for term in TERM_SEPARATORS.split(query.lower()) if term][:MAX_TERMS]
+
+
+def _is_prefix(terms):
+    return len(terms[-1]) >= MIN_PREFIX_LENGTH
+
+
+def course_documents(courses):
+    for course in courses:
+        yield SearchDocument(
+            kind='course', object_id=course.pk, course_id=course.pk, published=course.status == 'published',
+            title=course.title,
+            keywords=f'{course.subject} {course.teacher.user.first_name} {course.teacher.user.last_name}',
+            body=f'{course.description}\n{course.syllabus}',
+        )
+
+
+def lesson_documents(lessons):
+    for lesson in lessons:
+        course = lesson.module.course
+        yield SearchDocument(
+            kind='lesson', object_id=lesson.pk, course_id=course.pk, published=course.status == 'published',
+            title=lesson.title, keywords=f'{course.title} {lesson.module.title}', body=lesson.article_content,
+        )
+
+
+def _upsert(documents):
+    SearchDocument.objects.bulk_create(
+        documents, batch_size=INDEX_BATCH_SIZE, update_conflicts=True, unique_fields=['kind', 'object_id'],
+        update_fields=['course_id', 'published', 'title', 'keywords', 'body'],
+    )
+
+
+def _courses(condition):
+    return Course.objects.filter(condition).select_related('teacher__user')
+
+
+def _lessons(condition):
+    return Lesson.objects.filter(condition).select_related('module__course')
+
+
+def index_courses(course_ids):
+    """Refresh the documents of these courses and of their lessons (which carry the course title)"""
+    _upsert(list(course_documents(_courses(Q(pk__in=course_ids)))))
+    _upsert(list(lesson_documents(_lessons(Q(module__course_id__in=course_ids)))))
+
+
+def index_lessons(condition):
+    """Refresh the documents of the lessons matching ``condition``"""
+    _upsert(list(lesson_documents(_lessons(condition))))
+
+
+def remove_documents(kind, object_ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=object_ids).delete()
+
+
+def rebuild_search_index():
+    """Recreate every document; returns how many were written"""
+    SearchDocument.objects.all().delete()
+    written = 0
+    for documents in (course_documents(_courses(Q())), lesson_documents(_lessons(Q()))):
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) == INDEX_BATCH_SIZE:
+                written += len(SearchDocument.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            written += len(SearchDocument.objects.bulk_create(batch))
+    return written
+
+
+def _search_postgresql(terms, kinds, limit, published_only):
+    query = ' & '.join(f"'{term}'" for term in terms) + (':*' if _is_prefix(terms) else '')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT d.kind, d.object_id, d.course_id, d.title, ts_rank_cd(d.search_vector, q) AS rank
+            FROM courses_searchdocument d, to_tsquery('simple', %s) q
+            WHERE d.search_vector @@ q AND d.kind = ANY(%s) {'AND d.published' if published_only else ''}
+            ORDER BY rank DESC, d.id
+            LIMIT %s
+            """,
+            [query, list(kinds), limit],  # LIMIT NULL: no limit
+        )
+        return cursor.fetchall()
+
+
+def _search_sqlite(terms, kinds, limit, published_only):
+    query = ' '.join(f'"{term}"' for term in terms) + ('*' if _is_prefix(terms) else '')
+    weights = ', '.join(map(str, SQLITE_WEIGHTS))
+    with connection.cursor() as cursor:
+        # bm25() is lower for better matches
+        cursor.execute(
+            f"""
+            SELECT d.kind, d.object_id, d.course_id, d.title,
+                -bm25(courses_searchdocument_fts, {weights}) AS rank
+            FROM courses_searchdocument_fts
+            JOIN courses_searchdocument d ON d.id = courses_searchdocument_fts.rowid
+            WHERE courses_searchdocument_fts MATCH %s
+                AND d.kind IN ({', '.join(['%s'] * len(kinds))}) {'AND d.published' if published_only else ''}
+            ORDER BY rank DESC
+            LIMIT %s
+            """,
+            [query, *kinds, -1 if limit is None else limit],  # LIMIT -1: no limit
+        )
+        return cursor.fetchall()
+
+
+def _search_fallback(terms, kinds, limit, published_only):
+    documents = SearchDocument.objects.filter(kind__in=kinds)
+    if published_only:
+        documents = documents.filter(published=True)
+    terms_in_title = Q()
+    for term in terms:
+        documents = documents.filter(
+            Q(title__icontains=term) | Q(keywords__icontains=term) | Q(body__icontains=term)
+        )
+        terms_in_title &= Q(title__icontains=term)
+    rows = documents.values_list('kind', 'object_id', 'course_id', 'title')
+    found = list(rows.filter(terms_in_title).order_by('pk')[:limit])
+    if limit is None:
+        found += rows.exclude(terms_in_title).order_by('pk')
+    elif len(found) < limit:
+        found += rows.exclude(terms_in_title).order_by('pk')[:limit - len(found)]
+    return [(*row, 0.0) for row in found]
+
+
+SEARCH_BACKENDS = {
+    'postgresql': _search_postgresql,
+    'sqlite': _search_sqlite,
+}
+
+
+def _matches(query, kinds, limit, published_only):
+    terms = search_terms(query)
+    if not terms or not kinds:
+        return []
+    run = SEARCH_BACKENDS.get(connection.vendor, _search_fallback)
+    return run(terms, tuple(kinds), limit, published_only)
+
+
+def search(query, kinds=('course', 'lesson'), limit=20):
+    """Best matches for ``query`` among published courses and their lessons, best first"""
+    return [
+        {'kind': kind, 'id': object_id, 'course_id': course_id, 'title': title, 'rank': round(rank, 4)}
+        for kind, object_id, course_id, title, rank in _matches(query, kinds, limit, published_only=True)
+    ]
+
+
+def search_course_ids(query, limit=None):
+    """Ids of courses of any status matching ``query``, best first (for the admin; all of them by default)"""
+    return [row[1] for row in _matches(query, ('course',), limit, published_only=False)]
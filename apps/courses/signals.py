@@ -0,0 +1,208 @@
+from django.db.models import F, Q, QuerySet
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.users.models import User
+
+from .catalog import bump_catalog_version
+from .completion import recompute_course_completion, shift_completed_lessons
+from .curriculum import bump_curriculum_version
+from .models import Course, CourseModule, Enrollment, Lesson, LessonProgress
+from .search import index_courses, index_lessons, remove_documents
+
+
+def _adjust_active_count(course_id, delta):
+    """Atomically shift a course's denormalized active enrollment count (never below 0)"""
+    if course_id and delta:
+        Course.objects.filter(pk=course_id).update(
+            active_enrollment_count=Greatest(F('active_enrollment_count') + delta, 0)
+        )
+
+
+def _lock_stored_state(instance):
+    """The stored (status, course_id) of an enrollment, locked until commit; (None, None) if it is gone
+
+    The count is adjusted from what is in the table, not from what the
+    instance was loaded with: two saves of one enrollment loaded at the
+    same time wait for each other here and the second sees the first's
+    status, so a change is counted once.
+    """
+    stored = Enrollment.objects.select_for_update().filter(pk=instance.pk).values_list('status', 'course_id').first()
+    return stored or (None, None)
+
+
+@receiver(pre_save, sender=Enrollment)
+def load_enrollment_state(sender, instance, raw=False, **kwargs):
+    """Read the stored state within Enrollment.save's transaction"""
+    if raw:
+        return
+    if instance._state.adding:
+        instance._counted_active, instance._counted_course_id = False, None
+    else:
+        status, instance._counted_course_id = _lock_stored_state(instance)
+        instance._counted_active = status == 'active'
+
+
+@receiver(post_save, sender=Enrollment)
+def update_active_enrollment_count(sender, instance, created, raw=False, **kwargs):
+    """Keep Course.active_enrollment_count in step with enrollment status changes"""
+    if raw:
+        return
+    was_active = instance._counted_active and not created
+    is_active = instance.status == 'active'
+
+    if was_active and instance._counted_course_id != instance.course_id:
+        # Moved to another course
+        _adjust_active_count(instance._counted_course_id, -1)
+        was_active = False
+    _adjust_active_count(instance.course_id, int(is_active) - int(was_active))
+
+
+@receiver(pre_delete, sender=Enrollment)
+def load_deleted_enrollment_state(sender, instance, origin=None, **kwargs):
+    """Lock the row being deleted (deletion runs in a transaction) and note whether it counted"""
+    # A deleted course takes its count with it
+    instance._counted_active = False
+    if not isinstance(origin, Course):
+        status, instance._counted_course_id = _lock_stored_state(instance)
+        instance._counted_active = status == 'active'
+
+
+@receiver(post_delete, sender=Enrollment)
+def release_active_enrollment(sender, instance, **kwargs):
+    """Decrement the count when an active enrollment is deleted"""
+    if instance._counted_active:
+        _adjust_active_count(instance._counted_course_id, -1)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_catalog(sender, raw=False, **kwargs):
+    """Cached catalog pages and facet counts are stale once any course changes"""
+    if not raw:
+        bump_catalog_version()
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, raw=False, **kwargs):
+    """Refresh the course's search document and its lessons' (title and status are copied to them)"""
+    if not raw:
+        index_courses([instance.pk])
+
+
+@receiver(post_save, sender=CourseModule)
+def index_module_lessons(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_lessons(Q(module=instance))
+
+
+@receiver(post_save, sender=Lesson)
+def index_lesson(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_lessons(Q(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Lesson)
+def unindex_lesson(sender, instance, **kwargs):
+    # Course documents go with the course through their foreign key
+    remove_documents('lesson', [instance.pk])
+
+
+@receiver(post_save, sender=User)
+def index_teacher_courses(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Teacher names are part of their courses' search documents"""
+    if raw or not instance.is_teacher:
+        return
+    if update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        return  # e.g. the last_login update on every sign-in
+    course_ids = list(Course.objects.filter(teacher__user=instance).values_list('pk', flat=True))
+    if course_ids:
+        index_courses(course_ids)
+
+
+@receiver(post_init, sender=LessonProgress)
+def remember_progress_state(sender, instance, **kwargs):
+    instance._counted_completed = instance.pk is not None and instance.__dict__.get('status') == 'completed'
+
+
+@receiver(post_save, sender=LessonProgress)
+def count_completed_lesson(sender, instance, created, raw=False, **kwargs):
+    """Shift Enrollment.completed_lessons when a lesson becomes or stops being completed"""
+    if raw:
+        return
+    is_completed = instance.status == 'completed'
+    shift_completed_lessons(instance.enrollment_id, int(is_completed) - int(instance._counted_completed))
+    instance._counted_completed = is_completed
+
+
+@receiver(post_delete, sender=LessonProgress)
+def uncount_completed_lesson(sender, instance, origin=None, **kwargs):
+    # Cascades from a lesson or module recompute the whole course; from an
+    # enrollment, course or student there is nothing left to update
+    if instance._counted_completed and isinstance(origin, (LessonProgress, QuerySet)) and (
+        not isinstance(origin, QuerySet) or origin.model is LessonProgress
+    ):
+        shift_completed_lessons(instance.enrollment_id, -1)
+
+
+@receiver(post_init, sender=Lesson)
+def remember_lesson_module(sender, instance, **kwargs):
+    instance._counted_module_id = instance.__dict__.get('module_id')
+
+
+@receiver(post_init, sender=CourseModule)
+def remember_module_course(sender, instance, **kwargs):
+    instance._counted_course_id = instance.__dict__.get('course_id')
+
+
+def _recompute_courses(course_ids):
+    for course_id in set(course_ids) - {None}:
+        recompute_course_completion(course_id)
+
+
+def _course_ids_of_modules(module_ids):
+    return set(CourseModule.objects.filter(pk__in=set(module_ids) - {None}).values_list('course_id', flat=True))
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, created, raw=False, **kwargs):
+    """Any saved lesson changes its course's curriculum; a new or moved one also its lesson count"""
+    if raw:
+        return
+    moved = instance._counted_module_id != instance.module_id
+    course_ids = _course_ids_of_modules([instance.module_id, instance._counted_module_id])
+    bump_curriculum_version(*course_ids)
+    if created or moved:
+        # The lesson count changes, and so every enrollment's percentage
+        _recompute_courses(course_ids)
+    instance._counted_module_id = instance.module_id
+
+
+@receiver(post_save, sender=CourseModule)
+def module_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        bump_curriculum_version(instance.course_id, instance._counted_course_id)
+        if not created and instance._counted_course_id != instance.course_id:
+            _recompute_courses([instance.course_id, instance._counted_course_id])
+    instance._counted_course_id = instance.course_id
+
+
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=CourseModule)
+def recount_lessons_on_delete(sender, instance, origin=None, **kwargs):
+    # Lessons deleted along with their module are covered by the module's recount
+    if isinstance(origin, Course) or (sender is Lesson and isinstance(origin, CourseModule)):
+        return
+    course_id = instance.course_id if sender is CourseModule else (
+        CourseModule.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    )
+    bump_curriculum_version(course_id)
+    _recompute_courses([course_id])
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_curriculum(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_curriculum_version(instance.pk)
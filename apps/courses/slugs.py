@@ -0,0 +1,65 @@
+"""
+Unique slug allocation for courses.
+
+Instead of probing ``slug``, ``slug-1``, ``slug-2`` ... one query at a time,
+all slugs sharing a base are fetched in a single query and the first free
+suffix is computed in Python. Several bases can be resolved in that same
+single query, which is what ``assign_course_slugs`` uses for bulk imports.
+"""
+from django.db.models import Q
+from django.utils.text import slugify
+
+# How many times Course.save re-allocates after losing a race on the unique index
+SLUG_SAVE_ATTEMPTS = 5
+
+
+def _taken_slugs(bases, exclude_pk=None):
+    """Slugs already in use that a course with one of these bases could collide with"""
+    from .models import Course
+
+    bases = set(bases)
+    if not bases:
+        return set()
+
+    condition = Q(slug__in=bases)
+    for base in bases:
+        condition |= Q(slug__startswith=f'{base}-')
+    existing = Course.objects.filter(condition)
+    if exclude_pk is not None:
+        existing = existing.exclude(pk=exclude_pk)
+    return set(existing.values_list('slug', flat=True))
+
+
+def _first_free(base, taken):
+    """Return the first slug for a base that is not in ``taken``, adding it there"""
+    slug, counter = base, 0
+    while slug in taken:
+        counter += 1
+        slug = f'{base}-{counter}'
+    taken.add(slug)
+    return slug
+
+
+def unique_course_slug(title, exclude_pk=None):
+    """Return a free slug for a course title using one query"""
+    base = slugify(title)
+    return _first_free(base, _taken_slugs([base], exclude_pk))
+
+
+def assign_course_slugs(courses):
+    """
+    Fill in missing slugs before ``Course.objects.bulk_create``.
+
+    ``bulk_create`` bypasses ``Course.save``, so imports should call this
+    first. All bases are resolved in one query, and one set of taken slugs
+    covers the whole batch: "Maths" becoming "maths-1" keeps "Maths 1" off
+    that slug as well.
+    """
+    pending = [course for course in courses if not course.slug]
+    bases = [slugify(course.title) for course in pending]
+    taken = _taken_slugs(bases)
+    # Slugs set explicitly within the batch are taken as well
+    taken.update(course.slug for course in courses if course.slug)
+    for course, base in zip(pending, bases):
+        course.slug = _first_free(base, taken)
+    return courses
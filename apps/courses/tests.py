@@ -1,3 +1,534 @@
-from django.test import TestCase
+import base64
+import tempfile
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, OperationalError
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+
+from apps.core.testing import MEMORY_CACHES
+from apps.users.models import Student, Teacher, User
+
+from .catalog import CatalogQuery, catalog_facets, catalog_page
+from .completion import completion_drift, recompute_course_completion
+from .curriculum import course_curriculum
+from .models import Course, CourseModule, Enrollment, Lesson, LessonProgress, SearchDocument
+from .progress import ProgressBuffer, complete_lesson
+from .search import search, search_course_ids
+from .slugs import assign_course_slugs, unique_course_slug
+
+
+@override_settings(CACHES=MEMORY_CACHES)
+class CatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('catalog-teacher@example.com', 'x', role='teacher')
+        teacher = Teacher.objects.create(user=user, qualifications='-')
+        self.courses = Course.objects.bulk_create(assign_course_slugs([
+            Course(title=f'Course {n}', description='-', teacher=teacher, status='published',
+                   grade_level=grade, subject=subject, language=language, price=n * 100)
+            for n, (grade, subject, language) in enumerate([
+                ('grade_10', 'Maths', 'english'),
+                ('grade_10', 'Science', 'sinhala'),
+                ('grade_11', 'Maths', 'english'),
+                ('grade_11', 'Maths', 'tamil'),
+                ('grade_12', 'Physics', 'english'),
+            ])
+        ]))
+        Course.objects.filter(pk=self.courses[4].pk).update(status='draft')
+
+    def query(self, params=''):
+        return CatalogQuery.from_params(QueryDict(params))
+
+    def test_facet_counts_ignore_their_own_selection(self):
+        with self.assertNumQueries(1):
+            facets = catalog_facets(self.query('subject=Maths&language=english'))
+
+        self.assertEqual(facets['grade_level'], [('grade_10', 1), ('grade_11', 1)])
+        self.assertEqual(facets['subject'], [('Maths', 2)])
+        self.assertEqual(facets['language'], [('english', 2), ('tamil', 1)])
+
+    def test_keyset_pages_cover_every_course_once(self):
+        for sort in ('newest', 'price_low', 'price_high'):
+            seen, after = [], ''
+            while True:
+                courses, after = catalog_page(self.query(f'sort={sort}&page_size=2&after={after}'))
+                seen.extend(course['price'] for course in courses)
+                if after is None:
+                    break
+            self.assertEqual(sorted(seen), [0, 100, 200, 300])
+            if sort != 'newest':
+                self.assertEqual(seen, sorted(seen, reverse=sort == 'price_high'))
+
+    def test_saving_a_course_invalidates_cached_results(self):
+        query = self.query('subject=Physics')
+        self.assertEqual(catalog_page(query), ([], None))
+
+        physics = self.courses[4]
+        physics.status = 'published'
+        physics.save()
+
+        self.assertEqual([course['pk'] for course in catalog_page(self.query('subject=Physics'))[0]], [physics.pk])
+
+    def test_invalid_params_are_rejected(self):
+        for params in ('language=klingon', 'sort=random', 'min_price=cheap', 'after=bogus'):
+            with self.assertRaises(ValueError):
+                self.query(params)
+
+    def test_non_finite_prices_are_rejected(self):
+        nan_cursor = base64.urlsafe_b64encode(b'["NaN", 1]').decode()
+        for params in ('min_price=NaN', 'max_price=sNaN', 'min_price=Infinity', 'max_price=-inf',
+                       f'sort=price_low&after={nan_cursor}'):
+            response = self.client.get(f'/courses/?{params}', secure=True)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class CourseSlugTests(TestCase):
+    def setUp(self):
+        self.teacher = Teacher.objects.create(
+            user=User.objects.create_user('slug-teacher@example.com', 'x', role='teacher'), qualifications='-',
+        )
+
+    def course(self, title, slug=''):
+        return Course(title=title, description='-', teacher=self.teacher, grade_level='grade_10',
+                      subject='Maths', slug=slug)
+
+    def test_bases_in_one_batch_do_not_collide(self):
+        Course.objects.bulk_create([self.course('Maths', slug='maths')])
+        with self.assertNumQueries(1):
+            courses = assign_course_slugs([
+                self.course('Maths'), self.course('Maths 1'), self.course('Maths'), self.course('Algebra', 'maths-3'),
+            ])
+        self.assertEqual([course.slug for course in courses], ['maths-1', 'maths-1-1', 'maths-2', 'maths-3'])
+        Course.objects.bulk_create(courses)
+
+    def test_save_takes_the_first_free_suffix(self):
+        Course.objects.bulk_create([self.course('Maths', slug='maths'), self.course('Maths', slug='maths-2')])
+        self.assertEqual(unique_course_slug('Maths'), 'maths-1')
+        course = self.course('Maths')
+        course.save()
+        self.assertEqual(course.slug, 'maths-1')
+        self.assertEqual(unique_course_slug('Maths', exclude_pk=course.pk), 'maths-1')
+
+    def test_a_save_that_keeps_losing_the_slug_leaves_it_as_it_was(self):
+        Course.objects.bulk_create([self.course('Maths', slug='maths')])
+        course = self.course('Maths', slug=None)
+        # Every attempt picks a slug that another save has just taken
+        with mock.patch('apps.courses.models.unique_course_slug', return_value='maths'), \
+                self.assertRaises(IntegrityError):
+            course.save()
+        self.assertIsNone(course.slug)
+        course.save()
+        self.assertEqual(course.slug, 'maths-1')
+
+
+class ActiveEnrollmentCountTests(TestCase):
+    def setUp(self):
+        teacher = Teacher.objects.create(
+            user=User.objects.create_user('count-teacher@example.com', 'x', role='teacher'), qualifications='-',
+        )
+        self.courses = [
+            Course.objects.create(title=f'Count {n}', description='-', teacher=teacher, grade_level='grade_10',
+                                  subject='Maths') for n in range(2)
+        ]
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f'count{n}@example.com', 'x', role='student'),
+                                   grade_level='grade_10') for n in range(2)
+        ]
+
+    def counts(self):
+        return [course.active_enrollment_count for course in Course.objects.order_by('pk')]
+
+    def test_status_changes_moves_and_deletes(self):
+        enrollment = Enrollment.objects.create(student=self.students[0], course=self.courses[0], status='active')
+        Enrollment.objects.create(student=self.students[1], course=self.courses[0], status='pending')
+        self.assertEqual(self.counts(), [1, 0])
+        enrollment.course = self.courses[1]
+        enrollment.save()
+        self.assertEqual(self.counts(), [0, 1])
+        # update() sends no signals; deleting the uncounted row must not take the count below 0
+        Enrollment.objects.filter(course=self.courses[0]).update(status='active')
+        Enrollment.objects.get(course=self.courses[0]).delete()
+        self.assertEqual(self.counts(), [0, 1])
+        self.students[0].delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_stale_copies_change_the_count_once(self):
+        enrollment = Enrollment.objects.create(student=self.students[0], course=self.courses[0], status='active')
+        first, second = Enrollment.objects.get(pk=enrollment.pk), Enrollment.objects.get(pk=enrollment.pk)
+        first.status = second.status = 'cancelled'
+        first.save()
+        second.save()
+        self.assertEqual(self.counts(), [0, 0])
+        first.status = second.status = 'active'
+        first.save()
+        second.save()
+        self.assertEqual(self.counts(), [1, 0])
+        first.delete()
+        second.delete()
+        self.assertEqual(self.counts(), [0, 0])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('search-teacher@example.com', 'x', role='teacher',
+                                             first_name='Kamala', last_name='Silva')
+        teacher = Teacher.objects.create(user=self.user, qualifications='-')
+        self.algebra = Course.objects.create(
+            title='Algebra foundations', description='Equations and graphs', subject='Mathematics',
+            teacher=teacher, grade_level='grade_10', status='published',
+        )
+        self.physics = Course.objects.create(
+            title='Mechanics', description='Motion, forces and some algebra', subject='Physics',
+            teacher=teacher, grade_level='grade_12', status='published',
+        )
+        module = CourseModule.objects.create(course=self.physics, title='Kinematics', description='-')
+        self.lesson = Lesson.objects.create(module=module, title='Projectiles', article_content='Parabolic paths')
+
+    def found(self, query, **kwargs):
+        return [(result['kind'], result['id']) for result in search(query, **kwargs)]
+
+    def test_title_matches_rank_above_body_matches(self):
+        self.assertEqual(self.found('algebra'), [('course', self.algebra.pk), ('course', self.physics.pk)])
+        self.assertEqual(self.found('alg'), self.found('algebra'))
+        self.assertEqual(self.found('parabolic', kinds=['lesson']), [('lesson', self.lesson.pk)])
+        self.assertEqual(self.found('kamala silva'), [('course', self.algebra.pk), ('course', self.physics.pk)])
+        self.assertEqual(self.found('"(*'), [])
+
+    def test_documents_follow_saves_and_deletes(self):
+        self.physics.status = 'draft'
+        self.physics.save()
+        self.assertEqual(self.found('algebra'), [('course', self.algebra.pk)])
+        self.assertEqual(self.found('projectiles'), [])
+        self.assertEqual(search_course_ids('mechanics'), [self.physics.pk])
+
+        self.user.last_name = 'Fernando'
+        self.user.save()
+        self.assertEqual(self.found('fernando', kinds=['course']), [('course', self.algebra.pk)])
+
+        self.algebra.delete()
+        self.assertEqual(self.found('algebra'), [])
+
+    def test_admin_search_is_not_capped(self):
+        self.assertEqual(search_course_ids('algebra'), [self.algebra.pk, self.physics.pk])
+        self.assertEqual(search_course_ids('algebra', limit=1), [self.algebra.pk])
+
+    def test_migration_indexes_existing_content(self):
+        index_existing_content = import_module('apps.courses.migrations.0005_search_document').index_existing_content
+        expected = self.found('algebra'), self.found('parabolic')
+        SearchDocument.objects.all().delete()
+        index_existing_content(apps, None)
+        self.assertEqual((self.found('algebra'), self.found('parabolic')), expected)
+
+
+class LessonProgressTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        teacher = Teacher.objects.create(
+            user=User.objects.create_user('progress-teacher@example.com', 'x', role='teacher'), qualifications='-'
+        )
+        course = Course.objects.create(title='Video course', description='-', teacher=teacher,
+                                       grade_level='grade_10', subject='-', status='published')
+        module = CourseModule.objects.create(course=course, title='One', description='-')
+        self.lessons = [Lesson.objects.create(module=module, title=f'Lesson {n}') for n in range(2)]
+        self.user = User.objects.create_user('progress-student@example.com', 'x', role='student')
+        student = Student.objects.create(user=self.user, grade_level='grade_10')
+        self.enrollment = Enrollment.objects.create(student=student, course=course, status='active')
+
+        # Flushed by hand: a flusher thread would write outside the test transaction
+        patcher = mock.patch.object(ProgressBuffer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buffer = ProgressBuffer()
+        patcher = mock.patch('apps.courses.progress._buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def progress(self, lesson):
+        return LessonProgress.objects.get(enrollment=self.enrollment, lesson=lesson)
+
+    def test_heartbeats_are_written_in_batches_of_whole_minutes(self):
+        for _ in range(5):
+            for lesson in self.lessons:
+                self.buffer.add(self.enrollment.pk, lesson.pk, 15)
+        with self.assertNumQueries(5):  # savepoint, insert, select, update, release
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.progress(self.lessons[0]).time_spent_minutes, 1)
+        self.assertEqual(self.progress(self.lessons[0]).status, 'in_progress')
+
+        # The 15 seconds left over count towards the next minute
+        for _ in range(3):
+            self.buffer.add(self.enrollment.pk, self.lessons[0].pk, 15)
+        self.buffer.flush()
+        self.assertEqual(self.progress(self.lessons[0]).time_spent_minutes, 2)
+        self.assertEqual(self.progress(self.lessons[1]).time_spent_minutes, 1)
+
+    def test_completion_is_immediate_and_never_undone(self):
+        self.buffer.add(self.enrollment.pk, self.lessons[0].pk, 50)
+        self.assertTrue(complete_lesson(self.enrollment.pk, self.lessons[0].pk))
+        self.assertFalse(complete_lesson(self.enrollment.pk, self.lessons[0].pk))
+        self.assertEqual(len(self.buffer), 0)
+
+        self.buffer.add(self.enrollment.pk, self.lessons[0].pk, 60)
+        self.buffer.flush(final=True)
+        progress = self.progress(self.lessons[0])
+        self.assertEqual((progress.status, progress.time_spent_minutes), ('completed', 2))
+        self.assertIsNotNone(progress.completed_at)
+
+    def test_heartbeat_endpoint_checks_enrollment(self):
+        self.client.force_login(self.user)
+        url = f'/courses/lessons/{self.lessons[0].pk}/heartbeat'
+        response = self.client.post(url, {'seconds': 15}, content_type='application/json', secure=True)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(self.buffer), 1)
+
+        self.enrollment.status = 'cancelled'
+        self.enrollment.save()
+        cache.clear()
+        response = self.client.post(url, {'seconds': 15}, content_type='application/json', secure=True)
+        self.assertEqual(response.status_code, 403)
+
+    def test_non_finite_seconds_are_rejected(self):
+        self.client.force_login(self.user)
+        url = f'/courses/lessons/{self.lessons[0].pk}/heartbeat'
+        for body in ('{"seconds": NaN}', '{"seconds": "inf", "completed": true}'):
+            response = self.client.post(url, body, content_type='application/json', secure=True)
+            self.assertEqual(response.status_code, 400)
+        self.buffer.add(self.enrollment.pk, self.lessons[0].pk, float('nan'))
+        self.buffer.add(self.enrollment.pk, self.lessons[0].pk, 60)
+        self.buffer.flush()
+        self.assertEqual(self.progress(self.lessons[0]).time_spent_minutes, 1)
+
+    def test_a_failed_flush_keeps_the_seconds(self):
+        for lesson in self.lessons:
+            self.buffer.add(self.enrollment.pk, lesson.pk, 90)
+        with mock.patch('apps.courses.progress.LessonProgress.objects.bulk_create', side_effect=OperationalError), \
+                self.assertLogs('apps.courses.progress', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.failed, 0)
+        self.buffer.flush(final=True)
+        self.assertEqual([self.progress(lesson).time_spent_minutes for lesson in self.lessons], [2, 2])
+
+
+class CompletionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        teacher = Teacher.objects.create(
+            user=User.objects.create_user('completion-teacher@example.com', 'x', role='teacher'),
+            qualifications='-',
+        )
+        self.course = Course.objects.create(title='Three lessons', description='-', teacher=teacher,
+                                            grade_level='grade_10', subject='-', status='published')
+        self.module = CourseModule.objects.create(course=self.course, title='One', description='-')
+        self.lessons = [Lesson.objects.create(module=self.module, title=f'Lesson {n}') for n in range(3)]
+        student = Student.objects.create(
+            user=User.objects.create_user('completion-student@example.com', 'x', role='student'),
+            grade_level='grade_10',
+        )
+        self.enrollment = Enrollment.objects.create(student=student, course=self.course, status='active')
+
+    def assertCompletion(self, completed, percentage):
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons, completed)
+        self.assertEqual(self.enrollment.completion_percentage, Decimal(percentage))
+
+    def test_completing_lessons_shifts_the_percentage(self):
+        with mock.patch('apps.courses.progress._buffer', ProgressBuffer()):
+            complete_lesson(self.enrollment.pk, self.lessons[0].pk)
+            self.assertCompletion(1, '33.33')
+            for lesson in self.lessons[1:]:
+                complete_lesson(self.enrollment.pk, lesson.pk)
+        self.assertCompletion(3, '100.00')
+
+        progress = LessonProgress.objects.get(enrollment=self.enrollment, lesson=self.lessons[2])
+        progress.status = 'in_progress'
+        progress.save()
+        self.assertCompletion(2, '66.67')
+        LessonProgress.objects.get(enrollment=self.enrollment, lesson=self.lessons[1]).delete()
+        self.assertCompletion(1, '33.33')
+
+    def test_lesson_changes_recount_the_course(self):
+        LessonProgress.objects.create(enrollment=self.enrollment, lesson=self.lessons[0], status='completed')
+        self.assertCompletion(1, '33.33')
+
+        Lesson.objects.create(module=self.module, title='Lesson 3')
+        self.assertCompletion(1, '25.00')
+        self.lessons[0].delete()
+        self.assertCompletion(0, '0.00')
+
+    def test_drift_is_found_and_fixed(self):
+        LessonProgress.objects.create(enrollment=self.enrollment, lesson=self.lessons[0], status='completed')
+        self.assertFalse(completion_drift(self.course.pk).exists())
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(completed_lessons=3, completion_percentage=5)
+
+        self.assertEqual(list(completion_drift(self.course.pk).values_list('actual', flat=True)), [1])
+        recompute_course_completion(self.course.pk)
+        self.assertCompletion(1, '33.33')
+        self.assertFalse(completion_drift(self.course.pk).exists())
+
+    def test_uncompleting_an_uncounted_lesson_stops_at_zero(self):
+        progress = LessonProgress.objects.create(enrollment=self.enrollment, lesson=self.lessons[0], status='completed')
+        # As rows completed before the column existed were, unless migrated
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(completed_lessons=0, completion_percentage=0)
+        progress.status = 'in_progress'
+        progress.save()
+        self.assertCompletion(0, '0.00')
+
+    def test_migration_counts_completed_lessons(self):
+        populate = import_module('apps.courses.migrations.0006_enrollment_completed_lessons').populate_completed_lessons
+        for lesson in self.lessons[:2]:
+            LessonProgress.objects.create(enrollment=self.enrollment, lesson=lesson, status='completed')
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(completed_lessons=0)
+        populate(apps, None)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons, 2)
+
+
+@override_settings(CACHES=MEMORY_CACHES)
+class CurriculumTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        teacher = Teacher.objects.create(
+            user=User.objects.create_user('curriculum-teacher@example.com', 'x', role='teacher',
+                                          first_name='Kamala', last_name='Silva'),
+            qualifications='-',
+        )
+        self.course = Course.objects.create(title='Organic chemistry', description='-', teacher=teacher,
+                                            grade_level='grade_12', subject='Chemistry', status='published')
+        self.modules = [
+            CourseModule.objects.create(course=self.course, title=f'Unit {n}', description='-', order_index=n)
+            for n in range(2)
+        ]
+        self.lessons = [
+            Lesson.objects.create(module=module, title=f'{module.title}.{n}', duration_minutes=10, order_index=n)
+            for module in self.modules for n in range(3)
+        ]
+
+    def test_tree_is_loaded_in_three_queries_then_cached(self):
+        with self.assertNumQueries(3):
+            tree = course_curriculum(self.course.pk)
+        self.assertEqual(tree['teacher']['name'], 'Kamala Silva')
+        self.assertEqual([module['title'] for module in tree['modules']], ['Unit 0', 'Unit 1'])
+        self.assertEqual([lesson['title'] for lesson in tree['modules'][1]['lessons']],
+                         ['Unit 1.0', 'Unit 1.1', 'Unit 1.2'])
+        self.assertEqual((tree['lesson_count'], tree['duration_minutes']), (6, 60))
+        with self.assertNumQueries(0):
+            self.assertEqual(course_curriculum(self.course.pk), tree)
+
+    def test_changes_invalidate_the_tree(self):
+        course_curriculum(self.course.pk)
+        lesson = self.lessons[0]
+        lesson.title = 'Renamed'
+        lesson.save()
+        self.assertEqual(course_curriculum(self.course.pk)['modules'][0]['lessons'][0]['title'], 'Renamed')
+
+        lesson.module = self.modules[1]
+        lesson.save()
+        self.assertEqual([len(module['lessons']) for module in course_curriculum(self.course.pk)['modules']], [2, 4])
+
+        self.modules[0].delete()
+        self.assertEqual(course_curriculum(self.course.pk)['lesson_count'], 4)
+        self.course.title = 'Organic chemistry II'
+        self.course.save()
+        self.assertEqual(course_curriculum(self.course.pk)['title'], 'Organic chemistry II')
+
+    def test_unpublished_course_is_hidden(self):
+        self.course.status = 'draft'
+        self.course.save()
+        response = self.client.get(f'/courses/{self.course.pk}/curriculum', secure=True)
+        self.assertEqual(response.status_code, 404)
+        self.client.force_login(self.course.teacher.user)
+        response = self.client.get(f'/courses/{self.course.pk}/curriculum', secure=True)
+        self.assertEqual(response.json()['lesson_count'], 6)
+
+
+@override_settings(CACHES=MEMORY_CACHES, PROTECTED_MEDIA_ACCEL_PREFIX='')
+class LessonFileTests(TestCase):
+    content = bytes(range(256)) * 40
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        teacher = Teacher.objects.create(
+            user=User.objects.create_user('files-teacher@example.com', 'x', role='teacher'), qualifications='-',
+        )
+        self.course = Course.objects.create(title='Mechanics', description='-', teacher=teacher,
+                                            grade_level='grade_12', subject='Physics', status='published')
+        module = CourseModule.objects.create(course=self.course, title='Unit 1', description='-', order_index=0)
+        self.lesson = Lesson.objects.create(module=module, title='Notes', duration_minutes=10, order_index=0)
+        self.lesson.file_attachment.save('notes.pdf', ContentFile(self.content))
+        self.student = Student.objects.create(
+            user=User.objects.create_user('files-student@example.com', 'x', role='student'), grade_level='grade_12',
+        )
+        self.url = f'/courses/lessons/{self.lesson.pk}/file'
+
+    def get(self, **headers):
+        return self.client.get(self.url, secure=True, **headers)
+
+    def test_only_enrolled_students_free_previews_and_the_teacher_get_the_file(self):
+        self.assertEqual(self.get().status_code, 404)
+        self.client.force_login(self.student.user)
+        self.assertEqual(self.get().status_code, 404)
+        Enrollment.objects.create(student=self.student, course=self.course, status='pending')
+        self.assertEqual(self.get().status_code, 404)
+        Enrollment.objects.filter(student=self.student).update(status='active')
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('private', response['Cache-Control'])
+
+        self.client.logout()
+        Lesson.objects.filter(pk=self.lesson.pk).update(is_free_preview=True)
+        self.assertEqual(self.get().status_code, 200)
+        Course.objects.filter(pk=self.course.pk).update(status='draft')
+        self.assertEqual(self.get().status_code, 404)
+        self.client.force_login(self.course.teacher.user)
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_enrolled_students_keep_the_file_once_the_course_is_archived(self):
+        enrollment = Enrollment.objects.create(student=self.student, course=self.course, status='active')
+        Course.objects.filter(pk=self.course.pk).update(status='archived')
+        self.client.force_login(self.student.user)
+        self.assertEqual(self.get().status_code, 200)
+        enrollment.status = 'completed'
+        enrollment.save()
+        self.assertEqual(self.get().status_code, 200)
+
+        # A free preview is for visitors of published courses only
+        self.client.logout()
+        Lesson.objects.filter(pk=self.lesson.pk).update(is_free_preview=True)
+        self.assertEqual(self.get().status_code, 404)
+
+    def test_access_is_checked_in_one_query(self):
+        Enrollment.objects.create(student=self.student, course=self.course, status='active')
+        self.client.force_login(self.student.user)
+        self.get()
+        with self.assertNumQueries(1), self.settings(PROTECTED_MEDIA_ACCEL_PREFIX='/protected-media/'):
+            response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.lesson.file_attachment.name}')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response.content, b'')
+
+    def test_byte_ranges_and_conditional_requests(self):
+        Lesson.objects.filter(pk=self.lesson.pk).update(is_free_preview=True)
+        response = self.get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+        response = self.get(HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        response = self.get(HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(self.content)}'))
+
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"').status_code, 200)
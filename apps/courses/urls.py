@@ -4,6 +4,10 @@ from . import views
 app_name = 'courses'
 
 urlpatterns = [
-    # Course list and detail will be added here
-    # Placeholder for now - coming soon page
+    path('', views.catalog, name='catalog'),
+    path('search', views.course_search, name='search'),
+    path('<int:course_id>/curriculum', views.curriculum, name='curriculum'),
+    path('lessons/<int:lesson_id>/file', views.lesson_file, name='lesson_file'),
+    path('lessons/<int:lesson_id>/heartbeat', views.lesson_heartbeat, name='lesson_heartbeat'),
+    path('export/enrollments', views.export_enrollments, name='export_enrollments'),
 ]
@@ -1,3 +1,121 @@
-from django.shortcuts import render
+import json
+import math
 
-# Create your views here.
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET, require_POST, require_safe
+
+from apps.core.exports import export_from_request
+from apps.core.images import FORMATS, responsive_images, srcset
+
+from .catalog import CatalogQuery, catalog_facets, catalog_page
+from .curriculum import course_curriculum
+from .downloads import lesson_file_access, lesson_file_response
+from .exports import enrollment_export, filter_enrollments
+from .progress import complete_lesson, enrollment_for_lesson, record_heartbeat
+from .search import search
+
+
+@require_GET
+def catalog(request):
+    """GET /courses/?grade_level=&subject=&language=&course_type=&min_price=&max_price=&sort=&after=
+
+    Facet params may repeat (``?subject=Maths&subject=Physics``); ``after`` is
+    the ``next`` cursor of the previous page.
+    """
+    try:
+        query = CatalogQuery.from_params(request.GET)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    courses, next_cursor = catalog_page(query)
+    images = responsive_images(course['thumbnail'] for course in courses)
+    for course in courses:
+        image = images.get(course['thumbnail'])
+        # srcset per format, once the derivatives exist
+        course['thumbnail_srcset'] = {extension: srcset(image, extension) for extension in FORMATS} if image else None
+        course['thumbnail'] = f'{settings.MEDIA_URL}{course["thumbnail"]}' if course['thumbnail'] else ''
+    return JsonResponse({
+        'results': courses,
+        'next': next_cursor,
+        'facets': {facet: [{'value': value, 'count': count} for value, count in counts]
+                   for facet, counts in catalog_facets(query).items()},
+    })
+
+
+@require_GET
+def course_search(request):
+    """GET /courses/search?q=&kind=course|lesson: ranked matches among published courses and lessons"""
+    kinds = request.GET.getlist('kind') or ['course', 'lesson']
+    if not set(kinds) <= {'course', 'lesson'}:
+        return JsonResponse({'error': 'kind must be course or lesson'}, status=400)
+    try:
+        limit = min(int(request.GET.get('limit', 20)), 50)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    return JsonResponse({'results': search(request.GET.get('q', ''), kinds=kinds, limit=max(limit, 1))})
+
+
+@require_GET
+def curriculum(request, course_id):
+    """GET /courses/<id>/curriculum: modules and lessons of a published course (any status for its teacher and staff)"""
+    tree = course_curriculum(course_id)
+    if tree is None:
+        raise Http404
+    if tree['status'] != 'published' and not (
+        request.user.is_staff or (request.user.is_authenticated and request.user.pk == tree['teacher']['user_id'])
+    ):
+        raise Http404
+    return JsonResponse(tree)
+
+
+@require_safe
+def lesson_file(request, lesson_id):
+    """GET /courses/lessons/<id>/file: the lesson's attachment, for enrolled students and free previews
+
+    Sent by nginx through X-Accel-Redirect when PROTECTED_MEDIA_ACCEL_PREFIX is
+    set (see apps.courses.downloads), otherwise streamed with Range support.
+    """
+    access = lesson_file_access(request.user, lesson_id)
+    # 404 rather than 403 for files the user may not see, as for unpublished curricula
+    if access is None or not access[1]:
+        raise Http404
+    try:
+        return lesson_file_response(request, access[0])
+    except FileNotFoundError:
+        raise Http404
+
+
+@require_POST
+def lesson_heartbeat(request, lesson_id):
+    """POST /courses/lessons/<id>/heartbeat {"seconds": 15, "completed": false} from the video player
+
+    Watch time is buffered and written every few seconds (see apps.courses.progress);
+    ``completed`` is written at once.
+    """
+    student = getattr(request.user, 'student_profile', None) if request.user.is_authenticated else None
+    if student is None:
+        return JsonResponse({'error': 'Only students record lesson progress'}, status=403)
+    try:
+        data = json.loads(request.body or b'{}')
+        seconds = float(data.get('seconds') or 0)
+        if not math.isfinite(seconds):  # json.loads accepts NaN and Infinity
+            raise ValueError(seconds)
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Expected a JSON object with numeric seconds'}, status=400)
+    enrollment_id = enrollment_for_lesson(student.pk, lesson_id)
+    if enrollment_id is None:
+        return JsonResponse({'error': 'Not enrolled in this lesson\'s course'}, status=403)
+
+    if data.get('completed'):
+        if seconds:
+            record_heartbeat(enrollment_id, lesson_id, seconds)
+        newly_completed = complete_lesson(enrollment_id, lesson_id)
+        return JsonResponse({'status': 'completed', 'newly_completed': newly_completed})
+    record_heartbeat(enrollment_id, lesson_id, seconds)
+    return JsonResponse({'status': 'accepted'}, status=202)
+
+
+@require_GET
+def export_enrollments(request):
+    """GET /courses/export/enrollments?format=csv|xlsx&date_from=&date_to=&course=&status=&payment_status="""
+    return export_from_request(request, enrollment_export, filter_enrollments)
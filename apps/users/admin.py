@@ -1,6 +1,12 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Count
+from django.http import StreamingHttpResponse
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Student, Teacher, Parent
+from .models import User, Student, StudentIdSequence, Teacher, Parent
+
+# Admin actions render up to this many students in the request, in-process;
+# larger batches belong to the management commands and their process pools
+ADMIN_RENDER_LIMIT = 50
 
 
 @admin.register(User)
@@ -32,6 +38,8 @@ class StudentAdmin(admin.ModelAdmin):
     list_filter = ('grade_level', 'enrollment_date')
     search_fields = ('student_id_number', 'user__first_name', 'user__last_name', 'user__email')
     raw_id_fields = ('user', 'parent')
+    list_select_related = ('user', 'parent')
+    actions = ['generate_barcodes', 'print_id_cards']
 
     def get_student_name(self, obj):
         return obj.user.get_full_name()
@@ -41,6 +49,43 @@ class StudentAdmin(admin.ModelAdmin):
         return obj.parent.get_full_name() if obj.parent else '-'
     get_parent_name.short_description = 'Parent Name'
 
+    def _within_render_limit(self, request, queryset, command):
+        count = queryset.count()
+        if count > ADMIN_RENDER_LIMIT:
+            self.message_user(
+                request,
+                f'{count} students selected; the admin renders at most {ADMIN_RENDER_LIMIT}. '
+                f'Run "python manage.py {command}" (optionally with --grade) for larger batches.',
+                messages.WARNING,
+            )
+            return False
+        return True
+
+    @admin.action(description='Generate missing barcodes / QR codes')
+    def generate_barcodes(self, request, queryset):
+        from apps.attendance.barcodes import generate_student_barcodes
+
+        if not self._within_render_limit(request, queryset, 'generate_student_barcodes'):
+            return
+        # Small selections are faster to render in-process than to start a pool for,
+        # and a web worker must not fork one
+        stats = generate_student_barcodes(queryset, workers=1)
+        self.message_user(
+            request,
+            f'Generated barcodes for {stats.students} student(s) '
+            f'({stats.images_per_second:.0f} images/s).',
+        )
+
+    @admin.action(description='Print ID cards (PDF)')
+    def print_id_cards(self, request, queryset):
+        from apps.attendance.id_cards import iter_id_card_pdf
+
+        if not self._within_render_limit(request, queryset, 'render_id_cards cards.pdf'):
+            return
+        response = StreamingHttpResponse(iter_id_card_pdf(queryset, workers=1), content_type='application/pdf')
+        response['Content-Disposition'] = 'attachment; filename="student-id-cards.pdf"'
+        return response
+
 
 @admin.register(Teacher)
 class TeacherAdmin(admin.ModelAdmin):
@@ -48,6 +93,7 @@ class TeacherAdmin(admin.ModelAdmin):
     list_filter = ('is_verified', 'joined_date')
     search_fields = ('user__first_name', 'user__last_name', 'user__email', 'subjects')
     raw_id_fields = ('user',)
+    list_select_related = ('user',)
 
     fieldsets = (
         ('Teacher Info', {'fields': ('user',)}),
@@ -66,7 +112,22 @@ class ParentAdmin(admin.ModelAdmin):
     list_display = ('get_parent_name', 'occupation', 'children_count', 'emergency_contact')
     search_fields = ('user__first_name', 'user__last_name', 'user__email')
     raw_id_fields = ('user',)
+    list_select_related = ('user',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_children=Count('user__children'))
 
     def get_parent_name(self, obj):
         return obj.user.get_full_name()
     get_parent_name.short_description = 'Parent Name'
+
+    def children_count(self, obj):
+        return obj.num_children
+    children_count.short_description = 'Children'
+    children_count.admin_order_field = 'num_children'
+
+
+@admin.register(StudentIdSequence)
+class StudentIdSequenceAdmin(admin.ModelAdmin):
+    list_display = ('year', 'last_value')
+    ordering = ('-year',)
@@ -0,0 +1,109 @@
+"""
+Signed-in user without a query per request.
+
+Django's ``AuthenticationMiddleware`` loads the user with one query on
+every authenticated request, and touching ``student_profile`` (or the
+teacher or parent profile) costs another. ``AuthenticationMiddleware``
+here does the same session checks but takes the user from the cache,
+loaded once with all three profiles joined in (a missing profile is
+cached as missing too), so ``request.user.profile`` costs nothing. The
+entry is dropped when the user or one of their profiles is saved or
+deleted; in other worker processes a copy may live on for the default
+cache's L1 timeout (a few seconds), and ``AUTH_USER_CACHE_SECONDS``
+bounds changes made with bulk ``update()``, which send no signals.
+
+Together with ``SESSION_MODE`` (cached or signed-cookie sessions, see
+settings) a signed-in page needs no session, user or profile query. Async
+views (the live attendance feed) get the same user from ``request.auser()``;
+Django's would go through its uncached ``aget_user``.
+"""
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, load_backend
+from django.contrib.auth.middleware import AuthenticationMiddleware as DjangoAuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import User
+
+PROFILES = ('student_profile', 'teacher_profile', 'parent_profile')
+
+
+def auth_user_cache_seconds():
+    return getattr(settings, 'AUTH_USER_CACHE_SECONDS', 300)
+
+
+def _user_key(user_id):
+    return f'users:auth:{user_id}'
+
+
+def cached_user(user_id):
+    """The user with their profiles loaded, from the cache when possible; None if there is none"""
+    key = _user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.select_related(*PROFILES).filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, timeout=auth_user_cache_seconds())
+    return user
+
+
+def forget_cached_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+def _verified(request, user):
+    # As django.contrib.auth.get_user: the session must carry the user's
+    # current password hash, or one made with a SECRET_KEY_FALLBACKS key
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    session_auth_hash = user.get_session_auth_hash()
+    if session_hash and constant_time_compare(session_hash, session_auth_hash):
+        return True
+    if session_hash and any(
+        constant_time_compare(session_hash, fallback_hash) for fallback_hash in user.get_session_auth_fallback_hash()
+    ):
+        request.session.cycle_key()
+        request.session[HASH_SESSION_KEY] = session_auth_hash
+        return True
+    request.session.flush()
+    return False
+
+
+def get_user(request):
+    """``django.contrib.auth.get_user`` with the user from ``cached_user``"""
+    try:
+        user_id = User._meta.pk.to_python(request.session[SESSION_KEY])
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    user = cached_user(user_id)
+    backend = load_backend(backend_path)
+    # ModelBackend.get_user turns away inactive users the same way
+    if user is None or not getattr(backend, 'user_can_authenticate', lambda user: True)(user):
+        return AnonymousUser()
+    return user if _verified(request, user) else AnonymousUser()
+
+
+def _memoized_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user(request)
+    return request._cached_user
+
+
+async def _amemoized_user(request):
+    return await sync_to_async(_memoized_user)(request)
+
+
+class AuthenticationMiddleware(DjangoAuthenticationMiddleware):
+    """Sets ``request.user`` and ``request.auser`` from ``get_user`` above, once per request"""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _memoized_user(request))
+        request.auser = partial(_amemoized_user, request)
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.users.models import Student, User
+from apps.users.student_ids import allocate_student_id, allocate_student_ids
+
+
+class Command(BaseCommand):
+    help = 'Benchmark student ID allocation as the student table grows (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100_000, help='Total students to seed')
+        parser.add_argument('--step', type=int, default=25_000, help='Seed this many students between measurements')
+        parser.add_argument('--samples', type=int, default=200, help='Single allocations timed per measurement')
+        parser.add_argument('--block', type=int, default=1_000, help='Block size for the bulk reservation timing')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._run(options)
+            transaction.set_rollback(True)
+        self.stdout.write('Rolled back benchmark data.')
+
+    def _run(self, options):
+        seeded = 0
+        self.stdout.write(f"{'students':>10} {'single (ms)':>12} {'block of %d (ms)' % options['block']:>20}")
+        while True:
+            self._report(seeded, options)
+            if seeded >= options['students']:
+                break
+            batch = min(options['step'], options['students'] - seeded)
+            self._seed(seeded, batch)
+            seeded += batch
+
+    def _report(self, seeded, options):
+        start = time.perf_counter()
+        for _ in range(options['samples']):
+            allocate_student_id()
+        single_ms = (time.perf_counter() - start) * 1000 / options['samples']
+
+        start = time.perf_counter()
+        allocate_student_ids(options['block'])
+        block_ms = (time.perf_counter() - start) * 1000
+
+        self.stdout.write(f'{seeded:>10} {single_ms:>12.3f} {block_ms:>20.3f}')
+
+    def _seed(self, offset, count):
+        users = User.objects.bulk_create(
+            [
+                User(username=f'bench{n}@example.com', email=f'bench{n}@example.com', role='student')
+                for n in range(offset, offset + count)
+            ],
+            batch_size=2_000,
+        )
+        student_ids = allocate_student_ids(count)
+        Student.objects.bulk_create(
+            [
+                Student(user=user, grade_level='grade_10', student_id_number=student_id)
+                for user, student_id in zip(users, student_ids)
+            ],
+            batch_size=2_000,
+        )
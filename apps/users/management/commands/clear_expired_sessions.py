@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = 'Delete expired rows from django_session in small batches (unlike clearsessions, one DELETE at a time)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        store = import_string(f'{settings.SESSION_ENGINE}.SessionStore')
+        if not issubclass(store, DatabaseSessionStore):
+            self.stdout.write(f'{settings.SESSION_ENGINE} keeps no session rows; nothing to clear.')
+            return
+        now = timezone.now()
+        deleted = batches = 0
+        while True:
+            # Short transactions: the table stays writable for signing in meanwhile
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)
+                [:options['batch_size']]
+            )
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            batches += 1
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired session(s) in {batches} batch(es).'))
@@ -98,6 +98,12 @@ class User(AbstractUser):
     def is_admin_user(self):
         return self.role in ['admin', 'super_admin']
 
+    @property
+    def profile(self):
+        """The Student, Teacher or Parent row for the user's role, or None"""
+        name = {'student': 'student_profile', 'teacher': 'teacher_profile', 'parent': 'parent_profile'}.get(self.role)
+        return getattr(self, name, None) if name else None
+
 
 class Student(models.Model):
     """Student profile model"""
@@ -143,21 +149,24 @@ class Student(models.Model):
         # Auto-generate student ID if not provided
         if not self.student_id_number:
             # Generate ID like: STU2026001, STU2026002, etc.
-            from datetime import datetime
-            year = datetime.now().year
-            last_student = Student.objects.filter(
-                student_id_number__startswith=f'STU{year}'
-            ).order_by('-student_id_number').first()
+            from .student_ids import allocate_student_id
+            self.student_id_number = allocate_student_id()
 
-            if last_student:
-                last_number = int(last_student.student_id_number[-3:])
-                new_number = last_number + 1
-            else:
-                new_number = 1
+        super().save(*args, **kwargs)
 
-            self.student_id_number = f'STU{year}{new_number:03d}'
 
-        super().save(*args, **kwargs)
+class StudentIdSequence(models.Model):
+    """Per-year counter backing student ID allocation"""
+
+    year = models.PositiveIntegerField(unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Student ID Sequence'
+        verbose_name_plural = 'Student ID Sequences'
+
+    def __str__(self):
+        return f"{self.year}: {self.last_value}"
 
 
 class Teacher(models.Model):
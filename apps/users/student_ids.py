@@ -0,0 +1,133 @@
+"""
+Student ID allocation backed by a per-year counter row.
+
+Each allocation is a single ``UPDATE ... SET last_value = last_value + n
+RETURNING last_value`` on the year's ``StudentIdSequence`` row (an UPDATE
+then a SELECT on databases without RETURNING), so it costs one round trip
+at 100 or 100,000 students, concurrent registrations serialize on one row lock
+instead of racing on the ``student_id_number`` unique constraint, and a
+bulk import can reserve a whole block of IDs in one statement.
+"""
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Student, StudentIdSequence
+
+# Numbers grow past the padding width rather than overflowing,
+# e.g. STU2026999 is followed by STU20261000.
+DEFAULT_STUDENT_ID_FORMAT = 'STU{year}{number:03d}'
+
+
+def get_student_id_format():
+    """Return the configured student ID format string"""
+    return getattr(settings, 'STUDENT_ID_FORMAT', DEFAULT_STUDENT_ID_FORMAT)
+
+
+def format_student_id(year, number):
+    """Render a student ID from a year and sequence number"""
+    return get_student_id_format().format(year=year, number=number)
+
+
+def _id_prefix(year):
+    """Return the fixed part of IDs for the given year"""
+    fmt = get_student_id_format()
+    return fmt[:fmt.index('{number')].format(year=year)
+
+
+def _highest_existing_number(year):
+    """Find the largest number already issued for a year (one-off scan)"""
+    prefix = _id_prefix(year)
+    highest = 0
+    existing = Student.objects.filter(
+        student_id_number__startswith=prefix
+    ).values_list('student_id_number', flat=True)
+    for student_id in existing.iterator():
+        suffix = student_id[len(prefix):]
+        if suffix.isdigit():
+            highest = max(highest, int(suffix))
+    return highest
+
+
+def _ensure_sequence(year):
+    """Create the counter row for a year, seeded from existing students"""
+    try:
+        with transaction.atomic():
+            StudentIdSequence.objects.create(
+                year=year,
+                last_value=_highest_existing_number(year),
+            )
+    except IntegrityError:
+        # Another worker created it first
+        pass
+
+
+def _increment(year, count):
+    """Add ``count`` to the year's counter; the new value, or None if the year has no row yet"""
+    # Databases that return columns from INSERT (PostgreSQL, SQLite 3.35+)
+    # take RETURNING on UPDATE too
+    if connection.features.can_return_columns_from_insert:
+        quote = connection.ops.quote_name
+        meta = StudentIdSequence._meta
+        last_value = quote(meta.get_field('last_value').column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {quote(meta.db_table)} SET {last_value} = {last_value} + %s '
+                f'WHERE {quote(meta.get_field("year").column)} = %s RETURNING {last_value}',
+                [count, year],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+    sequences = StudentIdSequence.objects.filter(year=year)
+    with transaction.atomic():
+        if not sequences.update(last_value=F('last_value') + count):
+            return None
+        # The UPDATE holds the row lock, so this read sees our own increment
+        return sequences.values_list('last_value', flat=True).get()
+
+
+def reserve_student_numbers(count=1, year=None):
+    """
+    Atomically reserve ``count`` consecutive numbers for a year.
+
+    Returns a ``range`` of the reserved numbers. Numbers that are reserved
+    but never used (e.g. a failed insert) are simply skipped.
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+    if year is None:
+        year = timezone.localdate().year
+
+    last_value = _increment(year, count)
+    if last_value is None:
+        _ensure_sequence(year)
+        last_value = _increment(year, count)
+
+    return range(last_value - count + 1, last_value + 1)
+
+
+def allocate_student_ids(count, year=None):
+    """Reserve a block of student IDs in one round trip"""
+    if year is None:
+        year = timezone.localdate().year
+    return [format_student_id(year, number) for number in reserve_student_numbers(count, year)]
+
+
+def allocate_student_id(year=None):
+    """Allocate a single student ID"""
+    return allocate_student_ids(1, year)[0]
+
+
+def assign_student_ids(students, year=None):
+    """
+    Fill in missing ``student_id_number`` values before ``bulk_create``.
+
+    ``bulk_create`` bypasses ``Student.save``, so bulk imports should call
+    this first; it reserves exactly one block for all students lacking an ID.
+    """
+    pending = [student for student in students if not student.student_id_number]
+    if pending:
+        for student, student_id in zip(pending, allocate_student_ids(len(pending), year)):
+            student.student_id_number = student_id
+    return students
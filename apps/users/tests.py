@@ -1,3 +1,167 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from apps.core.testing import MEMORY_CACHES
+
+from .auth import AuthenticationMiddleware, get_user
+from .models import Student, StudentIdSequence, User
+from .student_ids import allocate_student_id, assign_student_ids, reserve_student_numbers
+
+DJANGO_AUTH = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'MIDDLEWARE': [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+    ],
+}
+
+
+@override_settings(CACHES=MEMORY_CACHES, SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class CachedUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cached-user@example.com', 'secret', role='student', is_staff=True)
+        Student.objects.create(user=self.user, grade_level='grade_10')
+        self.client.force_login(self.user)
+
+    def request(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        return request
+
+    def test_signed_in_pages_need_no_session_or_user_queries(self):
+        self.client.get('/cache-stats/', secure=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/cache-stats/', secure=True).status_code, 200)
+        with self.settings(**DJANGO_AUTH):
+            client = Client()  # a client loads the middleware on its first request
+            client.cookies = self.client.cookies
+            with self.assertNumQueries(2):
+                self.assertEqual(client.get('/cache-stats/', secure=True).status_code, 200)
+
+    def test_async_views_get_the_cached_user(self):
+        # request.auser(), as the live attendance feed uses it
+        def auser():
+            request = self.request()
+            AuthenticationMiddleware(lambda request: None).process_request(request)
+            return async_to_sync(request.auser)()
+
+        auser()
+        with self.assertNumQueries(0):
+            self.assertEqual(auser(), self.user)
+
+    def test_profile_comes_with_the_user(self):
+        get_user(self.request())
+        with self.assertNumQueries(0):
+            user = get_user(self.request())
+            self.assertEqual(user.profile.grade_level, 'grade_10')
+            self.assertIsNone(getattr(user, 'teacher_profile', None))
+
+        self.user.student_profile.grade_level = 'grade_11'
+        self.user.student_profile.save()
+        self.assertEqual(get_user(self.request()).profile.grade_level, 'grade_11')
+
+    def test_password_change_and_deactivation_sign_out(self):
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertFalse(get_user(self.request()).is_authenticated)
+
+        self.client.force_login(self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(get_user(self.request()).is_authenticated)
+
+
+class StudentIdTests(TestCase):
+    def test_numbers_follow_the_highest_existing_id(self):
+        user = User.objects.create_user('legacy-id@example.com', 'x', role='student')
+        Student.objects.create(user=user, grade_level='grade_10', student_id_number='STU2025041')
+        self.assertEqual(allocate_student_id(2025), 'STU2025042')
+        self.assertEqual(allocate_student_id(2026), 'STU2026001')
+        self.assertEqual(StudentIdSequence.objects.get(year=2025).last_value, 42)
+
+    def test_blocks_are_reserved_in_one_statement(self):
+        allocate_student_id(2025)
+        with self.assertNumQueries(1):
+            self.assertEqual(reserve_student_numbers(3, 2025), range(2, 5))
+        with self.assertRaises(ValueError):
+            reserve_student_numbers(0, 2025)
+        # Without RETURNING: an UPDATE and a SELECT
+        with mock.patch.object(connection.features, 'can_return_columns_from_insert', False):
+            self.assertEqual(reserve_student_numbers(2, 2025), range(5, 7))
+            self.assertEqual(reserve_student_numbers(1, 2024), range(1, 2))
+
+    def test_bulk_imports_keep_given_ids(self):
+        users = [User.objects.create_user(f'bulk-id{n}@example.com', 'x', role='student') for n in range(3)]
+        students = assign_student_ids([
+            Student(user=users[0], grade_level='grade_10'),
+            Student(user=users[1], grade_level='grade_10', student_id_number='STU2025900'),
+            Student(user=users[2], grade_level='grade_10'),
+        ], 2025)
+        self.assertEqual([student.student_id_number for student in students],
+                         ['STU2025001', 'STU2025900', 'STU2025002'])
+
+
+class StudentAdminActionTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client.force_login(User.objects.create_superuser('admin-actions@example.com', 'x'))
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f'card{n}@example.com', 'x', role='student',
+                                                                 first_name='Card', last_name=str(n)),
+                                   grade_level='grade_10')
+            for n in range(3)
+        ]
+
+    def action(self, action, students):
+        return self.client.post('/admin/users/student/', {
+            'action': action, '_selected_action': [student.pk for student in students],
+        }, secure=True)
+
+    @mock.patch('apps.attendance.barcodes.ProcessPoolExecutor', side_effect=AssertionError('no pool in a request'))
+    def test_barcodes_render_in_process_up_to_the_limit(self, pool):
+        with mock.patch('apps.users.admin.ADMIN_RENDER_LIMIT', 2):
+            response = self.action('generate_barcodes', self.students)
+            self.assertIn('at most 2', str(list(get_messages(response.wsgi_request))[0]))
+            self.assertFalse(Student.objects.filter(barcode__isnull=False).exists())
+            self.action('generate_barcodes', self.students[:2])
+        self.assertEqual(Student.objects.filter(barcode__isnull=False).count(), 2)
+
+    @mock.patch('apps.attendance.id_cards.ProcessPoolExecutor', side_effect=AssertionError('no pool in a request'))
+    def test_id_cards_stream_in_process_up_to_the_limit(self, pool):
+        with mock.patch('apps.users.admin.ADMIN_RENDER_LIMIT', 2):
+            response = self.action('print_id_cards', self.students)
+            self.assertEqual(response.status_code, 302)
+            response = self.action('print_id_cards', self.students[:2])
+        pdf = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertIn(b'/Type /Pages /Kids [5 0 R] /Count 1', pdf)
+        self.assertTrue(pdf.endswith(b'%%EOF\n'))
+
+
+class ClearExpiredSessionsTests(TestCase):
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_expired_sessions_are_deleted_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'expired{n}', session_data='-', expire_date=now - timedelta(days=1)) for n in range(5)]
+            + [Session(session_key='current', session_data='-', expire_date=now + timedelta(days=1))]
+        )
+        out = io.StringIO()
+        call_command('clear_expired_sessions', batch_size=2, pause=0, stdout=out)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['current'])
+        self.assertIn('Deleted 5 expired session(s) in 3 batch(es)', out.getvalue())
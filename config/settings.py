@@ -52,7 +52,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.users.auth.AuthenticationMiddleware',  # request.user from the cache
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  # django-allauth
@@ -101,6 +101,82 @@ else:
     }
 
 
+# Caches
+# The default cache is a per-process LRU (L1) in front of the cache every
+# process shares (L2): Redis when REDIS_URL is set (needs the redis
+# package), a directory when CACHE_DIR is (every worker on one server), the
+# database cache table with DATABASE_URL alone (python manage.py
+# createcachetable; a query per L2 lookup) and local memory in development.
+# See apps/core/cache.py.
+
+if os.environ.get('REDIS_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL'),
+    }
+elif os.environ.get('CACHE_DIR'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR'),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+elif os.environ.get('DATABASE_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'apps.core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'L1_MAX_ENTRIES': 5000, 'L1_TIMEOUT': 5},
+    },
+    'shared': {**SHARED_CACHE, 'KEY_PREFIX': 'alc'},
+}
+
+# Anonymous home/about/contact pages are cached per release (apps/core/pages.py);
+# set RELEASE_VERSION per deploy where the app does not run from a git checkout
+RELEASE_VERSION = os.environ.get('RELEASE_VERSION') or os.environ.get('RAILWAY_GIT_COMMIT_SHA', '')
+PAGE_CACHE_SECONDS = int(os.environ.get('PAGE_CACHE_SECONDS', 0 if DEBUG else 24 * 60 * 60))
+
+# Models whose post_save/post_delete invalidate apps.core.cache.cached_queryset results
+CACHE_VERSIONED_MODELS = [
+    'users.User', 'users.Teacher', 'users.Student', 'users.Parent',
+    'courses.Course', 'courses.CourseModule', 'courses.Lesson', 'courses.Enrollment',
+    'attendance.LiveClass',
+]
+
+
+# Sessions
+# SESSION_MODE 'cached_db' (default) reads sessions from the shared cache
+# and falls back to the django_session table, which every save still
+# writes; 'signed_cookies' keeps the session in the cookie (no server-side
+# state, so signing out cannot revoke a copied cookie); 'db' is Django's
+# default. The signed-in user and profile come from the cache as well
+# (apps/users/auth.py). That only takes the queries off signed-in requests
+# when the shared tier is Redis or CACHE_DIR: on the database cache table
+# (DATABASE_URL with neither set) each lookup is a query on that table
+# instead, so deployment/deploy.sh sets CACHE_DIR. Expired rows:
+# python manage.py clear_expired_sessions.
+
+SESSION_MODE = os.environ.get('SESSION_MODE', 'cached_db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+# Never the per-process tier: a signed-out session must be gone for every worker
+SESSION_CACHE_ALIAS = 'shared'
+AUTH_USER_CACHE_SECONDS = 300
+
+
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
 
@@ -149,6 +225,9 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files (User uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Widths of the WebP/JPEG copies made of course thumbnails and profile images
+# (apps/core/images.py, manage.py generate_image_derivatives)
+IMAGE_DERIVATIVE_WIDTHS = (160, 320, 640, 1280)
 
 
 # Django Allauth Configuration
@@ -167,6 +246,65 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 ACCOUNT_LOGOUT_REDIRECT_URL = '/'
 
 
+# Course catalog: keyset-paginated pages and facet counts, cached until a course changes
+CATALOG_PAGE_SIZE = 24
+CATALOG_CACHE_SECONDS = 300
+# Curriculum trees are versioned per course, so this only bounds memory use
+CURRICULUM_CACHE_SECONDS = 24 * 60 * 60
+
+# Video-player heartbeats are coalesced per process and written every
+# LESSON_PROGRESS_FLUSH_SECONDS; a crash loses at most that much watch time
+LESSON_PROGRESS_FLUSH_SECONDS = 30.0
+LESSON_PROGRESS_IDLE_SECONDS = 300.0
+LESSON_PROGRESS_BUFFER_SIZE = 20000
+
+# Lesson files are checked by Django and sent by nginx from this internal
+# location (deployment/nginx.conf); unset, Django streams them itself
+PROTECTED_MEDIA_ACCEL_PREFIX = os.environ.get('PROTECTED_MEDIA_ACCEL_PREFIX', '')
+
+# Attendance
+# Barcode check-in and audit logging (HLD 4.5.5)
+
+ATTENDANCE_CHECKIN_OPENS_MINUTES_BEFORE = 30
+ATTENDANCE_LATE_AFTER_MINUTES = 10
+ATTENDANCE_SYNC_MAX_EVENTS = 10000
+
+# Projected class QR codes rotate every 5 minutes; the previous code stays valid
+ATTENDANCE_QR_ROTATION_SECONDS = 300
+ATTENDANCE_QR_GRACE_WINDOWS = 1
+
+# Live dashboard feed (served by the ASGI app, see deployment/gunicorn-asgi.service)
+ATTENDANCE_LIVE_POLL_SECONDS = 1.0
+ATTENDANCE_LIVE_KEEPALIVE_SECONDS = 15
+ATTENDANCE_LIVE_OVERLAP_SECONDS = 10
+
+# Scan rate limiting; use apps.attendance.ratelimit.CacheBackend with a shared cache on several nodes
+ATTENDANCE_RATELIMIT_BACKEND = os.environ.get(
+    'ATTENDANCE_RATELIMIT_BACKEND', 'apps.attendance.ratelimit.LocalBackend'
+)
+ATTENDANCE_RATELIMIT_CACHE = 'shared'
+ATTENDANCE_DUPLICATE_SCAN_SECONDS = 30
+ATTENDANCE_SCAN_LIMIT_WINDOW_SECONDS = 60
+ATTENDANCE_BARCODE_SCAN_LIMIT = 10
+ATTENDANCE_DEVICE_SCAN_LIMIT = 120
+
+# Nightly anomaly detection (manage.py detect_attendance_anomalies). Buddy
+# punching only counts self check-in methods: door scanners check in everyone.
+ATTENDANCE_ANOMALY_SELF_CHECKIN_METHODS = ('qr_scan',)
+ATTENDANCE_ANOMALY_BUDDY_WINDOW_SECONDS = 600
+ATTENDANCE_ANOMALY_BUDDY_STUDENTS = 3
+ATTENDANCE_ANOMALY_MAX_SPEED_KMH = 200
+ATTENDANCE_ANOMALY_MIN_DISTANCE_KM = 2
+ATTENDANCE_ANOMALY_WINDOW_TOLERANCE_MINUTES = 5
+
+# 'immediate' writes every AttendanceLog on the request path; 'buffered'
+# batches them in-process and may lose a few seconds of entries on a crash.
+ATTENDANCE_LOG_MODE = os.environ.get('ATTENDANCE_LOG_MODE', 'immediate')
+ATTENDANCE_LOG_BUFFER_SIZE = 10000
+ATTENDANCE_LOG_FLUSH_SIZE = 500
+ATTENDANCE_LOG_FLUSH_SECONDS = 2.0
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
 
@@ -18,6 +18,7 @@ urlpatterns = [
     path('', core_views.home, name='home'),
     path('about/', core_views.about, name='about'),
     path('contact/', core_views.contact, name='contact'),
+    path('cache-stats/', core_views.cache_stats, name='cache_stats'),
 
     # Courses
     path('courses/', include('apps.courses.urls')),
@@ -34,6 +34,16 @@ pidfile = "/run/gunicorn/achievers.pid"
 umask = 0o007
 tmp_upload_dir = None
 
+# Server hooks
+def worker_exit(server, worker):
+    # Write out AttendanceLog entries still buffered in this worker
+    # (only used when ATTENDANCE_LOG_MODE=buffered)
+    from apps.attendance.log_buffer import shutdown_log_buffer
+    shutdown_log_buffer()
+    # and lesson watch time still coalescing in memory
+    from apps.courses.progress import shutdown_progress_buffer
+    shutdown_progress_buffer()
+
 # SSL (handled by Nginx, not Gunicorn)
 # keyfile = None
 # certfile = None
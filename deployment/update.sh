@@ -39,13 +39,20 @@ sudo -u ${APP_USER} bash -c "
     # Run migrations
     python manage.py migrate --noinput
 
+    # Table for the shared cache tier (no-op when it exists or REDIS_URL is set)
+    python manage.py createcachetable
+
     # Collect static files
     python manage.py collectstatic --noinput
+
+    # Image derivatives for uploads that have none (quick when there are none)
+    python manage.py generate_image_derivatives
 "
 
 # Restart services
 echo -e "${GREEN}Restarting services...${NC}"
 systemctl restart gunicorn-achievers
+systemctl restart gunicorn-achievers-asgi
 systemctl reload nginx
 
 echo ""